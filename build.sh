@@ -3,6 +3,7 @@ set -o errexit
 pip install -r requirements.txt
 python manage.py collectstatic --noinput
 python manage.py migrate
+python manage.py createcachetable
 python manage.py shell -c "
 from django.contrib.auth.models import User
 from planner.models import Organization, Subscription, OrganizationMember
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'planner.middleware.PerformanceMiddleware',  # off unless PERF_SAMPLE_RATE > 0
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -41,6 +42,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'planner.context_processors.active_membership',
             ],
         },
     },
@@ -57,6 +59,9 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Take the write lock when a transaction starts so read-modify-write
+            # blocks (vote aggregates) serialise instead of failing mid-way
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
         }
     }
 
@@ -98,6 +103,34 @@ LOGIN_REDIRECT_URL  = '/sm/panel/'
 LOGOUT_REDIRECT_URL = '/login/'
 SESSION_COOKIE_AGE  = 86400 * 7
 
+# Cached memberships/roles — seconds before an entry is re-read even without an invalidation
+PERMISSION_CACHE_TTL = 60
+
+# Background jobs — `manage.py run_jobs` works the queue. Eager runs each job in-process
+# right after the request commits (local dev without a worker).
+JOBS_EAGER = os.environ.get('JOBS_EAGER', str(DEBUG)) == 'True'
+
+# Cache — entitlements and memberships are invalidated from both the web process and the
+# worker, so once jobs run outside the request they need a cache both processes share.
+# REDIS_URL picks Redis (needs `pip install redis`); otherwise the database cache table
+# (`manage.py createcachetable`), and a per-process cache when jobs run eagerly.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+elif not JOBS_EAGER:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'planner_cache'}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Request timings — PERF_SAMPLE_RATE (0–1) of requests get SQL/template/total timings, a
+# Server-Timing header when PERF_SERVER_TIMING is on and a planner.perf log line above PERF_SLOW_MS
+PERF_SAMPLE_RATE   = float(os.environ.get('PERF_SAMPLE_RATE', '0'))
+PERF_SLOW_MS       = float(os.environ.get('PERF_SLOW_MS', '500'))
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', str(DEBUG)) == 'True'
+
+# Outbox delivery — dotted path to a transport class; empty picks Resend when RESEND_API_KEY is set
+EMAIL_TRANSPORT = os.environ.get('EMAIL_TRANSPORT', '')
+
 # App URL — used in emails
 APP_URL = os.environ.get('APP_URL', 'https://getsprintflow.co')
 
@@ -124,6 +157,7 @@ PLAN_LIMITS = {
         'excel':            False,
         'backlog':          False,
         'ai':               False,
+        'ai_calls_per_month': 0,
         'analytics':        False,
     },
     'pro': {
@@ -133,6 +167,7 @@ PLAN_LIMITS = {
         'excel':            True,
         'backlog':          True,
         'ai':               False,
+        'ai_calls_per_month': 0,
         'analytics':        False,
     },
     'business': {
@@ -142,6 +177,7 @@ PLAN_LIMITS = {
         'excel':            True,
         'backlog':          True,
         'ai':               True,
+        'ai_calls_per_month': 500,
         'analytics':        True,
     },
 }
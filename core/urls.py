@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # planner first: its admin/… API routes would otherwise hit the Django admin's catch-all
     path('', include('planner.urls')),
+    path('admin/', admin.site.urls),
 ]
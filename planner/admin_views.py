@@ -4,12 +4,16 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
 from .models import (
     Organization, OrganizationMember, SprintMember,
     Stream, Team, Subscription, InviteToken
 )
-from .permissions import require_admin, require_admin_api, is_admin
-from .middleware import check_plan_feature, check_member_limit
+from .permissions import require_admin, require_admin_api, is_admin, bump_membership_version
+from .middleware import check_plan_feature, check_member_limit, check_team_limit
+from .metering import ai_calls_remaining, usage_history
+from .usage import get_usage, track
 
 
 # ─────────────────────────────────────────
@@ -24,7 +28,7 @@ def admin_dashboard(request):
     members = OrganizationMember.objects.filter(
     organization=org
     ).select_related('user').prefetch_related('user__sprint_memberships')
-    teams        = Team.objects.filter(organization=org)
+    teams        = Team.objects.filter(organization=org).annotate(member_count=Count('members'))
     streams      = Stream.objects.filter(organization=org)
     invites      = InviteToken.objects.filter(organization=org, status='pending')
     plan_limits  = settings.PLAN_LIMITS.get(
@@ -64,6 +68,8 @@ def update_org_settings(request):
             org.voting_scale = data['voting_scale']
 
     org.save()
+    # Cached memberships carry the organization
+    bump_membership_version(org.id)
     return JsonResponse({'ok': True})
 
 
@@ -83,20 +89,20 @@ def add_team(request):
         return JsonResponse({'error': 'Team name required'}, status=400)
 
     # Check team limit
-    limits    = settings.PLAN_LIMITS.get(
-        org.subscription.plan if hasattr(org, 'subscription') else 'starter', {}
-    )
-    max_teams = limits.get('teams')
-    if max_teams and Team.objects.filter(organization=org).count() >= max_teams:
+    max_teams = check_team_limit(org)
+    if max_teams is not None:
         return JsonResponse({
             'error': f'Your plan allows up to {max_teams} teams. Upgrade to add more.'
         }, status=403)
 
-    team, created = Team.objects.get_or_create(
-        organization=org,
-        name=name,
-        defaults={'created_by': request.user, 'description': data.get('description', '')}
-    )
+    with transaction.atomic():
+        team, created = Team.objects.get_or_create(
+            organization=org,
+            name=name,
+            defaults={'created_by': request.user, 'description': data.get('description', '')}
+        )
+        if created:
+            track(org.id, teams=1)
     if not created:
         return JsonResponse({'error': 'A team with this name already exists'}, status=400)
 
@@ -125,7 +131,9 @@ def delete_team(request, team_id):
     from .views import get_org
     org  = get_org(request)
     team = get_object_or_404(Team, id=team_id, organization=org)
-    team.delete()
+    with transaction.atomic():
+        team.delete()
+        track(org.id, teams=-1)
     return JsonResponse({'ok': True})
 
 
@@ -149,6 +157,7 @@ def update_member_team(request, member_id):
     else:
         member.team  = None
     member.save()
+    bump_membership_version(org.id)
     return JsonResponse({'ok': True})
 
 
@@ -156,7 +165,7 @@ def update_member_team(request, member_id):
 @require_admin_api
 def update_member_stream(request, member_id):
     """Assign a sprint member to a stream."""
-    from .views import get_org
+    from .views import get_org, members_changed
     org    = get_org(request)
     member = get_object_or_404(SprintMember, id=member_id, organization=org)
     data   = json.loads(request.body)
@@ -168,6 +177,7 @@ def update_member_stream(request, member_id):
     else:
         member.stream = None
     member.save()
+    members_changed(org)
     return JsonResponse({'ok': True})
 
 
@@ -189,3 +199,25 @@ def edit_stream(request, stream_id):
         stream.order = data['order']
     stream.save()
     return JsonResponse({'ok': True})
+
+
+# ─────────────────────────────────────────
+# USAGE
+# ─────────────────────────────────────────
+
+@require_admin_api
+def usage_summary(request):
+    """Current totals against plan limits, plus sprints and AI calls per month."""
+    from .views import get_org
+    org   = get_org(request)
+    usage = get_usage(org)
+    try:
+        months = min(max(int(request.GET.get('months', 12)), 1), 36)
+    except ValueError:
+        months = 12
+    return JsonResponse({
+        'members':            usage.members,
+        'teams':              usage.teams,
+        'ai_calls_remaining': ai_calls_remaining(org),
+        'months':             usage_history(org, months=months),
+    })
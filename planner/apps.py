@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class PlannerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'planner'
+
+    def ready(self):
+        # Modules that register background job handlers
+        from . import billing_views, email_utils, importer  # noqa: F401
@@ -3,6 +3,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.utils import timezone
 from django.utils.text import slugify
 from datetime import timedelta
@@ -11,12 +12,14 @@ from .models import (
     EmailVerificationToken, PasswordResetToken
 )
 from .email_utils import send_verification_email, send_password_reset_email
+from .usage import track
 
 
 # ─────────────────────────────────────────
 # SIGNUP
 # ─────────────────────────────────────────
 
+@transaction.atomic
 def signup(request):
     if request.user.is_authenticated:
         return redirect('sm_panel')
@@ -87,6 +90,7 @@ def signup(request):
                     user=user,
                     role='admin',
                 )
+                track(org.id, members=1)
 
                 # Send verification email
                 token = EmailVerificationToken.objects.create(user=user)
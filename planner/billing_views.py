@@ -7,6 +7,8 @@ from django.http import JsonResponse, HttpResponse
 from django.conf import settings
 from django.utils import timezone
 from .models import Organization, Subscription
+from .middleware import invalidate_entitlement
+from .jobs import enqueue, job_handler
 from .paddle_utils import (
     get_paddle_client, get_price_id,
     verify_webhook_signature, get_plan_from_price_id
@@ -100,15 +102,20 @@ def cancel_subscription(request):
     if not sub or not sub.paddle_subscription_id:
         return JsonResponse({'error': 'No active subscription'}, status=400)
 
-    try:
-        client = get_paddle_client()
-        if client:
-            client.subscriptions.cancel(sub.paddle_subscription_id, effective_from='next_billing_period')
-        sub.status = 'cancelled'
-        sub.save()
-        return JsonResponse({'ok': True})
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+    # The Paddle call runs as a job (retried on failure); the status flips once Paddle confirms
+    job = enqueue('cancel_subscription', {'subscription_id': sub.id}, organization=org)
+    return JsonResponse({'ok': True, 'job_id': job.id})
+
+
+@job_handler('cancel_subscription', priority=5)
+def cancel_subscription_job(payload):
+    sub = Subscription.objects.get(id=payload['subscription_id'])
+    client = get_paddle_client()
+    if client:
+        client.subscriptions.cancel(sub.paddle_subscription_id, effective_from='next_billing_period')
+    sub.status = 'cancelled'
+    sub.save()
+    invalidate_entitlement(sub.organization_id)
 
 
 # ─────────────────────────────────────────
@@ -179,6 +186,7 @@ def handle_subscription_activated(data):
         sub.paddle_subscription_id = sub_id
         sub.paddle_customer_id     = customer_id
         sub.save()
+        invalidate_entitlement(sub.organization_id)
 
     except Organization.DoesNotExist:
         print(f"Org {org_id} not found for subscription {sub_id}")
@@ -200,6 +208,7 @@ def handle_subscription_updated(data):
             if plan:
                 sub.plan = plan
                 sub.save()
+                invalidate_entitlement(sub.organization_id)
         except Subscription.DoesNotExist:
             pass
         return
@@ -214,6 +223,7 @@ def handle_subscription_updated(data):
             sub.plan = plan
         sub.status = 'active'
         sub.save()
+        invalidate_entitlement(sub.organization_id)
     except Organization.DoesNotExist:
         pass
 
@@ -225,6 +235,7 @@ def handle_subscription_canceled(data):
         sub        = Subscription.objects.get(paddle_subscription_id=sub_id)
         sub.status = 'cancelled'
         sub.save()
+        invalidate_entitlement(sub.organization_id)
     except Subscription.DoesNotExist:
         pass
 
@@ -236,6 +247,7 @@ def handle_subscription_past_due(data):
         sub        = Subscription.objects.get(paddle_subscription_id=sub_id)
         sub.status = 'past_due'
         sub.save()
+        invalidate_entitlement(sub.organization_id)
     except Subscription.DoesNotExist:
         pass
 
@@ -248,6 +260,7 @@ def handle_transaction_completed(data):
             sub        = Subscription.objects.get(paddle_subscription_id=sub_id)
             sub.status = 'active'
             sub.save()
+            invalidate_entitlement(sub.organization_id)
         except Subscription.DoesNotExist:
             pass
 
@@ -260,5 +273,6 @@ def handle_payment_failed(data):
             sub        = Subscription.objects.get(paddle_subscription_id=sub_id)
             sub.status = 'past_due'
             sub.save()
+            invalidate_entitlement(sub.organization_id)
         except Subscription.DoesNotExist:
             pass
@@ -0,0 +1,8 @@
+from .permissions import get_active_membership
+
+
+def active_membership(request):
+    """The request's OrganizationMember (with organization and subscription) for base.html — from the membership cache."""
+    if not request.user.is_authenticated:
+        return {}
+    return {'active_membership': get_active_membership(request)}
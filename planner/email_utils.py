@@ -1,26 +1,205 @@
+import hashlib
+from datetime import timedelta
+
+import requests
 import resend
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .jobs import enqueue, job_handler, backoff
+from .models import Job, OutboundEmail
 
 resend.api_key = settings.RESEND_API_KEY
 
+OUTBOX_BATCH_SIZE    = 100  # Resend's batch limit
+OUTBOX_MAX_BATCHES   = 20   # per flush job; a fresh job picks up the rest
+OUTBOX_MAX_ATTEMPTS  = 6
+OUTBOX_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def send_email(to: str, subject: str, html: str, dedupe_key: str = None):
+    """
+    Central email sending function. Writes to the outbox inside the caller's
+    transaction; the flush_outbox job delivers it. A repeated dedupe_key is a no-op.
+    """
+    fields = {'to_email': to, 'subject': subject, 'html': html}
+    if dedupe_key:
+        try:
+            with transaction.atomic():
+                message, created = OutboundEmail.objects.get_or_create(dedupe_key=dedupe_key, defaults=fields)
+        except IntegrityError:
+            return OutboundEmail.objects.get(dedupe_key=dedupe_key)
+        if not created:
+            return message
+    else:
+        message = OutboundEmail.objects.create(**fields)
+    schedule_outbox_flush()
+    return message
+
+
+def send_emails(messages):
+    """
+    Queue many emails at once: one insert and one flush job however many there are.
+    messages are dicts of send_email's arguments; repeated dedupe_keys are skipped.
+    """
+    rows = [
+        OutboundEmail(to_email=m['to'], subject=m['subject'], html=m['html'], dedupe_key=m.get('dedupe_key'))
+        for m in messages
+    ]
+    if not rows:
+        return []
+    OutboundEmail.objects.bulk_create(rows, batch_size=OUTBOX_BATCH_SIZE, ignore_conflicts=True)
+    schedule_outbox_flush()
+    return rows
+
+
+def schedule_outbox_flush(delay=None):
+    """
+    Queue a flush unless one already waiting will run by then — many emails share one job.
+    A flush backed off into the future doesn't count for an email that should go now.
+    """
+    run_by = timezone.now() + (delay or timedelta())
+    if not Job.objects.filter(name='flush_outbox', status='queued', run_at__lte=run_by).exists():
+        enqueue('flush_outbox', delay=delay)
+
+
+# ─────────────────────────────────────────
+# TRANSPORTS
+# ─────────────────────────────────────────
+
+class SessionHTTPClient(resend.HTTPClient):
+    """Resend HTTP client on a shared requests.Session, so batches reuse one keep-alive connection."""
+
+    def __init__(self, timeout=30):
+        self.session = requests.Session()
+        self.timeout = timeout
+
+    def request(self, method, url, headers, json=None, files=None, data=None):
+        try:
+            resp = self.session.request(
+                method, url, headers=headers, json=json if data is None else None,
+                files=files, data=data, timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise RuntimeError(f'Request failed: {e}') from e
+        return resp.content, resp.status_code, resp.headers
+
+
+class ResendTransport:
+    def __init__(self):
+        resend.default_http_client = SessionHTTPClient()
+
+    def send_batch(self, messages):
+        """Returns provider ids in message order. Raises on any failure — the whole batch is retried."""
+        # Same messages → same key, so a retry after a lost response isn't delivered twice
+        key      = hashlib.sha256(','.join(str(m.id) for m in messages).encode()).hexdigest()
+        response = resend.Batch.send([
+            {
+                'from':    settings.DEFAULT_FROM_EMAIL,
+                'to':      [m.to_email],
+                'subject': m.subject,
+                'html':    m.html,
+            }
+            for m in messages
+        ], {'idempotency_key': f'outbox-{key}'})
+        return [item['id'] for item in response['data']]
+
+
+class ConsoleTransport:
+    """Used when no Resend key is configured."""
 
-def send_email(to: str, subject: str, html: str):
-    """Central email sending function using Resend."""
-    if not settings.RESEND_API_KEY:
-        print(f"[EMAIL - no API key] To: {to} | Subject: {subject}")
-        return
+    def send_batch(self, messages):
+        for m in messages:
+            print(f"[EMAIL - no API key] To: {m.to_email} | Subject: {m.subject}")
+        return ['' for _ in messages]
 
-    resend.Emails.send({
-        "from":    settings.DEFAULT_FROM_EMAIL,
-        "to":      [to],
-        "subject": subject,
-        "html":    html,
-    })
+
+class LocMemTransport:
+    """Keeps sent messages in LocMemTransport.outbox — for tests."""
+    outbox = []
+
+    def send_batch(self, messages):
+        self.outbox.extend(messages)
+        return [f'locmem-{m.id}' for m in messages]
+
+
+_transport = None
+
+
+def get_transport():
+    """EMAIL_TRANSPORT setting (dotted path) wins; otherwise Resend when a key is set."""
+    global _transport
+    path = getattr(settings, 'EMAIL_TRANSPORT', '') or (
+        'planner.email_utils.ResendTransport' if settings.RESEND_API_KEY else 'planner.email_utils.ConsoleTransport'
+    )
+    if not isinstance(_transport, import_string(path)):
+        _transport = import_string(path)()
+    return _transport
+
+
+# ─────────────────────────────────────────
+# DELIVERY
+# ─────────────────────────────────────────
+
+def claim_outbox_batch(limit=OUTBOX_BATCH_SIZE):
+    now = timezone.now()
+    # Messages claimed by a sender that died are due again
+    OutboundEmail.objects.filter(status='sending', claimed_at__lt=now - OUTBOX_CLAIM_TIMEOUT).update(status='queued')
+    ids = list(OutboundEmail.objects.filter(
+        status='queued', next_attempt_at__lte=now
+    ).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    OutboundEmail.objects.filter(id__in=ids, status='queued').update(status='sending', claimed_at=now)
+    return list(OutboundEmail.objects.filter(id__in=ids, status='sending', claimed_at=now).order_by('id'))
+
+
+@job_handler('flush_outbox', priority=10, max_attempts=3)
+def flush_outbox(payload=None):
+    """Deliver due outbox messages in batches. Returns counts."""
+    transport = get_transport()
+    sent = retry = failed = 0
+    for _ in range(OUTBOX_MAX_BATCHES):
+        batch = claim_outbox_batch()
+        if not batch:
+            break
+        try:
+            provider_ids = transport.send_batch(batch)
+        except Exception as e:
+            now = timezone.now()
+            for m in batch:
+                m.attempts  += 1
+                m.last_error = str(e)[:2000]
+                if m.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    m.status = 'failed'
+                    failed  += 1
+                else:
+                    m.status, m.next_attempt_at = 'queued', now + backoff(m.attempts)
+                    retry  += 1
+            OutboundEmail.objects.bulk_update(batch, ['status', 'attempts', 'last_error', 'next_attempt_at'])
+            continue
+        now = timezone.now()
+        for m, provider_id in zip(batch, provider_ids):
+            m.status, m.provider_id, m.sent_at = 'sent', provider_id or '', now
+            m.attempts += 1
+        OutboundEmail.objects.bulk_update(batch, ['status', 'provider_id', 'sent_at', 'attempts'])
+        sent += len(batch)
+
+    # Come back for anything still waiting — now if we stopped early, else when the next retry is due
+    next_due = OutboundEmail.objects.filter(status='queued').order_by('next_attempt_at').values_list(
+        'next_attempt_at', flat=True
+    ).first()
+    if next_due:
+        schedule_outbox_flush(delay=max(next_due - timezone.now(), timedelta()))
+    return {'sent': sent, 'retry': retry, 'failed': failed}
 
 
 def send_verification_email(user, token):
     url = f"{settings.APP_URL}/verify-email/{token}/"
     send_email(
+        dedupe_key=f"verify:{token}",
         to=user.email,
         subject="Verify your SprintFlow email",
         html=f"""
@@ -43,6 +222,7 @@ def send_verification_email(user, token):
 def send_password_reset_email(user, token):
     url = f"{settings.APP_URL}/password-reset/{token}/"
     send_email(
+        dedupe_key=f"reset:{token}",
         to=user.email,
         subject="Reset your SprintFlow password",
         html=f"""
@@ -61,9 +241,11 @@ def send_password_reset_email(user, token):
         """
     )
 
-def send_invite_email(invited_by, invite_token, organization):
+def invite_email(invited_by, invite_token, organization):
+    """The invite message as send_email arguments, so bulk invites can queue them together."""
     url = f"{settings.APP_URL}/invite/{invite_token.token}/"
-    send_email(
+    return dict(
+        dedupe_key=f"invite:{invite_token.token}",
         to=invite_token.email,
         subject=f"You're invited to join {organization.name} on SprintFlow",
         html=f"""
@@ -83,3 +265,7 @@ def send_invite_email(invited_by, invite_token, organization):
         </div>
         """
     )
+
+
+def send_invite_email(invited_by, invite_token, organization):
+    send_email(**invite_email(invited_by, invite_token, organization))
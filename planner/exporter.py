@@ -0,0 +1,205 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Sum
+
+from .models import CapacityRollup, Stream, StreamAssignment, UserStory, Vote
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'ndjson')
+EXPORT_CHUNK   = 2000  # rows fetched per round trip while streaming
+
+# sheet key -> (sheet title, NDJSON record type, [(field, header, xlsx width)])
+EXPORT_SHEETS = {
+    'stories': ('User Stories', 'story', [
+        ('number',           '#',                5),
+        ('title',            'User Story',       45),
+        ('description',      'Description',      35),
+        ('owner',            'Owner',            20),
+        ('owner_stream',     'Owner Stream',     14),
+        ('involved_streams', 'Involved Streams', 30),
+        ('vote_average',     'Vote Average',     14),
+        ('final_sp',         'Final SP',         10),
+        ('voting_status',    'Voting Status',    16),
+        ('status',           'Status',           16),
+        ('sprint',           'Sprint',           20),
+    ]),
+    'assignments': ('Stream Assignments', 'assignment', [
+        ('story',  'User Story', 45),
+        ('stream', 'Stream',     20),
+        ('member', 'Member',     28),
+        ('sp',     'SP',         10),
+        ('sprint', 'Sprint',     20),
+    ]),
+    'votes': ('Votes', 'vote', [
+        ('story',    'User Story', 45),
+        ('member',   'Member',     28),
+        ('stream',   'Stream',     20),
+        ('points',   'Points',     10),
+        ('voted_at', 'Voted At',   20),
+        ('sprint',   'Sprint',     20),
+    ]),
+    'capacity': ('Capacity', 'capacity', [
+        ('member', 'Member', 28),
+        ('stream', 'Stream', 20),
+        ('sp',     'SP',     10),
+        ('sprint', 'Sprint', 20),
+    ]),
+}
+
+
+def _person(first, last, username):
+    return f'{first or ""} {last or ""}'.strip() or username
+
+
+class SprintExport:
+    """
+    Row generators for one or more sprints. Every sheet is a single streamed query
+    — memory stays flat however many stories the sprints hold.
+    """
+
+    def __init__(self, organization, sprints):
+        self.sprints      = list(sprints)
+        self.sprint_ids   = [s.id for s in self.sprints]
+        self.sprint_names = {s.id: s.name for s in self.sprints}
+        self.stream_names = {
+            str(stream_id): name
+            for stream_id, name in Stream.objects.filter(organization=organization).values_list('id', 'name')
+        }
+
+    def rows(self, sheet):
+        return getattr(self, sheet)()
+
+    def stories(self):
+        stories = UserStory.objects.filter(sprint_id__in=self.sprint_ids).select_related(
+            'owner__user', 'owner__stream'
+        ).order_by('sprint_id', 'order', 'created_at', 'id')
+        for i, story in enumerate(stories.iterator(chunk_size=EXPORT_CHUNK), 1):
+            yield {
+                'number':           i,
+                'title':            story.title,
+                'description':      story.description or '',
+                'owner':            story.owner.display_name() if story.owner else '—',
+                'owner_stream':     story.owner.stream.name if story.owner and story.owner.stream else '—',
+                'involved_streams': ', '.join(
+                    self.stream_names.get(str(s), str(s)) for s in story.involved_streams
+                ) or '—',
+                'vote_average':     story.vote_average,
+                'final_sp':         story.final_sp,
+                'voting_status':    story.get_voting_status_display(),
+                'status':           story.get_status_display(),
+                'sprint':           self.sprint_names[story.sprint_id],
+            }
+
+    def assignments(self):
+        rows = StreamAssignment.objects.filter(user_story__sprint_id__in=self.sprint_ids).values_list(
+            'user_story__sprint_id', 'user_story__title', 'stream__name',
+            'member__user__first_name', 'member__user__last_name', 'member__user__username', 'sp',
+        ).order_by('user_story__sprint_id', 'user_story__order', 'user_story_id', 'stream__name')
+        for sprint_id, title, stream, first, last, username, sp in rows.iterator(chunk_size=EXPORT_CHUNK):
+            yield {
+                'story':  title,
+                'stream': stream,
+                'member': _person(first, last, username),
+                'sp':     sp,
+                'sprint': self.sprint_names[sprint_id],
+            }
+
+    def votes(self):
+        rows = Vote.objects.filter(user_story__sprint_id__in=self.sprint_ids).values_list(
+            'user_story__sprint_id', 'user_story__title', 'user_story__voting_status',
+            'member__user__first_name', 'member__user__last_name', 'member__user__username',
+            'member__stream__name', 'points', 'created_at',
+        ).order_by('user_story__sprint_id', 'user_story__order', 'user_story_id', 'created_at')
+        for sprint_id, title, voting_status, first, last, username, stream, points, created_at in rows.iterator(
+            chunk_size=EXPORT_CHUNK
+        ):
+            yield {
+                'story':    title,
+                'member':   _person(first, last, username),
+                'stream':   stream or '—',
+                # Points stay hidden until the round is closed, as in the vote room
+                'points':   points if voting_status == 'closed' else None,
+                'voted_at': created_at,
+                'sprint':   self.sprint_names[sprint_id],
+            }
+
+    def capacity(self):
+        rows = CapacityRollup.objects.filter(sprint_id__in=self.sprint_ids).values(
+            'sprint_id', 'member__user__first_name', 'member__user__last_name',
+            'member__user__username', 'stream__name',
+        ).annotate(total=Sum('sp')).filter(total__gt=0).order_by(
+            'sprint_id', 'member__user__first_name', 'member__user__username', 'stream__name'
+        )
+        for r in rows:
+            yield {
+                'member': _person(r['member__user__first_name'], r['member__user__last_name'],
+                                  r['member__user__username']),
+                'stream': r['stream__name'] or 'Owned stories',
+                'sp':     r['total'],
+                'sprint': self.sprint_names[r['sprint_id']],
+            }
+
+
+# ─────────────────────────────────────────
+# WRITERS
+# ─────────────────────────────────────────
+
+def write_xlsx(export, fileobj):
+    """Write-only workbook: rows go straight to disk, nothing is kept per cell."""
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    header_fill = PatternFill('solid', fgColor='4F46E5')
+    header_font = Font(bold=True, color='FFFFFF', size=11)
+
+    wb = openpyxl.Workbook(write_only=True)
+    for sheet, (title, _, columns) in EXPORT_SHEETS.items():
+        ws = wb.create_sheet(title)
+        for i, (_, _, width) in enumerate(columns, 1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+        ws.freeze_panes = 'A2'
+
+        header = []
+        for _, label, _ in columns:
+            cell           = WriteOnlyCell(ws, value=label)
+            cell.font      = header_font
+            cell.fill      = header_fill
+            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+            header.append(cell)
+        ws.append(header)
+
+        for row in export.rows(sheet):
+            values = []
+            for field, _, _ in columns:
+                value = row[field]
+                if hasattr(value, 'tzinfo') and value.tzinfo:
+                    value = value.replace(tzinfo=None)  # Excel has no time zones
+                values.append('—' if value is None else value)
+            ws.append(values)
+    wb.save(fileobj)
+
+
+class _Echo:
+    """File-like whose write() hands the line back, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(export, sheet):
+    _, _, columns = EXPORT_SHEETS[sheet]
+    writer = csv.writer(_Echo())
+    yield '\ufeff'  # BOM so Excel opens UTF-8 correctly
+    yield writer.writerow([label for _, label, _ in columns])
+    for row in export.rows(sheet):
+        yield writer.writerow(['' if row[f] is None else row[f] for f, _, _ in columns])
+
+
+def iter_ndjson(export, sheets=None):
+    """One JSON object per line, tagged with its record type; all sheets by default."""
+    for sheet in sheets or EXPORT_SHEETS:
+        _, record_type, _ = EXPORT_SHEETS[sheet]
+        for row in export.rows(sheet):
+            yield json.dumps({'type': record_type, **row}, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,252 @@
+import codecs
+import csv
+import io
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue, job_handler
+from .models import CapacityRollup, ImportJob, SprintMember, Stream, UserStory, RANK_STEP
+
+IMPORT_BATCH_SIZE   = 500
+IMPORT_INLINE_BYTES = 256 * 1024  # larger uploads run as an ImportJob
+IMPORT_MAX_WARNINGS = 100
+IMPORT_FORMATS      = ('.xlsx', '.csv')
+
+COLUMN_HEADERS = {
+    'title':       ['title', 'user story', 'story', 'name'],
+    'description': ['description', 'desc', 'detail'],
+    'sp':          ['sp', 'story point', 'points', 'estimate'],
+    'owner':       ['owner', 'assignee'],
+    'streams':     ['stream'],
+}
+
+
+class StoryImportError(Exception):
+    """The file can't be imported at all (unreadable, no title column...)."""
+
+
+# ─────────────────────────────────────────
+# READING
+# ─────────────────────────────────────────
+
+def read_rows(fileobj, filename):
+    """Yield rows as tuples of cell values, streaming from an .xlsx or .csv file."""
+    if filename.lower().endswith('.csv'):
+        try:
+            yield from csv.reader(codecs.iterdecode(fileobj, 'utf-8-sig'))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise StoryImportError(f'Failed to read CSV (it must be UTF-8): {e}')
+        return
+
+    import openpyxl
+    try:
+        wb = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as e:
+        raise StoryImportError(f'Failed to read file: {e}')
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def map_columns(header):
+    headers = [str(h).strip().lower() if h is not None else '' for h in header]
+    cols    = {}
+    for key, candidates in COLUMN_HEADERS.items():
+        for c in candidates:
+            match = next((i for i, h in enumerate(headers) if c in h and i not in cols.values()), None)
+            if match is not None:
+                cols[key] = match
+                break
+    if 'title' not in cols:
+        raise StoryImportError('Could not find a title column.')
+    return cols
+
+
+# ─────────────────────────────────────────
+# IMPORT
+# ─────────────────────────────────────────
+
+class StoryImport:
+    """
+    Turn rows into UserStory objects and bulk_create them in batches, with ranks
+    taken once up front. dry_run validates and counts without writing anything.
+    """
+
+    def __init__(self, sprint, dry_run=False, progress=None):
+        self.sprint    = sprint
+        self.org_id    = sprint.organization_id
+        self.dry_run   = dry_run
+        self.progress  = progress  # called with this import after every batch
+        self.rows_read = self.created = self.skipped = 0
+        self.warnings  = []
+        self.story_ids = []  # written so far, for undo()
+
+        members = SprintMember.objects.filter(organization_id=self.org_id, is_active=True).select_related('user')
+        self.members = {m.display_name().strip().lower(): m.id for m in members}
+        self.streams = {
+            name.strip().lower(): str(stream_id)
+            for stream_id, name in Stream.objects.filter(organization_id=self.org_id).values_list('id', 'name')
+        }
+
+    def warn(self, row_number, message):
+        if len(self.warnings) < IMPORT_MAX_WARNINGS:
+            self.warnings.append(f'Row {row_number}: {message}')
+
+    def run(self, rows):
+        rows   = iter(rows)
+        header = next(rows, None)
+        if header is None:
+            raise StoryImportError('The file is empty.')
+        cols  = map_columns(header)
+        rank  = UserStory.objects.filter(organization_id=self.org_id).next_rank()
+        batch = []
+        for number, row in enumerate(rows, start=2):
+            self.rows_read += 1
+            story = self.parse_row(number, row, cols)
+            if story is None:
+                self.skipped += 1
+                continue
+            story.order = rank
+            rank       += RANK_STEP
+            batch.append(story)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+        return self
+
+    def parse_row(self, number, row, cols):
+        def cell(key):
+            i = cols.get(key)
+            return row[i] if i is not None and i < len(row) else None
+
+        title = cell('title')
+        if title is None or str(title).strip() == '':
+            return None
+        title = str(title).strip()
+        if len(title) > 300:
+            self.warn(number, 'title longer than 300 characters was truncated')
+            title = title[:300]
+
+        final_sp = None
+        raw_sp   = cell('sp')
+        if raw_sp not in (None, ''):
+            try:
+                final_sp = float(raw_sp)
+            except (ValueError, TypeError):
+                self.warn(number, f'SP "{raw_sp}" is not a number — left blank')
+
+        owner_id  = None
+        raw_owner = cell('owner')
+        if raw_owner not in (None, ''):
+            owner_id = self.members.get(str(raw_owner).strip().lower())
+            if owner_id is None:
+                self.warn(number, f'owner "{raw_owner}" is not an active member — left unassigned')
+
+        streams = []
+        for name in str(cell('streams') or '').split(','):
+            name = name.strip()
+            if not name:
+                continue
+            if name.lower() in self.streams:
+                streams.append(self.streams[name.lower()])
+            else:
+                self.warn(number, f'unknown stream "{name}" ignored')
+
+        description = cell('description')
+        return UserStory(
+            organization_id=self.org_id,
+            sprint=self.sprint,
+            title=title,
+            description=str(description).strip() if description is not None else '',
+            owner_id=owner_id,
+            final_sp=final_sp,
+            involved_streams=streams,
+        )
+
+    def flush(self, batch):
+        if not batch:
+            return
+        if not self.dry_run:
+            with transaction.atomic():
+                UserStory.objects.bulk_create(batch)
+                self.story_ids += [story.id for story in batch]
+                # bulk_create skips save(), so apply the owners' capacity here
+                owned = defaultdict(float)
+                for story in batch:
+                    if story.owner_id and story.final_sp:
+                        owned[story.owner_id] += story.final_sp
+                for owner_id, sp in owned.items():
+                    CapacityRollup.apply(self.org_id, self.sprint.id, owner_id, None, sp)
+        self.created += len(batch)
+        if self.progress:
+            self.progress(self)
+
+    def undo(self):
+        """Delete the stories this import wrote (the delete signals take their capacity back). Returns how many."""
+        with transaction.atomic():
+            deleted = UserStory.objects.filter(id__in=self.story_ids).delete()[1].get(UserStory._meta.label, 0)
+        self.story_ids = []
+        self.created   = 0
+        return deleted
+
+    def as_dict(self):
+        return {
+            'dry_run':   self.dry_run,
+            'rows_read': self.rows_read,
+            'created':   self.created,
+            'skipped':   self.skipped,
+            'warnings':  self.warnings,
+        }
+
+
+# ─────────────────────────────────────────
+# BACKGROUND JOBS
+# ─────────────────────────────────────────
+
+@job_handler('import_stories', max_attempts=1)
+def run_import_job(payload):
+    """Run a queued ImportJob to completion, recording progress on the row."""
+    job = ImportJob.objects.select_related('sprint').get(id=payload['import_job_id'])
+    job.status = 'running'
+    job.save(update_fields=['status'])
+
+    def progress(result):
+        ImportJob.objects.filter(id=job.id).update(
+            rows_read=result.rows_read, created=result.created, skipped=result.skipped
+        )
+
+    result = StoryImport(job.sprint, dry_run=job.dry_run, progress=progress)
+    try:
+        result.run(read_rows(io.BytesIO(job.payload), job.filename))
+        job.status = 'done'
+    except Exception as e:
+        message = str(e) if isinstance(e, StoryImportError) else f'Import stopped: {e}'
+        job.status, job.error = 'failed', f'{message} {_undo_partial_import(result)}'.strip()
+    job.rows_read   = result.rows_read
+    job.created     = result.created
+    job.skipped     = result.skipped
+    job.warnings    = result.warnings
+    job.payload     = None
+    job.finished_at = timezone.now()
+    job.save()
+
+
+def _undo_partial_import(result):
+    """Remove what a failed import already committed, so a re-upload doesn't duplicate it."""
+    if not result.story_ids:
+        return ''
+    kept = len(result.story_ids)
+    try:
+        removed = result.undo()
+    except Exception:
+        return f'({kept} stories created before the failure were kept in the sprint.)'
+    return f'({removed} stories created before the failure were removed.)'
+
+
+def start_import_job(job):
+    """Hand the import to the job queue; it becomes visible to workers when this transaction commits."""
+    return enqueue('import_stories', {'import_job_id': job.id}, organization=job.organization)
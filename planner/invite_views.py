@@ -1,14 +1,27 @@
+import codecs
+import csv
 import json
 import uuid as uuid_lib
+from datetime import timedelta
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from .models import InviteToken, Organization, OrganizationMember, SprintMember, Team
-from .email_utils import send_invite_email
-from .permissions import require_scrum_master_api, is_admin
+from .email_utils import invite_email, send_emails, send_invite_email
+from .middleware import member_seats_left
+from .permissions import require_scrum_master_api, get_active_membership
+from .usage import track
+
+INVITE_ROLES      = ('admin', 'scrum_master', 'voter', 'viewer')
+BULK_INVITE_LIMIT = 500
 
 
 @require_POST
@@ -25,10 +38,10 @@ def send_invite(request):
     if not email:
         return JsonResponse({'error': 'Email is required'}, status=400)
 
-    if role not in ('admin', 'scrum_master', 'voter', 'viewer'):
+    if role not in INVITE_ROLES:
         return JsonResponse({'error': 'Invalid role'}, status=400)
 
-    if role == 'admin' and not is_admin(request.user, org):
+    if role == 'admin' and not get_active_membership(request).is_admin():
         return JsonResponse({'error': 'Only admins can invite admins'}, status=403)
 
     if OrganizationMember.objects.filter(
@@ -56,6 +69,142 @@ def send_invite(request):
     return JsonResponse({'ok': True, 'email': email, 'role': role})
 
 
+# ─────────────────────────────────────────
+# BULK INVITES
+# ─────────────────────────────────────────
+
+def _read_invite_csv(upload):
+    """Rows of {email, role, team} from a CSV; the header row is optional when email is the first column."""
+    rows   = csv.reader(codecs.iterdecode(upload, 'utf-8-sig'))
+    first  = next(rows, None) or []
+    header = [h.strip().lower() for h in first]
+    if 'email' in header:
+        cols = {key: header.index(key) for key in ('email', 'role', 'team') if key in header}
+    else:
+        cols = {'email': 0}
+        rows = [first, *rows]
+    for row in rows:
+        yield {key: row[i].strip() for key, i in cols.items() if i < len(row) and row[i].strip()}
+
+
+@require_POST
+@require_scrum_master_api
+def bulk_invite(request):
+    """
+    Invite many people at once, from JSON {invites: [{email, role?, team?}], role?, team?}
+    or a CSV upload (email, role, team columns). Existing members and live invites are
+    skipped; the plan's member limit is checked once for the whole batch.
+    """
+    from .views import get_org
+    org      = get_org(request)
+    is_admin = get_active_membership(request).is_admin()
+
+    if 'file' in request.FILES:
+        default_role = request.POST.get('role', 'voter')
+        default_team = request.POST.get('team', '')
+        resend       = request.POST.get('resend') in ('1', 'true', 'on')
+        try:
+            entries = list(_read_invite_csv(request.FILES['file']))
+        except (UnicodeDecodeError, csv.Error) as e:
+            return JsonResponse({'error': f'Failed to read CSV (it must be UTF-8): {e}'}, status=400)
+    else:
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        default_role = data.get('role', 'voter')
+        default_team = data.get('team_id') or data.get('team') or ''
+        resend       = bool(data.get('resend'))
+        entries      = [e if isinstance(e, dict) else {'email': e} for e in data.get('invites') or []]
+
+    if not entries:
+        return JsonResponse({'error': 'No invites given'}, status=400)
+    if len(entries) > BULK_INVITE_LIMIT:
+        return JsonResponse({'error': f'At most {BULK_INVITE_LIMIT} invites per request'}, status=400)
+
+    teams = {}
+    for team in Team.objects.filter(organization=org):
+        teams[str(team.id)]              = team
+        teams[team.name.strip().lower()] = team
+
+    invalid, wanted = [], {}
+    for entry in entries:
+        email = str(entry.get('email') or '').strip().lower()
+        role  = str(entry.get('role') or default_role).strip().lower().replace(' ', '_')
+        team  = str(entry.get('team_id') or entry.get('team') or default_team).strip()
+        try:
+            validate_email(email)
+        except ValidationError:
+            invalid.append({'email': email, 'reason': 'invalid email'})
+            continue
+        if role not in INVITE_ROLES:
+            invalid.append({'email': email, 'reason': f'invalid role "{role}"'})
+        elif role == 'admin' and not is_admin:
+            invalid.append({'email': email, 'reason': 'only admins can invite admins'})
+        elif team and team.lower() not in teams:
+            invalid.append({'email': email, 'reason': f'unknown team "{team}"'})
+        else:
+            wanted.setdefault(email, (role, teams.get(team.lower())))
+
+    # Who is already in, or already holds a live invite — membership wins when both
+    live_since = timezone.now() - timedelta(days=7)
+    members    = set(
+        OrganizationMember.objects.filter(organization=org).annotate(
+            email_lower=Lower('user__email')
+        ).filter(email_lower__in=wanted).values_list('email_lower', flat=True)
+    )
+    invited    = set(
+        InviteToken.objects.filter(
+            organization=org, status='pending', created_at__gte=live_since
+        ).annotate(email_lower=Lower('email')).filter(email_lower__in=wanted).values_list('email_lower', flat=True)
+    ) - members
+    skipped = [{'email': email, 'reason': 'already a member'} for email in wanted if email in members]
+    if not resend:
+        skipped += [{'email': email, 'reason': 'already invited'} for email in wanted if email in invited]
+    skip_emails = {s['email'] for s in skipped}
+    to_invite   = [email for email in wanted if email not in skip_emails]
+
+    seats = member_seats_left(org)
+    if seats is not None and len(to_invite) > seats:
+        return JsonResponse({
+            'error':      f'Your plan has room for {seats} more member(s); this would invite {len(to_invite)}.',
+            'seats_left': seats,
+        }, status=403)
+
+    invites = [
+        InviteToken(
+            organization=org,
+            invited_by=request.user,
+            email=email,
+            role=wanted[email][0],
+            team=wanted[email][1],
+            status='pending',
+            token=uuid_lib.uuid4(),
+        )
+        for email in to_invite
+    ]
+    with transaction.atomic():
+        # A row saved with other casing (e.g. in admin) wouldn't conflict with the upsert below
+        InviteToken.objects.filter(organization=org).annotate(email_lower=Lower('email')).filter(
+            email_lower__in=to_invite
+        ).exclude(email__in=to_invite).delete()
+        # Expired, accepted-then-left and re-sent invites are overwritten with a fresh token
+        InviteToken.objects.bulk_create(
+            invites,
+            update_conflicts=True,
+            unique_fields=['organization', 'email'],
+            update_fields=['invited_by', 'role', 'team', 'status', 'token', 'created_at'],  # restarts the 7 days
+        )
+        send_emails([invite_email(request.user, invite, org) for invite in invites])
+
+    return JsonResponse({
+        'ok':      True,
+        'invited': [{'email': i.email, 'role': i.role} for i in invites],
+        'skipped': skipped,
+        'invalid': invalid,
+    })
+
+
 @require_POST
 @require_scrum_master_api
 def cancel_invite(request, invite_id):
@@ -66,7 +215,9 @@ def cancel_invite(request, invite_id):
     return JsonResponse({'ok': True})
 
 
+@transaction.atomic
 def accept_invite(request, token):
+    from .views import members_changed
     invite = get_object_or_404(InviteToken, token=token, status='pending')
 
     if invite.is_expired():
@@ -90,6 +241,7 @@ def accept_invite(request, token):
                 user=existing_user,
                 role=invite.role,
             )
+            track(invite.organization_id, members=1)
             SprintMember.objects.get_or_create(
                 organization=invite.organization,
                 user=existing_user,
@@ -100,6 +252,7 @@ def accept_invite(request, token):
             )
             invite.status = 'accepted'
             invite.save()
+            members_changed(invite.organization)
             login(request, existing_user)
             return redirect('sm_panel')
 
@@ -139,6 +292,7 @@ def accept_invite(request, token):
                 user=user,
                 role=invite.role,
             )
+            track(invite.organization_id, members=1)
             SprintMember.objects.get_or_create(
                 organization=invite.organization,
                 user=user,
@@ -149,6 +303,7 @@ def accept_invite(request, token):
             )
             invite.status = 'accepted'
             invite.save()
+            members_changed(invite.organization)
             login(request, user)
             return redirect('sm_panel')
 
@@ -166,9 +321,9 @@ def accept_invite(request, token):
 @login_required
 def list_invites(request):
     from .views import get_org
-    from .permissions import is_scrum_master_or_above
-    org = get_org(request)
-    if not org or not is_scrum_master_or_above(request.user, org):
+    org        = get_org(request)
+    membership = get_active_membership(request)
+    if not org or not membership.is_scrum_master():
         return JsonResponse({'error': 'Forbidden'}, status=403)
 
     invites = InviteToken.objects.filter(
@@ -0,0 +1,161 @@
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_BACKOFF_BASE  = 10        # seconds before the first retry; doubles per attempt
+JOB_BACKOFF_MAX   = 60 * 60
+JOB_STALE_AFTER   = 15 * 60   # a running job not finished by then is assumed lost
+
+_handlers = {}  # name -> (func, options)
+
+
+# ─────────────────────────────────────────
+# REGISTRY
+# ─────────────────────────────────────────
+
+def job_handler(name, queue='default', priority=0, max_attempts=5):
+    """
+    Register func(payload) as the handler for jobs called `name`.
+    Whatever it returns (JSON-serialisable) is stored as the job's result.
+    """
+    def register(func):
+        _handlers[name] = (func, {'queue': queue, 'priority': priority, 'max_attempts': max_attempts})
+        return func
+    return register
+
+
+def enqueue(name, payload=None, organization=None, priority=None, delay=None, run_at=None):
+    """
+    Queue a job. The row commits with the caller's transaction, so a worker never
+    sees a job for data that was rolled back. With JOBS_EAGER it runs on commit, in-process.
+    """
+    _, options = _handlers[name]
+    job = Job.objects.create(
+        name=name,
+        queue=options['queue'],
+        payload=payload or {},
+        organization=organization,
+        priority=options['priority'] if priority is None else priority,
+        max_attempts=options['max_attempts'],
+        run_at=run_at or timezone.now() + (delay or timedelta()),
+    )
+    if getattr(settings, 'JOBS_EAGER', False) and not delay and not run_at:
+        transaction.on_commit(lambda: run_claimed(claim_job(job.id, 'eager')))
+    return job
+
+
+# ─────────────────────────────────────────
+# CLAIMING
+# ─────────────────────────────────────────
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_next(worker, queues=('default',)):
+    """
+    Lock the most urgent due job and mark it running. Postgres skips rows other
+    workers hold (SKIP LOCKED); elsewhere the conditional UPDATE decides who wins.
+    """
+    due = Job.objects.filter(
+        status='queued', queue__in=queues, run_at__lte=timezone.now()
+    ).order_by('-priority', 'run_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = due.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status, job.locked_by, job.locked_at = 'running', worker, timezone.now()
+            job.attempts += 1
+            job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts'])
+            return job
+
+    for job_id in due.values_list('id', flat=True)[:5]:
+        job = claim_job(job_id, worker)
+        if job:
+            return job
+    return None
+
+
+def claim_job(job_id, worker):
+    """Claim one specific queued job; None if someone else got it first."""
+    won = Job.objects.filter(id=job_id, status='queued').update(
+        status='running', locked_by=worker, locked_at=timezone.now(), attempts=F('attempts') + 1
+    )
+    return Job.objects.get(id=job_id) if won else None
+
+
+def requeue_stale(older_than=JOB_STALE_AFTER):
+    """
+    Put back jobs whose worker died mid-run, if they have attempts left; the rest
+    fail, so a max_attempts=1 job (e.g. an import) never runs twice. Returns how many were requeued.
+    """
+    now    = timezone.now()
+    stale  = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=older_than))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_by='', locked_at=None, finished_at=now,
+        last_error='Worker lost while running and no attempts are left',
+    )
+    if failed:
+        logger.error('%s stale job(s) had no attempts left and were marked failed', failed)
+    return stale.filter(attempts__lt=F('max_attempts')).update(
+        status='queued', locked_by='', locked_at=None, run_at=now
+    )
+
+
+# ─────────────────────────────────────────
+# RUNNING
+# ─────────────────────────────────────────
+
+def backoff(attempts):
+    delay = min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def run_claimed(job):
+    """Run a job returned by claim_*; records the result or schedules a retry."""
+    if job is None:
+        return None
+    entry = _handlers.get(job.name)
+    # The run only owns the row while it still holds this lock — requeue_stale may have handed it on
+    mine  = Job.objects.filter(id=job.id, status='running', locked_by=job.locked_by, locked_at=job.locked_at)
+    try:
+        if entry is None:
+            raise LookupError(f'No handler registered for job "{job.name}"')
+        result = entry[0](job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()[-4000:]
+        job.locked_by, job.locked_at = '', None
+        if job.attempts < job.max_attempts and entry is not None:
+            job.status = 'queued'
+            job.run_at = timezone.now() + backoff(job.attempts)
+            logger.warning('Job %s failed (attempt %s/%s), retrying', job, job.attempts, job.max_attempts,
+                           exc_info=True)
+        else:
+            job.status      = 'failed'
+            job.finished_at = timezone.now()
+            logger.error('Job %s failed permanently', job, exc_info=True)
+        _finish(job, mine, ['status', 'run_at', 'last_error', 'locked_by', 'locked_at', 'finished_at'])
+        return job
+
+    job.status, job.result, job.finished_at = 'done', result, timezone.now()
+    _finish(job, mine, ['status', 'result', 'finished_at'])
+    return job
+
+
+def _finish(job, mine, fields):
+    if not mine.update(**{f: getattr(job, f) for f in fields}):
+        logger.warning('Job %s lost its lock while running; its outcome was not saved', job)
@@ -0,0 +1,220 @@
+import csv
+import gc
+import io
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+
+from planner.models import Organization, Sprint, SprintMember, UserStory
+from planner.views import get_voting_scale
+
+IMPORT_ROWS = 200  # rows in the CSV posted to import_stories — small enough to import inline
+
+# name → (method, path, body) built from the benchmark context
+SCENARIOS = {
+    'board':          lambda ctx: ('get',  '/board/', None),
+    'sm_panel':       lambda ctx: ('get',  '/sm/panel/', None),
+    'vote_status':    lambda ctx: ('get',  f"/vote/{ctx['voting_story'].id}/status/", None),
+    'submit_vote':    lambda ctx: ('post', f"/vote/{ctx['voting_story'].id}/submit/", ctx['vote_body']),
+    'export_xlsx':    lambda ctx: ('get',  f"/sm/sprints/{ctx['sprint'].id}/export/?format=xlsx", None),
+    'export_csv':     lambda ctx: ('get',  f"/sm/sprints/{ctx['sprint'].id}/export/?format=csv", None),
+    'import_stories': lambda ctx: ('post', f"/sm/sprints/{ctx['sprint'].id}/import/", ctx['import_body']),
+}
+VOTER_SCENARIOS = {'vote_status', 'submit_vote'}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the hot views against an organization (see seed_load_org) with the test client and '
+        'print p50/p95/p99 latency, query counts and peak memory as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', default='load-test', help='Organization slug (default: load-test)')
+        parser.add_argument('--requests', type=int, default=30, help='Timed requests per view (default 30)')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per view first (default 2)')
+        parser.add_argument('--view', action='append', dest='views', choices=sorted(SCENARIOS),
+                            help='View to benchmark; repeatable (default: all)')
+        parser.add_argument('--sprint', type=int, help='Sprint id to export/import (default: the active sprint)')
+        parser.add_argument('--cold-cache', action='store_true',
+                            help='Clear the cache before every request (entitlements, memberships…)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the votes and imported stories (by default every write is rolled back)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1')
+        try:
+            org = Organization.objects.get(slug=options['org'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization '{options['org']}' not found — create it with seed_load_org")
+
+        ctx    = self.context(org, options['sprint'])
+        names  = options['views'] or list(SCENARIOS)
+        report = {
+            'revision':   git_revision(),
+            'django':     django.get_version(),
+            'python':     sys.version.split()[0],
+            'database':   connection.vendor,
+            'org':        ctx['summary'],
+            'requests':   options['requests'],
+            'warmup':     options['warmup'],
+            'cold_cache': options['cold_cache'],
+            'views':      {},
+        }
+
+        # One transaction for the whole run, rolled back, so repeated runs see the same data
+        with transaction.atomic():
+            for name in names:
+                self.stderr.write(f'{name}…')
+                report['views'][name] = self.bench(
+                    name, ctx, options['requests'], options['warmup'], options['cold_cache']
+                )
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        out = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(out + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(out)
+
+    # ─── SETUP ───
+
+    def context(self, org, sprint_id):
+        sprints = Sprint.objects.filter(organization=org)
+        sprint  = sprints.filter(id=sprint_id).first() if sprint_id else sprints.filter(is_active=True).first()
+        if sprint is None:
+            raise CommandError('No sprint to export/import — pass --sprint or seed an active sprint')
+        voting_story = UserStory.objects.filter(organization=org, voting_status='voting').first()
+        if voting_story is None:
+            raise CommandError('The organization has no story open for voting')
+
+        sm = Client()
+        sm.force_login(org.owner)
+        # Voters take turns, so submit_vote exercises both first votes and changed votes
+        voters = []
+        for member in SprintMember.objects.filter(
+            organization=org, is_active=True, user__org_memberships__organization=org,
+            user__org_memberships__role='voter',
+        ).select_related('user')[:20]:
+            client = Client()
+            client.force_login(member.user)
+            voters.append(client)
+        if not voters:
+            raise CommandError('The organization has no active voters')
+
+        rows   = io.StringIO()
+        writer = csv.writer(rows)
+        writer.writerow(['Title', 'Description', 'SP'])
+        for i in range(IMPORT_ROWS):
+            writer.writerow([f'Benchmark story {i + 1}', 'Imported by bench_views', (i % 8) + 1])
+        import_csv = rows.getvalue().encode()
+
+        scale = get_voting_scale(org)
+        return {
+            'sprint':       sprint,
+            'voting_story': voting_story,
+            'sm':           sm,
+            'voters':       voters,
+            'vote_body':    lambda n: {'points': scale[n % len(scale)]},
+            'import_body':  lambda n: {'file': SimpleUploadedFile('bench.csv', import_csv, 'text/csv')},
+            'summary': {
+                'slug':           org.slug,
+                'members':        SprintMember.objects.filter(organization=org).count(),
+                'sprints':        sprints.count(),
+                'stories':        UserStory.objects.filter(organization=org).count(),
+                'sprint_stories': UserStory.objects.filter(sprint=sprint).count(),
+                'votes_on_room':  voting_story.votes.count(),
+            },
+        }
+
+    # ─── MEASURING ───
+
+    def request(self, name, ctx, n):
+        method, path, body = SCENARIOS[name](ctx)
+        client = ctx['voters'][n % len(ctx['voters'])] if name in VOTER_SCENARIOS else ctx['sm']
+        if callable(body):
+            body = body(n)
+        if method == 'get':
+            response = client.get(path)
+        elif name == 'import_stories':
+            response = client.post(path, body)
+        else:
+            response = client.post(path, json.dumps(body), content_type='application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        if response.status_code >= 400:
+            raise CommandError(f'{name}: {method.upper()} {path} answered {response.status_code}')
+        return response
+
+    def bench(self, name, ctx, requests, warmup, cold_cache):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        for n in range(warmup):
+            self.request(name, ctx, n)
+
+        timings = []
+        with connection.execute_wrapper(count):
+            for n in range(requests):
+                if cold_cache:
+                    cache.clear()
+                queries.append(0)
+                gc.collect()
+                start = time.perf_counter()
+                self.request(name, ctx, warmup + n)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        # tracemalloc slows everything down, so memory gets its own (untimed) request
+        if cold_cache:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            self.request(name, ctx, warmup + requests)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'p50_ms':     round(percentile(timings, 50), 2),
+            'p95_ms':     round(percentile(timings, 95), 2),
+            'p99_ms':     round(percentile(timings, 99), 2),
+            'max_ms':     round(timings[-1], 2),
+            'mean_ms':    round(sum(timings) / len(timings), 2),
+            'queries':    {'min': min(queries), 'max': max(queries)},
+            'peak_kib':   round(peak / 1024, 1),
+        }
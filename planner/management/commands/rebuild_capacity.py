@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from planner.models import CapacityRollup, Organization
+
+
+class Command(BaseCommand):
+    help = 'Recompute the capacity rollup table from stories and stream assignments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help='Organization slug (default: all organizations)')
+
+    def handle(self, *args, **options):
+        org = None
+        if options['org']:
+            try:
+                org = Organization.objects.get(slug=options['org'])
+            except Organization.DoesNotExist:
+                raise CommandError(f"Organization '{options['org']}' not found")
+
+        rows = CapacityRollup.rebuild(organization=org)
+        scope = org.name if org else 'all organizations'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} capacity rows for {scope}'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from planner.metering import release_stale
+from planner.models import Organization
+from planner.usage import reconcile_org
+
+
+class Command(BaseCommand):
+    help = 'Recount plan usage counters (members, teams, sprints and AI reservations this month) and fix any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--org', help='Organization slug (default: all organizations)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        orgs = Organization.objects.order_by('id')
+        if options['org']:
+            orgs = orgs.filter(slug=options['org'])
+            if not orgs.exists():
+                raise CommandError(f"Organization '{options['org']}' not found")
+
+        if not options['dry_run']:
+            released = release_stale()
+            if released:
+                self.stdout.write(self.style.WARNING(f'Released {released} abandoned AI reservation(s)'))
+
+        drifted = 0
+        for org_id, slug in orgs.values_list('id', 'slug'):
+            _, drift = reconcile_org(org_id, fix=not options['dry_run'])
+            if drift:
+                drifted += 1
+                changes = ', '.join(f'{k} {stored} → {actual}' for k, (stored, actual) in drift.items())
+                self.stdout.write(f'{slug}: {changes}')
+
+        verb = 'to fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{drifted} organization(s) with drift {verb}'))
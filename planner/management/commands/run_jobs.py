@@ -0,0 +1,74 @@
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from planner.jobs import claim_next, requeue_stale, run_claimed, worker_name
+
+STALE_CHECK_EVERY = 60  # seconds
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue (emails, imports, billing calls).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Worker threads (default 2)')
+        parser.add_argument('--queue', action='append', dest='queues', help='Queue to serve; repeatable (default: default)')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of polling')
+
+    def handle(self, *args, **options):
+        queues = tuple(options['queues'] or ['default'])
+        stop   = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write('Finishing running jobs, then stopping…')
+            stop.set()
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s)'))
+
+        self.stdout.write(f"Serving {', '.join(queues)} with {options['concurrency']} thread(s)")
+        threads = [
+            threading.Thread(
+                target=self.work, args=(f'{worker_name()}/{n}', queues, options['poll'], options['once'], stop),
+                daemon=True,
+            )
+            for n in range(options['concurrency'])
+        ]
+        for t in threads:
+            t.start()
+
+        last_check = time.monotonic()
+        while any(t.is_alive() for t in threads):
+            for t in threads:
+                t.join(timeout=1)
+            if time.monotonic() - last_check > STALE_CHECK_EVERY:
+                requeue_stale()
+                connection.close()
+                last_check = time.monotonic()
+
+    def work(self, worker, queues, poll, once, stop):
+        try:
+            while not stop.is_set():
+                try:
+                    job = run_claimed(claim_next(worker, queues))
+                except DatabaseError as e:
+                    # Lost connection, lock timeout… back off and try again rather than dying
+                    self.stderr.write(f'{worker}: database error, retrying: {e}')
+                    connection.close()
+                    stop.wait(poll)
+                    continue
+                if job is None:
+                    if once:
+                        return
+                    stop.wait(poll)
+                elif job.status == 'failed':
+                    self.stderr.write(f'{job} failed: {job.error_summary()}')
+        finally:
+            connection.close()
@@ -0,0 +1,243 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from planner.models import (
+    Bug, CapacityRollup, Organization, OrganizationMember, Sprint, SprintMember, Stream,
+    StreamAssignment, Subscription, Tag, Task, Team, UserStory, Vote, VoteAggregate, RANK_STEP,
+)
+from planner.usage import reconcile_org
+from planner.views import get_voting_scale
+
+BATCH_SIZE    = 1000
+SPRINT_LENGTH = timedelta(days=14)
+STREAM_NAMES  = ['Backend', 'Frontend', 'QA', 'DevOps', 'Mobile', 'Data', 'Design', 'Security']
+FIRST_NAMES   = ['Ana', 'Bilal', 'Chen', 'Dana', 'Emeka', 'Fatima', 'Goran', 'Hana', 'Ivan', 'Jun',
+                 'Karim', 'Lena', 'Mateo', 'Noor', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sami', 'Tariq']
+LAST_NAMES    = ['Ahmed', 'Baker', 'Costa', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jensen',
+                 'Khan', 'Lopez', 'Meyer', 'Nakamura', 'Okafor', 'Petrov', 'Rossi', 'Silva', 'Tan', 'Weber']
+WORDS         = ['checkout', 'invoice', 'search', 'profile', 'export', 'login', 'dashboard', 'report',
+                 'payment', 'upload', 'notification', 'settings', 'audit log', 'API', 'onboarding', 'filter']
+VERBS         = ['Add', 'Fix', 'Refactor', 'Speed up', 'Redesign', 'Validate', 'Paginate', 'Cache']
+
+# Story status by how far back its sprint is: (status, weight)
+PAST_STATUSES    = [('done', 85), ('cancelled', 10), ('in_review', 5)]
+ACTIVE_STATUSES  = [('estimated', 30), ('in_progress', 30), ('in_review', 15), ('done', 15), ('pending', 10)]
+BACKLOG_STATUSES = [('draft', 50), ('ready', 30), ('pending', 20)]
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic organization for load testing and benchmarks (see bench_views).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slug', default='load-test', help='Organization slug (default: load-test)')
+        parser.add_argument('--members', type=int, default=300)
+        parser.add_argument('--streams', type=int, default=12)
+        parser.add_argument('--teams', type=int, default=20)
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument('--sprints', type=int, default=40)
+        parser.add_argument('--stories', type=int, default=20000)
+        parser.add_argument('--votes-per-story', type=int, default=5, help='Votes on each estimated story')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, so runs are reproducible')
+        parser.add_argument('--password', default='load-test', help='Password for every generated user')
+        parser.add_argument('--replace', action='store_true', help='Delete an existing org with this slug first')
+
+    def handle(self, *args, **options):
+        slug = options['slug']
+        if options['members'] < 2 or options['streams'] < 1 or options['sprints'] < 1:
+            raise CommandError('Need at least 2 members, 1 stream and 1 sprint')
+        if Organization.objects.filter(slug=slug).exists():
+            if not options['replace']:
+                raise CommandError(f"Organization '{slug}' already exists — pass --replace to regenerate it")
+            self.stdout.write(f"Deleting existing '{slug}'…")
+            with transaction.atomic():
+                Organization.objects.filter(slug=slug).delete()
+                User.objects.filter(username__startswith=f'{slug}-').delete()
+
+        self.rng      = random.Random(options['seed'])
+        self.password = make_password(options['password'])  # hashed once, shared by every user
+        self.now      = timezone.now()
+        with transaction.atomic():
+            counts = self.seed(slug, options)
+            CapacityRollup.rebuild(organization=self.org)
+            reconcile_org(self.org.id)
+
+        for name, n in counts.items():
+            self.stdout.write(f'  {name:<18} {n:>8}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded '{slug}'. Log in as {slug}-sm (scrum master) or {slug}-0 … {slug}-{options['members'] - 1} "
+            f"with password '{options['password']}'."
+        ))
+
+    # ─── GENERATION ───
+
+    def seed(self, slug, options):
+        rng    = self.rng
+        owner  = User.objects.create(username=f'{slug}-sm', email=f'sm@{slug}.example.com',
+                                     first_name='Scrum', last_name='Master', password=self.password)
+        self.org = org = Organization.objects.create(name=slug.replace('-', ' ').title(), slug=slug,
+                                                     owner=owner, is_test=True)
+        Subscription.objects.create(organization=org, plan='business', status='active',
+                                    trial_end=self.now + timedelta(days=14))
+        scale  = get_voting_scale(org)
+
+        streams = Stream.objects.bulk_create([
+            Stream(organization=org, name=STREAM_NAMES[i] if i < len(STREAM_NAMES) else f'Stream {i + 1}', order=i)
+            for i in range(options['streams'])
+        ])
+        teams = Team.objects.bulk_create([
+            Team(organization=org, name=f'Team {i + 1}', created_by=owner) for i in range(options['teams'])
+        ])
+        tags = Tag.objects.bulk_create([
+            Tag(organization=org, name=f'{rng.choice(WORDS)}-{i}', color=rng.choice(Tag.COLOR_CHOICES)[0])
+            for i in range(options['tags'])
+        ])
+
+        # ─── Members ───
+        users = User.objects.bulk_create([
+            User(username=f'{slug}-{i}', email=f'member{i}@{slug}.example.com', password=self.password,
+                 first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES))
+            for i in range(options['members'])
+        ], batch_size=BATCH_SIZE)
+        OrganizationMember.objects.bulk_create(
+            [OrganizationMember(organization=org, user=owner, role='admin')] + [
+                OrganizationMember(organization=org, user=u, role='scrum_master' if i % 25 == 0 else 'voter')
+                for i, u in enumerate(users)
+            ], batch_size=BATCH_SIZE,
+        )
+        members = SprintMember.objects.bulk_create(
+            [SprintMember(organization=org, user=owner, stream=streams[0])] + [
+                SprintMember(organization=org, user=u, stream=rng.choice(streams),
+                             team=rng.choice(teams) if teams else None, is_active=rng.random() > 0.05)
+                for u in users
+            ], batch_size=BATCH_SIZE,
+        )
+        active    = [m for m in members if m.is_active]
+        by_stream = defaultdict(list)
+        for m in active:
+            by_stream[m.stream_id].append(m)
+
+        # ─── Sprints: fortnightly, the newest one active ───
+        n_sprints = options['sprints']
+        first     = (self.now - SPRINT_LENGTH * (n_sprints - 1)).date()
+        sprints   = Sprint.objects.bulk_create([
+            Sprint(organization=org, team=rng.choice(teams) if teams else None, name=f'Sprint {i + 1}',
+                   goal=f'{rng.choice(VERBS)} {rng.choice(WORDS)}', start_date=first + SPRINT_LENGTH * i,
+                   end_date=first + SPRINT_LENGTH * (i + 1) - timedelta(days=1), is_active=i == n_sprints - 1)
+            for i in range(n_sprints)
+        ])
+        active_sprint = sprints[-1]
+
+        # ─── Stories: ~10% backlog, the rest spread over the sprints ───
+        stories = []
+        for i in range(options['stories']):
+            sprint = None if rng.random() < 0.1 else rng.choice(sprints)
+            if sprint is None:
+                status = self.weighted(BACKLOG_STATUSES)
+            elif sprint is active_sprint:
+                status = self.weighted(ACTIVE_STATUSES)
+            else:
+                status = self.weighted(PAST_STATUSES)
+            estimated = UserStory.voting_status_for(status) == 'closed'
+            stories.append(UserStory(
+                organization=org, sprint=sprint, owner=rng.choice(active),
+                title=f'{rng.choice(VERBS)} {rng.choice(WORDS)} for {rng.choice(WORDS)} (#{i + 1})',
+                description=f'As a user I want to {rng.choice(VERBS).lower()} the {rng.choice(WORDS)}.',
+                priority=rng.choice(UserStory.PRIORITY_CHOICES)[0], status=status,
+                voting_status=UserStory.voting_status_for(status),
+                involved_streams=[str(s.id) for s in rng.sample(streams, min(len(streams), rng.randint(1, 3)))],
+                final_sp=rng.choice(scale) if estimated else None, order=(i + 1) * RANK_STEP,
+                status_changed_at=self.now,
+            ))
+        # One open voting room in the active sprint, with about half the team voted
+        stories.append(UserStory(
+            organization=org, sprint=active_sprint, owner=active[0], title='Live estimation session',
+            status='voting', voting_status='voting', involved_streams=[str(streams[0].id)],
+            order=(len(stories) + 1) * RANK_STEP, status_changed_at=self.now,
+        ))
+        stories = UserStory.objects.bulk_create(stories, batch_size=BATCH_SIZE)
+
+        # ─── Votes, assignments, tasks, bugs, tags ───
+        votes, aggregates, assignments, tasks, bugs, story_tags = [], [], [], [], [], []
+        for story in stories:
+            voters = []
+            if story.status == 'voting':
+                voters = rng.sample(active, len(active) // 2)
+            elif story.final_sp is not None:
+                voters = rng.sample(active, min(len(active), options['votes_per_story']))
+            if voters:
+                points = {m: rng.choice(scale) for m in voters}
+                votes += [
+                    Vote(user_story=story, member=m, stream_id=m.stream_id, points=p) for m, p in points.items()
+                ]
+                aggregates += self.aggregates(story, points)
+                if story.final_sp is not None:
+                    story.vote_average = round(sum(points.values()) / len(points), 1)
+
+            for stream_id in story.involved_streams:
+                candidates = by_stream.get(int(stream_id))
+                if candidates:
+                    assignments.append(StreamAssignment(
+                        user_story=story, stream_id=int(stream_id), member=rng.choice(candidates),
+                        sp=story.final_sp or rng.choice(scale),
+                    ))
+            for t in range(rng.randint(0, 4)):
+                tasks.append(Task(
+                    organization=org, user_story=story, title=f'{rng.choice(VERBS)} {rng.choice(WORDS)}',
+                    task_type=rng.choice(Task.TYPE_CHOICES)[0], status=rng.choice(Task.STATUS_CHOICES)[0],
+                    assignee=rng.choice(active), story_points=rng.choice(scale[:4]), order=t,
+                    status_changed_at=self.now,
+                ))
+            if rng.random() < 0.2:
+                bugs.append(Bug(
+                    organization=org, user_story=story, title=f'{rng.choice(WORDS).capitalize()} breaks on save',
+                    severity=rng.choice(Bug.SEVERITY_CHOICES)[0], status=rng.choice(Bug.STATUS_CHOICES)[0],
+                    assignee=rng.choice(active), reported_by=rng.choice(active), status_changed_at=self.now,
+                ))
+            if tags:
+                story_tags += [
+                    UserStory.tags.through(userstory_id=story.id, tag_id=tag.id)
+                    for tag in rng.sample(tags, min(len(tags), rng.randint(0, 2)))
+                ]
+
+        UserStory.objects.bulk_update([s for s in stories if s.vote_average is not None], ['vote_average'],
+                                      batch_size=BATCH_SIZE)
+        Vote.objects.bulk_create(votes, batch_size=BATCH_SIZE)
+        VoteAggregate.objects.bulk_create(aggregates, batch_size=BATCH_SIZE)
+        StreamAssignment.objects.bulk_create(assignments, batch_size=BATCH_SIZE)
+        Task.objects.bulk_create(tasks, batch_size=BATCH_SIZE)
+        Bug.objects.bulk_create(bugs, batch_size=BATCH_SIZE)
+        UserStory.tags.through.objects.bulk_create(story_tags, batch_size=BATCH_SIZE)
+
+        return {
+            'members':            len(members),
+            'streams':            len(streams),
+            'teams':              len(teams),
+            'tags':               len(tags),
+            'sprints':            len(sprints),
+            'stories':            len(stories),
+            'votes':              len(votes),
+            'stream assignments': len(assignments),
+            'tasks':              len(tasks),
+            'bugs':               len(bugs),
+            'story tags':         len(story_tags),
+        }
+
+    def weighted(self, choices):
+        return self.rng.choices([c for c, _ in choices], weights=[w for _, w in choices])[0]
+
+    @staticmethod
+    def aggregates(story, points):
+        """The VoteAggregate rows Vote.record() would have built up for these votes."""
+        rows = {}
+        for member, p in points.items():
+            for stream_id in {None, member.stream_id}:
+                agg = rows.setdefault(stream_id, VoteAggregate(user_story=story, stream_id=stream_id))
+                agg.apply(None, p)
+        return list(rows.values())
@@ -0,0 +1,447 @@
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+
+from planner.management.commands.bench_views import percentile
+from planner.models import Organization, OrganizationMember, Sprint, SprintMember, UserStory
+from planner.views import get_voting_scale
+
+HISTOGRAM_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)  # upper bounds, ms
+REQUEST_TIMEOUT   = 30  # seconds
+
+
+# ─────────────────────────────────────────
+# MEASUREMENTS
+# ─────────────────────────────────────────
+
+def summarize(samples, elapsed=None):
+    """Latency percentiles and a histogram for a list of milliseconds."""
+    samples   = sorted(samples)
+    histogram = Counter()
+    for ms in samples:
+        bound = next((b for b in HISTOGRAM_BUCKETS if ms <= b), None)
+        histogram[f'<={bound}ms' if bound else f'>{HISTOGRAM_BUCKETS[-1]}ms'] += 1
+    labels = [f'<={b}ms' for b in HISTOGRAM_BUCKETS] + [f'>{HISTOGRAM_BUCKETS[-1]}ms']
+    return {
+        'count':     len(samples),
+        **({'rps': round(len(samples) / elapsed, 2)} if elapsed else {}),
+        'p50_ms':    round(percentile(samples, 50), 2) if samples else None,
+        'p95_ms':    round(percentile(samples, 95), 2) if samples else None,
+        'p99_ms':    round(percentile(samples, 99), 2) if samples else None,
+        'max_ms':    round(samples[-1], 2) if samples else None,
+        'histogram': {label: histogram[label] for label in labels if histogram[label]},
+    }
+
+
+class Stats:
+    """Thread-safe request log: latency per operation and errors by kind."""
+
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors    = defaultdict(Counter)
+        self.recording = False  # logins and setup happen before the measured window
+
+    def record(self, op, status, ms, payload):
+        if status is None:
+            error = 'connection error'
+        elif status >= 500 and b'database is locked' in payload:
+            error = f'{status} database is locked'
+        elif status >= 400:
+            error = str(status)
+        else:
+            error = None
+        with self.lock:
+            if not self.recording and op != 'login':
+                return
+            self.latencies[op].append(ms)
+            if error:
+                self.errors[op][error] += 1
+
+    def report(self, elapsed):
+        ops   = {}
+        total = 0
+        for op, samples in sorted(self.latencies.items()):
+            errors  = sum(self.errors[op].values())
+            ops[op] = {
+                **summarize(samples, None if op == 'login' else elapsed),
+                'errors':      errors,
+                'error_rate':  round(errors / len(samples), 4),
+                'error_kinds': dict(self.errors[op]),
+            }
+            total += len(samples) if op != 'login' else 0
+        return {'throughput_rps': round(total / elapsed, 2), 'requests': ops}
+
+
+class LockWaits:
+    """
+    execute_wrapper for the in-process server's connections. Times the statements
+    that wait for locks: BEGIN IMMEDIATE takes SQLite's write lock (see DATABASES),
+    SELECT … FOR UPDATE takes row locks on Postgres.
+    """
+
+    def __init__(self):
+        self.lock   = threading.Lock()
+        self.waits  = []
+        self.locked = 0
+
+    def install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        if not (sql.startswith('BEGIN') or 'FOR UPDATE' in sql):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if 'locked' in str(e):
+                with self.lock:
+                    self.locked += 1
+            raise
+        finally:
+            with self.lock:
+                self.waits.append((time.perf_counter() - start) * 1000)
+
+    def report(self):
+        waits = sorted(self.waits)
+        return {
+            'statements':      len(waits),
+            'total_wait_ms':   round(sum(waits), 1),
+            'p50_ms':          round(percentile(waits, 50), 2) if waits else None,
+            'p95_ms':          round(percentile(waits, 95), 2) if waits else None,
+            'p99_ms':          round(percentile(waits, 99), 2) if waits else None,
+            'max_ms':          round(waits[-1], 2) if waits else None,
+            'database_locked': self.locked,
+        }
+
+
+# ─────────────────────────────────────────
+# HTTP CLIENT
+# ─────────────────────────────────────────
+
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # surfaces the 302 as an HTTPError we can read
+
+
+class Session:
+    """One browser: its own cookies, CSRF token and session."""
+
+    def __init__(self, base_url, stats):
+        self.base   = base_url.rstrip('/')
+        self.stats  = stats
+        self.jar    = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.jar), NoRedirect)
+
+    def cookie(self, name):
+        return next((c.value for c in self.jar if c.name == name), None)
+
+    def call(self, op, method, path, form=None, data=None, headers=None):
+        headers = dict(headers or {})
+        body    = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            body = urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.cookie('csrftoken') or ''
+            headers['Referer']     = f'{self.base}/'
+
+        start = time.perf_counter()
+        try:
+            with self.opener.open(Request(self.base + path, body, headers, method=method),
+                                  timeout=REQUEST_TIMEOUT) as response:
+                status, payload, response_headers = response.status, response.read(), response.headers
+        except HTTPError as e:
+            status, payload, response_headers = e.code, e.read(), e.headers
+        except (URLError, OSError) as e:
+            status, payload, response_headers = None, str(e).encode(), {}
+        self.stats.record(op, status, (time.perf_counter() - start) * 1000, payload)
+        return status, payload, response_headers
+
+    def login(self, email, password):
+        self.call('login', 'GET', '/login/')
+        status, _, _ = self.call('login', 'POST', '/login/', form={
+            'email': email, 'password': password, 'csrfmiddlewaretoken': self.cookie('csrftoken') or '',
+        })
+        # A successful login redirects; a failed one re-renders the form
+        return status == 302 and self.cookie('sessionid') is not None
+
+
+# ─────────────────────────────────────────
+# ACTORS
+# ─────────────────────────────────────────
+
+class Room:
+    """The story currently up for a vote, published by the scrum master."""
+
+    def __init__(self):
+        self.lock     = threading.Lock()
+        self.story_id = None
+        self.round    = 0
+
+    def open(self, story_id):
+        with self.lock:
+            self.story_id = story_id
+            self.round   += 1
+
+    def current(self):
+        with self.lock:
+            return self.story_id, self.round
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a planning session: N voters poll vote_status and submit votes while a scrum master '
+        'opens and closes voting. Reports throughput, latency histograms, error rates and (with --serve) '
+        'database lock waits. It changes votes and statuses of the active sprint\'s stories, so point it '
+        'at a seed_load_org organization.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server to load (default: runserver)')
+        parser.add_argument('--serve', action='store_true',
+                            help='Serve the app in this process instead (ASGI under uvicorn, as in production) '
+                                 'and measure its lock waits')
+        parser.add_argument('--wsgi', action='store_true',
+                            help="With --serve, use Django's threaded WSGI server instead of uvicorn")
+        parser.add_argument('--org', default='load-test', help='Organization slug (default: load-test)')
+        parser.add_argument('--password', default='load-test', help="The users' password (default: load-test)")
+        parser.add_argument('--voters', type=int, default=30)
+        parser.add_argument('--duration', type=float, default=60, help='Seconds of load (default 60)')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds between vote_status polls (default 2)')
+        parser.add_argument('--round', type=float, default=20, help='Seconds each vote stays open (default 20)')
+        parser.add_argument('--think', type=float, default=10,
+                            help='Voters vote within this many seconds of the vote opening (default 10)')
+        parser.add_argument('--revote', type=float, default=0.1, help='Chance a voter changes their vote (default 0.1)')
+        parser.add_argument('--seed', type=int, help='Random seed')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['voters'] < 1 or options['duration'] <= 0 or options['poll'] <= 0:
+            raise CommandError('--voters, --duration and --poll must be positive')
+        try:
+            org = Organization.objects.get(slug=options['org'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization '{options['org']}' not found — create it with seed_load_org")
+
+        sprint  = Sprint.objects.filter(organization=org, is_active=True).first()
+        stories = list(UserStory.objects.filter(organization=org, sprint=sprint).values_list('id', flat=True)[:50])
+        if not stories:
+            raise CommandError('The organization has no active sprint with stories to vote on')
+        voter_ids = OrganizationMember.objects.filter(
+            organization=org, role__in=('scrum_master', 'voter'),
+        ).exclude(user=org.owner).values_list('user_id', flat=True)
+        voters = list(SprintMember.objects.filter(
+            organization=org, is_active=True, user_id__in=voter_ids,
+        ).values_list('user__email', flat=True)[:options['voters']])
+        if len(voters) < options['voters']:
+            self.stderr.write(self.style.WARNING(f'Only {len(voters)} active voters in {org.slug}'))
+
+        self.rng      = random.Random(options['seed'])
+        self.scale    = get_voting_scale(org)
+        self.password = options['password']
+        self.stats    = Stats()
+        self.room     = Room()
+        self.stop     = threading.Event()
+        lock_waits = None
+        server     = None
+        url        = options['url']
+        if options['serve']:
+            lock_waits = LockWaits()
+            connection_created.connect(lock_waits.install)
+            url, server = self.serve_wsgi() if options['wsgi'] else self.serve_asgi()
+        connection.close()  # the actors' requests are served on the server's own connections
+
+        actors = [threading.Thread(target=self.voter, args=(url, email, options), daemon=True) for email in voters]
+        actors.append(threading.Thread(target=self.scrum_master, args=(url, org.owner.email, stories, options),
+                                       daemon=True))
+        self.ready = threading.Barrier(len(actors) + 1)
+        self.stderr.write(f'Logging in {len(voters)} voters and the scrum master at {url}…')
+        for actor in actors:
+            actor.start()
+        try:
+            self.ready.wait(timeout=REQUEST_TIMEOUT * 4)
+        except threading.BrokenBarrierError:
+            self.stop.set()
+            raise CommandError('Not every actor could log in — is the server up and the password right?')
+
+        self.stderr.write(f"Running for {options['duration']:g}s…")
+        self.stats.recording = True
+        started = time.perf_counter()
+        self.stop.wait(options['duration'])
+        self.stop.set()
+        for actor in actors:
+            actor.join(timeout=REQUEST_TIMEOUT)
+        self.stats.recording = False
+        elapsed = time.perf_counter() - started
+        if server:
+            server()
+            connection_created.disconnect(lock_waits.install)
+
+        report = {
+            'url':        url,
+            'server':     ('wsgi' if options['wsgi'] else 'asgi') if options['serve'] else None,
+            'org':        org.slug,
+            'voters':     len(voters),
+            'duration_s': round(elapsed, 1),
+            'poll_s':     options['poll'],
+            'rounds':     self.room.round,
+            **self.stats.report(elapsed),
+            'lock_waits': lock_waits.report() if lock_waits else None,
+        }
+        self.print_summary(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+            self.stderr.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    # ─── IN-PROCESS SERVER ───
+
+    def serve_asgi(self):
+        """uvicorn in a thread, serving the ASGI app as the Procfile does. Returns (url, stop)."""
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError('--serve needs uvicorn (pip install -r requirements.txt), or add --wsgi')
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('127.0.0.1', 0))
+        server = uvicorn.Server(uvicorn.Config(
+            get_asgi_application(), lifespan='off', access_log=False, log_level='warning',
+        ))
+        thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + REQUEST_TIMEOUT
+        while not server.started:
+            if not thread.is_alive() or time.monotonic() > deadline:
+                raise CommandError('uvicorn did not start')
+            time.sleep(0.05)
+
+        def stop():
+            server.should_exit = True
+            thread.join(timeout=REQUEST_TIMEOUT)
+        return f'http://127.0.0.1:{sock.getsockname()[1]}', stop
+
+    def serve_wsgi(self):
+        """Django's threaded WSGI server (one thread per request, unlike ASGI). Returns (url, stop)."""
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{server.server_port}', server.shutdown
+
+    # ─── ACTORS ───
+
+    def start(self, session, email):
+        """Log in, then wait for everyone else. The barrier breaks if anyone fails."""
+        if not session.login(email, self.password):
+            self.stderr.write(self.style.ERROR(f'Login failed for {email}'))
+            self.ready.abort()
+            return False
+        try:
+            self.ready.wait()
+        except threading.BrokenBarrierError:
+            return False
+        return True
+
+    def scrum_master(self, url, email, stories, options):
+        session = Session(url, self.stats)
+        if not self.start(session, email):
+            return
+        for story_id in self.cycle(stories):
+            session.call('trigger_voting', 'POST', f'/sm/stories/{story_id}/trigger-voting/', data={})
+            self.room.open(story_id)
+            if self.stop.wait(options['round']):
+                break
+            session.call('close_voting', 'POST', f'/sm/stories/{story_id}/close-voting/', data={})
+            if self.stop.wait(min(2, options['round'] / 4)):
+                break
+
+    @staticmethod
+    def cycle(items):
+        while True:
+            yield from items
+
+    def voter(self, url, email, options):
+        session = Session(url, self.stats)
+        if not self.start(session, email):
+            return
+        rng            = random.Random(self.rng.random())
+        etag, seen     = None, (None, 0)
+        vote_at, voted = None, False
+        # Stagger the first polls so voters don't arrive in lockstep
+        self.stop.wait(rng.uniform(0, options['poll']))
+        while not self.stop.is_set():
+            story_id, round_no = self.room.current()
+            if story_id is None:
+                self.stop.wait(options['poll'])
+                continue
+            if (story_id, round_no) != seen:
+                seen, etag, vote_at, voted = (story_id, round_no), None, None, False
+
+            headers = {'If-None-Match': etag} if etag else {}
+            status, payload, response_headers = session.call(
+                'vote_status', 'GET', f'/vote/{story_id}/status/', headers=headers
+            )
+            if status == 200:
+                etag  = response_headers.get('ETag')
+                state = json.loads(payload)
+                if state['status'] == 'voting' and vote_at is None:
+                    vote_at = time.monotonic() + rng.uniform(0, options['think'])
+                elif state['status'] != 'voting':
+                    vote_at = None
+
+            if vote_at is not None and time.monotonic() >= vote_at:
+                if not voted or rng.random() < options['revote']:
+                    session.call('submit_vote', 'POST', f'/vote/{story_id}/submit/',
+                                 data={'points': rng.choice(self.scale)})
+                    voted = True
+                vote_at = time.monotonic() + rng.uniform(0, options['think'])
+            self.stop.wait(options['poll'] * rng.uniform(0.8, 1.2))
+
+    # ─── REPORT ───
+
+    def print_summary(self, report):
+        self.stdout.write(
+            f"{report['voters']} voters, {report['duration_s']}s, {report['rounds']} voting round(s): "
+            f"{report['throughput_rps']} req/s"
+        )
+        self.stdout.write(f"{'':<16}{'count':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'errors':>9}")
+        for op, r in report['requests'].items():
+            self.stdout.write(
+                f"{op:<16}{r['count']:>8}{r.get('rps', ''):>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+                f"{r['p99_ms']:>9}{r['max_ms']:>9}{r['error_rate']:>9.1%}"
+            )
+            for kind, n in r['error_kinds'].items():
+                self.stdout.write(self.style.WARNING(f'    {n} × {kind}'))
+        for op, r in report['requests'].items():
+            self.stdout.write(f"{op} latency: " + ', '.join(f'{b} {n}' for b, n in r['histogram'].items()))
+        waits = report['lock_waits']
+        if waits:
+            self.stdout.write(
+                f"Lock waits: {waits['statements']} statements, {waits['total_wait_ms']}ms total, "
+                f"p95 {waits['p95_ms']}ms, max {waits['max_ms']}ms, {waits['database_locked']} 'database is locked'"
+            )
@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .middleware import get_entitlement
+from .models import AIUsageEntry, UsageMonth
+from .usage import ensure_month, month_start
+
+RESERVATION_TTL = timedelta(minutes=15)  # an open reservation older than this is assumed abandoned
+HISTORY_MONTHS  = 12
+
+
+class QuotaExceeded(Exception):
+    """The org has no AI calls left this month."""
+
+    def __init__(self, limit, requested):
+        self.limit     = limit
+        self.requested = requested
+        super().__init__(f'Monthly AI call limit of {limit} reached')
+
+
+# ─────────────────────────────────────────
+# QUOTA (read-only)
+# ─────────────────────────────────────────
+
+def ai_call_limit(org):
+    """Calls per calendar month — None when unlimited, 0 when the plan has no AI."""
+    entitlement = get_entitlement(org)
+    if entitlement['is_test']:
+        return None
+    return entitlement['limits'].get('ai_calls_per_month') or 0
+
+
+def ai_calls_remaining(org):
+    """Calls still available this month, net of open reservations. None when unlimited."""
+    limit = ai_call_limit(org)
+    if limit is None:
+        return None
+    row = UsageMonth.objects.filter(organization_id=org.id, month=month_start()).values(
+        'ai_calls', 'ai_reserved'
+    ).first() or {'ai_calls': 0, 'ai_reserved': 0}
+    return max(0, limit - row['ai_calls'] - row['ai_reserved'])
+
+
+# ─────────────────────────────────────────
+# RESERVE / COMMIT
+# ─────────────────────────────────────────
+
+def reserve(org, calls=1, feature='', user=None):
+    """
+    Hold `calls` against this month's quota and return the AIUsageEntry to commit
+    or release. The quota check and the hold are one conditional UPDATE, so
+    concurrent callers can never overspend. Raises QuotaExceeded.
+    """
+    if calls < 1:
+        raise ValueError('calls must be at least 1')
+    limit = ai_call_limit(org)
+    if limit == 0:
+        raise QuotaExceeded(limit, calls)
+
+    month = month_start()
+    with transaction.atomic():
+        while True:
+            rows = UsageMonth.objects.filter(organization_id=org.id, month=month)
+            if limit is not None:
+                rows = rows.filter(ai_calls__lte=limit - calls - F('ai_reserved'))
+            if rows.update(ai_reserved=F('ai_reserved') + calls):
+                break
+            # No row yet this month → create it and try again; otherwise we're out of calls
+            if not ensure_month(org.id, month):
+                raise QuotaExceeded(limit, calls)
+        return AIUsageEntry.objects.create(
+            organization_id=org.id, user=user, feature=feature, month=month, reserved=calls,
+        )
+
+
+def commit(entry, used=None):
+    """Record the calls actually made (default: all reserved). False if the entry was already settled."""
+    used = entry.reserved if used is None else used
+    return _settle(entry, 'committed', used)
+
+
+def release(entry):
+    """Give the reserved calls back, e.g. when the AI request failed. False if already settled."""
+    return _settle(entry, 'released', 0)
+
+
+def _settle(entry, status, used):
+    now = timezone.now()
+    with transaction.atomic():
+        # Only the first settle of an entry wins, so retries and the stale sweep can't double-count
+        won = AIUsageEntry.objects.filter(id=entry.id, status='reserved').update(
+            status=status, used=used, settled_at=now
+        )
+        if won:
+            UsageMonth.objects.filter(organization_id=entry.organization_id, month=entry.month).update(
+                ai_reserved=Greatest(F('ai_reserved') - entry.reserved, Value(0)),
+                ai_calls=F('ai_calls') + used,
+            )
+    if won:
+        entry.status, entry.used, entry.settled_at = status, used, now
+    return bool(won)
+
+
+@contextmanager
+def metered(org, calls=1, feature='', user=None):
+    """
+    with metered(org, feature='task_breakdown') as entry: ...
+    Commits when the block succeeds (set entry.used to bill less), releases when it raises.
+    """
+    entry      = reserve(org, calls, feature=feature, user=user)
+    entry.used = entry.reserved
+    try:
+        yield entry
+    except BaseException:
+        release(entry)
+        raise
+    commit(entry, entry.used)
+
+
+def release_stale(older_than=RESERVATION_TTL):
+    """Release reservations left open by a crashed request. Returns how many were released."""
+    cutoff = timezone.now() - older_than
+    stale  = AIUsageEntry.objects.filter(status='reserved', created_at__lt=cutoff)
+    return sum(release(entry) for entry in stale.iterator())
+
+
+# ─────────────────────────────────────────
+# HISTORY
+# ─────────────────────────────────────────
+
+def usage_history(org, months=HISTORY_MONTHS):
+    """This month and the previous ones, newest first — months with no usage included."""
+    month = month_start()
+    keys  = []
+    for _ in range(months):
+        keys.append(month)
+        month = (month - timedelta(days=1)).replace(day=1)
+    rows  = {row.month: row for row in UsageMonth.objects.filter(organization_id=org.id, month__gte=keys[-1])}
+    limit = ai_call_limit(org)
+    return [
+        {
+            'month':       m.strftime('%Y-%m'),
+            'sprints':     rows[m].sprints if m in rows else 0,
+            'ai_calls':    rows[m].ai_calls if m in rows else 0,
+            'ai_reserved': rows[m].ai_reserved if m in rows else 0,
+            'ai_limit':    limit,
+        }
+        for m in keys
+    ]
@@ -1,7 +1,21 @@
+import functools
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import timedelta
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.http import HttpResponseForbidden
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.base import Template
+from django.utils import timezone
 
 
 # URLs that are always accessible regardless of subscription status
@@ -25,12 +39,83 @@ EXEMPT_URLS = [
     '/',
 ]
 
+# One precompiled regex with the same prefix semantics as the startswith scan it replaced.
+# Note that '/' as a prefix matches every path.
+EXEMPT_URL_RE = re.compile('|'.join(re.escape(url) for url in EXEMPT_URLS))
+
+PAST_DUE_GRACE        = timedelta(days=3)
+ENTITLEMENT_CACHE_TTL = 300
+PERF_TOP_DUPLICATES   = 5  # duplicated queries listed in a slow-request log line
+
+perf_logger   = logging.getLogger('planner.perf')
+_perf_request = ContextVar('perf_request', default=None)
+_STREAM_END   = object()
+
+
+# ─────────────────────────────────────────
+# ENTITLEMENT CACHE
+# ─────────────────────────────────────────
+
+def _entitlement_key(org_id):
+    return f'planner:entitlement:{org_id}'
+
+
+def get_entitlement(org):
+    """
+    Compact, cached view of an org's subscription:
+    {'is_test', 'has_subscription', 'plan', 'status', 'active_until', 'grace_end', 'limits'}.
+    active_until is None for a paid plan, the trial end while trialing, and in the past otherwise.
+    """
+    entitlement = cache.get(_entitlement_key(org.id))
+    if entitlement is not None:
+        return entitlement
+
+    from planner.models import Subscription
+    sub         = Subscription.objects.filter(organization_id=org.id).first()
+    entitlement = {
+        'is_test':          org.is_test,
+        'has_subscription': sub is not None,
+        'plan':             sub.plan if sub else None,
+        'status':           sub.status if sub else None,
+        'active_until':     None,
+        'grace_end':        None,
+        'limits':           settings.PLAN_LIMITS.get(sub.plan, {}) if sub else {},
+    }
+    if sub and sub.status == 'trialing':
+        entitlement['active_until'] = sub.trial_end
+    elif sub and sub.status != 'active':
+        entitlement['active_until'] = sub.updated_at
+    if sub and sub.status == 'past_due':
+        entitlement['grace_end'] = sub.updated_at + PAST_DUE_GRACE
+
+    cache.set(_entitlement_key(org.id), entitlement, ENTITLEMENT_CACHE_TTL)
+    return entitlement
+
+
+def invalidate_entitlement(org_id):
+    """Call after any change to an org's subscription."""
+    from planner.permissions import bump_membership_version
+    cache.delete(_entitlement_key(org_id))
+    # Cached memberships carry organization.subscription too
+    bump_membership_version(org_id)
+
+
+def entitlement_is_active(entitlement):
+    if entitlement['is_test']:
+        return True
+    if not entitlement['has_subscription']:
+        return False
+    until = entitlement['active_until']
+    return until is None or timezone.now() < until
+
 
 class SubscriptionMiddleware:
     """
     Task 8 — Plan Gating Middleware.
     Checks subscription status on every request.
     Redirects to billing if subscription is expired or cancelled.
+    Not listed in settings.MIDDLEWARE: plan gating currently happens through
+    check_plan_feature() and the check_*_limit() helpers, which share its entitlement cache.
     """
 
     def __init__(self, get_response):
@@ -42,45 +127,40 @@ class SubscriptionMiddleware:
             return self.get_response(request)
 
         # Skip exempt URLs
-        path = request.path_info
-        if any(path.startswith(url) for url in EXEMPT_URLS):
+        if EXEMPT_URL_RE.match(request.path_info):
             return self.get_response(request)
 
-        # Get org and subscription
-        from planner.models import OrganizationMember
-        membership = OrganizationMember.objects.select_related(
-            'organization__subscription'
-        ).filter(user=request.user).first()
+        # Get org — resolved from the membership cache
+        from planner.permissions import get_active_membership
+        membership = get_active_membership(request)
 
         if not membership:
             return self.get_response(request)
 
-        org = membership.organization
+        org         = membership.organization
+        entitlement = get_entitlement(org)
 
         # Test orgs bypass all checks
-        if org.is_test:
+        if entitlement['is_test']:
             return self.get_response(request)
 
         # Check subscription
-        sub = getattr(org, 'subscription', None)
-        if not sub:
+        if not entitlement['has_subscription']:
             return redirect('/billing/')
 
-        if not sub.is_active():
+        if not entitlement_is_active(entitlement):
             # Grace period — past_due gets 3 days
-            if sub.status == 'past_due':
-                from django.utils import timezone
-                from datetime import timedelta
-                grace_end = sub.updated_at + timedelta(days=3)
-                if timezone.now() < grace_end:
-                    # Allow access but could add a warning banner
-                    request.subscription_warning = 'payment_failed'
-                    return self.get_response(request)
+            grace_end = entitlement['grace_end']
+            if grace_end and timezone.now() < grace_end:
+                # Allow access but could add a warning banner
+                request.subscription_warning = 'payment_failed'
+                return self.get_response(request)
             return redirect('/billing/')
 
-        # Attach subscription to request for use in views
-        request.org         = org
-        request.subscription = sub
+        # Attach org, subscription and entitlement to request for use in views
+        request.org          = org
+        request.subscription = getattr(org, 'subscription', None)
+        request.entitlement  = entitlement
 
         return self.get_response(request)
 
@@ -97,15 +177,7 @@ class PlanGatingMixin:
         if not org:
             from planner.views import get_org
             org = get_org(request)
-        if not org:
-            return False
-        if org.is_test:
-            return True
-        sub    = getattr(org, 'subscription', None)
-        if not sub:
-            return False
-        limits = settings.PLAN_LIMITS.get(sub.plan, {})
-        return limits.get(feature, False)
+        return check_plan_feature(org, feature)
 
     def check_member_limit(self, request):
         """Returns True if org is under member limit."""
@@ -113,64 +185,274 @@ class PlanGatingMixin:
         if not org:
             from planner.views import get_org
             org = get_org(request)
-        if not org or org.is_test:
-            return True
-        sub    = getattr(org, 'subscription', None)
-        if not sub:
-            return False
-        limits  = settings.PLAN_LIMITS.get(sub.plan, {})
-        max_mem = limits.get('members')
-        if max_mem is None:
-            return True  # unlimited
-        current = org.members.count()
-        return current < max_mem
+        return check_member_limit(org)
 
 
 def check_plan_feature(org, feature: str) -> bool:
     """Standalone function to check plan feature access."""
     if not org:
         return False
-    if org.is_test:
+    entitlement = get_entitlement(org)
+    if entitlement['is_test']:
         return True
-    sub = getattr(org, 'subscription', None)
-    if not sub:
+    if not entitlement['has_subscription']:
         return False
-    limits = settings.PLAN_LIMITS.get(sub.plan, {})
-    return bool(limits.get(feature, False))
+    return bool(entitlement['limits'].get(feature, False))
+
+
+def _plan_limit(org, key):
+    """(applies, limit): applies is False for test orgs; limit None means unlimited, 0 no subscription."""
+    entitlement = get_entitlement(org)
+    if entitlement['is_test']:
+        return False, None
+    if not entitlement['has_subscription']:
+        return True, 0
+    return True, entitlement['limits'].get(key)
 
 
 def check_member_limit(org) -> bool:
     """Standalone function to check member limit."""
-    if not org or org.is_test:
+    if not org:
         return True
-    sub = getattr(org, 'subscription', None)
-    if not sub:
-        return False
-    limits  = settings.PLAN_LIMITS.get(sub.plan, {})
-    max_mem = limits.get('members')
-    if max_mem is None:
+    applies, max_mem = _plan_limit(org, 'members')
+    if not applies or max_mem is None:
         return True
-    return org.members.count() < max_mem
+    from planner.usage import get_usage
+    return get_usage(org).members < max_mem
+
+
+def member_seats_left(org):
+    """Members the plan still allows — None when unlimited, 0 without a subscription."""
+    applies, max_mem = _plan_limit(org, 'members')
+    if not applies or max_mem is None:
+        return None
+    from planner.usage import get_usage
+    return max(max_mem - get_usage(org).members, 0)
+
+
+def check_team_limit(org):
+    """None if another team fits the plan, else the plan's team limit (0 means no teams allowed)."""
+    applies, max_teams = _plan_limit(org, 'teams')
+    if not applies:
+        return None
+    if max_teams == 0:
+        # No subscription: the starter allowance, as add_team always applied
+        max_teams = settings.PLAN_LIMITS.get('starter', {}).get('teams', 0)
+    if max_teams is None:
+        return None
+    from planner.usage import get_usage
+    return max_teams if get_usage(org).teams >= max_teams else None
 
 
 def check_session_limit(org) -> bool:
     """Check if org can create more planning sessions this month."""
-    if not org or org.is_test:
+    if not org:
         return True
-    sub = getattr(org, 'subscription', None)
-    if not sub:
-        return False
-    limits      = settings.PLAN_LIMITS.get(sub.plan, {})
-    max_sessions = limits.get('sessions_per_month')
-    if max_sessions is None:
+    applies, max_sessions = _plan_limit(org, 'sessions_per_month')
+    if not applies or max_sessions is None:
         return True  # unlimited
-    # Count sessions this month
-    from django.utils import timezone
-    from planner.models import Sprint
-    now         = timezone.now()
-    month_start = now.replace(day=1, hour=0, minute=0, second=0)
-    count       = Sprint.objects.filter(
-        organization=org,
-        created_at__gte=month_start
-    ).count()
-    return count < max_sessions
+    from planner.usage import get_month
+    return get_month(org).sprints < max_sessions
+
+
+# ─────────────────────────────────────────
+# PERFORMANCE INSTRUMENTATION
+# ─────────────────────────────────────────
+
+class RequestTimings:
+    """Where one sampled request spent its time. Also the execute_wrapper that counts its SQL."""
+
+    def __init__(self):
+        self.started        = time.perf_counter()
+        self.sql_count      = 0
+        self.sql_ms         = 0.0
+        self.sql            = defaultdict(lambda: [0, 0.0])  # sql → [count, ms]
+        self.template_ms    = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms     = (time.perf_counter() - start) * 1000
+            entry  = self.sql[sql]
+            entry[0] += 1
+            entry[1] += ms
+            self.sql_count += 1
+            self.sql_ms    += ms
+
+    def duplicates(self, limit=PERF_TOP_DUPLICATES):
+        """[(count, ms, sql)] for statements run more than once, most repeated first."""
+        dupes = [(n, ms, sql) for sql, (n, ms) in self.sql.items() if n > 1]
+        return sorted(dupes, key=lambda d: (-d[0], -d[1]))[:limit]
+
+
+def _timed_render(render):
+    """Wrap Template.render so the sampled request (if any) is charged for rendering."""
+    @functools.wraps(render)
+    def wrapper(self, context):
+        timings = _perf_request.get()
+        if timings is None:
+            return render(self, context)
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:  # {% include %}s are part of the outer template's time
+                timings.template_ms += (time.perf_counter() - start) * 1000
+    wrapper.perf_timed = True
+    return wrapper
+
+
+def _timed_stream(content, timings, finished):
+    """Yield a streamed body, charging each chunk's SQL and templates to the request; finished() runs at the end."""
+    iterator = iter(content)
+    try:
+        while True:
+            # Chunks may be produced on another thread (ASGI), so the wrapper is installed per chunk
+            token = _perf_request.set(timings)
+            try:
+                with connection.execute_wrapper(timings):
+                    chunk = next(iterator, _STREAM_END)
+            finally:
+                _perf_request.reset(token)
+            if chunk is _STREAM_END:
+                break
+            yield chunk
+    finally:
+        finished()
+
+
+def _watch_sql(timings):
+    connection.execute_wrappers.append(timings)
+
+
+def _unwatch_sql(timings):
+    connection.execute_wrappers.remove(timings)
+
+
+async def _timed_async_stream(content, finished):
+    """Async bodies only get their total time — their queries run in sync_to_async threads."""
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        finished()
+
+
+class PerformanceMiddleware:
+    """
+    Opt-in timings for a PERF_SAMPLE_RATE share of requests: SQL count and time, template
+    render time (including queries run while rendering) and total time, labelled by URL name.
+    Sampled responses get a Server-Timing header when PERF_SERVER_TIMING is on; those slower
+    than PERF_SLOW_MS are logged to `planner.perf` with their most duplicated queries.
+    Streamed responses are timed until their body is finished; their header only covers
+    the time before it started (reported as `headers` instead of `total`).
+    Unsampled requests cost one random() call; with PERF_SAMPLE_RATE = 0 it is not loaded at all.
+    Runs natively under ASGI, so it adds no sync/async switch of its own.
+    """
+    sync_capable  = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.PERF_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        self.get_response  = get_response
+        self.slow_ms       = settings.PERF_SLOW_MS
+        self.server_timing = settings.PERF_SERVER_TIMING
+        if not getattr(Template.render, 'perf_timed', False):
+            Template.render = _timed_render(Template.render)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token   = _perf_request.set(timings)
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            _perf_request.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token   = _perf_request.set(timings)
+        # The request's sync code (ORM, templates) runs on one thread-sensitive thread with its
+        # own connection, so the wrapper goes on that connection rather than the event loop's
+        await sync_to_async(_watch_sql)(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(_unwatch_sql)(timings)
+            _perf_request.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        """Add the Server-Timing header and log slow requests; streamed bodies are timed as they finish."""
+        match = getattr(request, 'resolver_match', None)
+        label = match.view_name if match else 'unresolved'
+
+        if not response.streaming:
+            total_ms = (time.perf_counter() - timings.started) * 1000
+            if self.server_timing:
+                response['Server-Timing'] = self.server_timing_header(timings, 'total', total_ms, label)
+            if total_ms >= self.slow_ms:
+                self.log_slow(request, response, label, total_ms, timings)
+            return response
+
+        # The headers leave before the body is generated, so they can only carry the time so far
+        if self.server_timing:
+            ms = (time.perf_counter() - timings.started) * 1000
+            response['Server-Timing'] = self.server_timing_header(timings, 'headers', ms, f'{label} (streamed)')
+
+        def finished():
+            total_ms = (time.perf_counter() - timings.started) * 1000
+            if total_ms >= self.slow_ms:
+                self.log_slow(request, response, label, total_ms, timings, streamed=True)
+
+        if response.is_async:
+            response.streaming_content = _timed_async_stream(response.streaming_content, finished)
+        else:
+            response.streaming_content = _timed_stream(response.streaming_content, timings, finished)
+        return response
+
+    @staticmethod
+    def server_timing_header(timings, name, ms, desc):
+        return (
+            f'sql;dur={timings.sql_ms:.1f};desc="{timings.sql_count} queries", '
+            f'tpl;dur={timings.template_ms:.1f};desc="templates", '
+            f'{name};dur={ms:.1f};desc="{desc}"'
+        )
+
+    def log_slow(self, request, response, label, total_ms, timings, streamed=False):
+        duplicates = timings.duplicates()
+        lines      = [
+            f'Slow request {request.method} {request.path} [{label}] {response.status_code} '
+            f'in {total_ms:.0f}ms{" (streamed)" if streamed else ""}: '
+            f'{timings.sql_count} queries {timings.sql_ms:.0f}ms, templates {timings.template_ms:.0f}ms'
+        ] + [f'  {n}× {ms:.0f}ms  {sql[:300]}' for n, ms, sql in duplicates]
+        perf_logger.warning('\n'.join(lines), extra={'perf': {
+            'url_name':    label,
+            'method':      request.method,
+            'path':        request.path,
+            'status':      response.status_code,
+            'streamed':    streamed,
+            'total_ms':    round(total_ms, 1),
+            'sql_count':   timings.sql_count,
+            'sql_ms':      round(timings.sql_ms, 1),
+            'template_ms': round(timings.template_ms, 1),
+            'duplicates':  [{'count': n, 'ms': round(ms, 1), 'sql': sql} for n, ms, sql in duplicates],
+        }})
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from collections import Counter
+from django.db import migrations, models
+
+
+def backfill_aggregates(apps, schema_editor):
+    Vote          = apps.get_model('planner', 'Vote')
+    VoteAggregate = apps.get_model('planner', 'VoteAggregate')
+
+    histograms = {}
+    for story_id, stream_id, points in Vote.objects.values_list(
+        'user_story_id', 'member__stream_id', 'points'
+    ).iterator():
+        for key in {(story_id, None), (story_id, stream_id)}:
+            histograms.setdefault(key, Counter())[points] += 1
+
+    VoteAggregate.objects.bulk_create([
+        VoteAggregate(
+            user_story_id=story_id,
+            stream_id=stream_id,
+            count=sum(hist.values()),
+            total=sum(p * c for p, c in hist.items()),
+            min_points=min(hist),
+            max_points=max(hist),
+            histogram={str(p): c for p, c in hist.items()},
+        )
+        for (story_id, stream_id), hist in histograms.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0006_state_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('min_points', models.IntegerField(blank=True, null=True)),
+                ('max_points', models.IntegerField(blank=True, null=True)),
+                ('histogram', models.JSONField(default=dict)),
+                ('stream', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='vote_aggregates', to='planner.stream')),
+                ('user_story', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_aggregates', to='planner.userstory')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user_story', 'stream'), name='uniq_vote_aggregate_stream'), models.UniqueConstraint(condition=models.Q(('stream__isnull', True)), fields=('user_story',), name='uniq_vote_aggregate_story')],
+            },
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
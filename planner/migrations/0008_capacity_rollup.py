@@ -0,0 +1,51 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    UserStory        = apps.get_model('planner', 'UserStory')
+    StreamAssignment = apps.get_model('planner', 'StreamAssignment')
+    CapacityRollup   = apps.get_model('planner', 'CapacityRollup')
+
+    owned = UserStory.objects.filter(
+        owner__isnull=False, final_sp__isnull=False
+    ).values('organization_id', 'sprint_id', 'owner_id').annotate(total=Sum('final_sp')).order_by()
+    assigned = StreamAssignment.objects.values(
+        'user_story__organization_id', 'user_story__sprint_id', 'member_id', 'stream_id'
+    ).annotate(total=Sum('sp')).order_by()
+
+    CapacityRollup.objects.bulk_create([
+        CapacityRollup(organization_id=r['organization_id'], sprint_id=r['sprint_id'],
+                       member_id=r['owner_id'], stream_id=None, sp=r['total'])
+        for r in owned
+    ] + [
+        CapacityRollup(organization_id=r['user_story__organization_id'], sprint_id=r['user_story__sprint_id'],
+                       member_id=r['member_id'], stream_id=r['stream_id'], sp=r['total'])
+        for r in assigned
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0007_vote_aggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapacityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sp', models.FloatField(default=0)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacity_rollups', to='planner.sprintmember')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacity_rollups', to='planner.organization')),
+                ('sprint', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='capacity_rollups', to='planner.sprint')),
+                ('stream', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='capacity_rollups', to='planner.stream')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sprint', 'member', 'stream'], name='planner_cap_sprint__cb0220_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
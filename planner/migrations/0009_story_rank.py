@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+RANK_STEP = 1 << 16
+
+
+def spread_ranks(apps, schema_editor):
+    # order used to be a running count — spread each org's stories apart, keeping their order
+    UserStory = apps.get_model('planner', 'UserStory')
+    stories   = list(UserStory.objects.order_by('organization_id', 'order', 'created_at', 'id').only(
+        'id', 'organization_id', 'order'
+    ))
+    org_id, rank = None, 0
+    for story in stories:
+        if story.organization_id != org_id:
+            org_id, rank = story.organization_id, 0
+        rank       += RANK_STEP
+        story.order = rank
+    UserStory.objects.bulk_update(stories, ['order'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0008_capacity_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userstory',
+            name='order',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userstory',
+            index=models.Index(fields=['organization', 'order', 'created_at', 'id'], name='story_rank_idx'),
+        ),
+        migrations.RunPython(spread_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+from collections import Counter
+from datetime import timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone as dj_timezone
+
+
+def count_usage(apps, schema_editor):
+    Organization = apps.get_model('planner', 'Organization')
+    OrgUsage     = apps.get_model('planner', 'OrgUsage')
+    UsageMonth   = apps.get_model('planner', 'UsageMonth')
+    Sprint       = apps.get_model('planner', 'Sprint')
+    Subscription = apps.get_model('planner', 'Subscription')
+
+    orgs = Organization.objects.annotate(
+        n_members=Count('members', distinct=True), n_teams=Count('teams', distinct=True)
+    )
+    OrgUsage.objects.bulk_create([
+        OrgUsage(organization_id=org.id, members=org.n_members, teams=org.n_teams) for org in orgs
+    ], batch_size=500)
+
+    sprints = Counter(
+        (org_id, created_at.astimezone(timezone.utc).date().replace(day=1))
+        for org_id, created_at in Sprint.objects.values_list('organization_id', 'created_at').iterator()
+    )
+    # The old rolling AI-call count carries over into this month
+    this_month = dj_timezone.now().astimezone(timezone.utc).date().replace(day=1)
+    ai_calls   = dict(Subscription.objects.filter(ai_calls_used__gt=0).values_list('organization_id', 'ai_calls_used'))
+    months     = set(sprints) | {(org_id, this_month) for org_id in ai_calls}
+    UsageMonth.objects.bulk_create([
+        UsageMonth(
+            organization_id=org_id, month=month, sprints=sprints.get((org_id, month), 0),
+            ai_calls=ai_calls.get(org_id, 0) if month == this_month else 0,
+        )
+        for org_id, month in months
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0012_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrgUsage',
+            fields=[
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='planner.organization')),
+                ('members', models.PositiveIntegerField(default=0)),
+                ('teams', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UsageMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('sprints', models.PositiveIntegerField(default=0)),
+                ('ai_calls', models.PositiveIntegerField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_months', to='planner.organization')),
+            ],
+            options={
+                'ordering': ['-month'],
+                'unique_together': {('organization', 'month')},
+            },
+        ),
+        migrations.RunPython(count_usage, migrations.RunPython.noop),
+    ]
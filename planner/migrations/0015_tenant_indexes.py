@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0014_ai_metering'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invitetoken',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['organization', '-created_at'], name='invite_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sprint',
+            index=models.Index(fields=['organization', '-created_at'], name='sprint_org_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sprint',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['organization'], name='sprint_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sprintmember',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['organization', 'user'], name='member_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userstory',
+            index=models.Index(fields=['organization', 'sprint', 'order', 'created_at', 'id'], name='story_sprint_rank_idx'),
+        ),
+    ]
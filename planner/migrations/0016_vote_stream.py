@@ -0,0 +1,28 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_vote_stream(apps, schema_editor):
+    # The voter's current stream is the best record there is of where past votes were counted
+    Vote         = apps.get_model('planner', 'Vote')
+    SprintMember = apps.get_model('planner', 'SprintMember')
+    Vote.objects.update(stream_id=Subquery(
+        SprintMember.objects.filter(id=OuterRef('member_id')).values('stream_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0015_tenant_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='stream',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='planner.stream'),
+        ),
+        migrations.RunPython(backfill_vote_stream, migrations.RunPython.noop),
+    ]
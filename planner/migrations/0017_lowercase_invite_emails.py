@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Lower
+
+
+def lowercase_invite_emails(apps, schema_editor):
+    # bulk_invite upserts on the lowercased address, so a mixed-case row would never conflict.
+    # Where both spellings exist the newest invite wins.
+    InviteToken = apps.get_model('planner', 'InviteToken')
+    mixed = set(
+        InviteToken.objects.annotate(email_lower=Lower('email')).exclude(email=F('email_lower'))
+        .values_list('organization_id', 'email_lower')
+    )
+    for org_id, email in mixed:
+        invites = list(
+            InviteToken.objects.filter(organization_id=org_id).annotate(email_lower=Lower('email'))
+            .filter(email_lower=email).order_by('-created_at', '-id')
+        )
+        InviteToken.objects.filter(id__in=[i.id for i in invites[1:]]).delete()
+        InviteToken.objects.filter(id=invites[0].id).update(email=email)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0016_vote_stream'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_invite_emails, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,114 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+BANDWIDTH_LIMIT = 8        # SP per member per sprint
+RANK_STEP       = 1 << 16  # gap between neighbouring story ranks
+
+
+# ─────────────────────────────────────────
+# CHANGE TRACKING
+# ─────────────────────────────────────────
+
+class TrackedFieldsMixin:
+    """
+    Remembers tracked_fields (attnames) as loaded or last saved, so writes can
+    detect changes in memory instead of re-reading the row.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            self.remember_loaded()
+        else:
+            refreshed = {self._meta.get_field(f).attname for f in fields}
+            loaded    = getattr(self, '_loaded', {})
+            loaded.update({f: getattr(self, f) for f in self.tracked_fields if f in refreshed})
+            self._loaded = loaded
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.remember_loaded()
+
+    def remember_loaded(self):
+        deferred     = self.get_deferred_fields()
+        self._loaded = {f: getattr(self, f) for f in self.tracked_fields if f not in deferred}
+
+    def loaded_values(self):
+        """Tracked values as last loaded or saved; {} for an unsaved instance."""
+        if self._state.adding:
+            return {}
+        loaded  = getattr(self, '_loaded', {})
+        missing = [f for f in self.tracked_fields if f not in loaded]
+        if missing:
+            # Built by hand with a pk, or loaded with .only() — read just what we don't know
+            row          = type(self)._base_manager.filter(pk=self.pk).values(*missing).first() or {}
+            loaded       = {**loaded, **row}
+            self._loaded = loaded
+        return loaded
+
+    def has_changed(self, field):
+        loaded = self.loaded_values()
+        return field in loaded and loaded[field] != getattr(self, field)
+
+
+class StatusTrackingMixin(TrackedFieldsMixin):
+    """Stamps status_changed_at whenever status differs from the loaded value."""
+    tracked_fields = ('status',)
+
+    def save(self, *args, **kwargs):
+        if self.has_changed('status'):
+            self.status_changed_at = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'status_changed_at' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'status_changed_at']
+        super().save(*args, **kwargs)
+
+
+class StatusTrackingQuerySet(models.QuerySet):
+    """Keeps status_changed_at correct for update() and bulk_update() too."""
+
+    def update(self, **kwargs):
+        if 'status' in kwargs and 'status_changed_at' not in kwargs:
+            kwargs['status_changed_at'] = Case(
+                When(~Q(status=kwargs['status']), then=Value(timezone.now())),
+                default=F('status_changed_at'),
+            )
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        if 'status' in fields:
+            # One query for any objects whose loaded status we don't know
+            unknown = [o.pk for o in objs if not o._state.adding and 'status' not in getattr(o, '_loaded', {})]
+            if unknown:
+                loaded = dict(self.model._base_manager.filter(pk__in=unknown).values_list('pk', 'status'))
+                for o in objs:
+                    if o.pk in loaded:
+                        o._loaded = {**getattr(o, '_loaded', {}), 'status': loaded[o.pk]}
+            now = timezone.now()
+            for o in objs:
+                if o.has_changed('status'):
+                    o.status_changed_at = now
+            if 'status_changed_at' not in fields:
+                fields = [*fields, 'status_changed_at']
+        rows = super().bulk_update(objs, fields, batch_size=batch_size)
+        for o in objs:
+            o.remember_loaded()
+        return rows
+
 
 # ─────────────────────────────────────────
 # ORGANIZATION
@@ -48,8 +154,6 @@ class Subscription(models.Model):
     trial_end              = models.DateTimeField()
     paddle_customer_id     = models.CharField(max_length=200, blank=True)
     paddle_subscription_id = models.CharField(max_length=200, blank=True)
-    ai_calls_used          = models.PositiveIntegerField(default=0)  # resets monthly
-    ai_calls_reset_at      = models.DateTimeField(default=timezone.now)
     updated_at             = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -71,23 +175,76 @@ class Subscription(models.Model):
         return max(0, (self.trial_end - timezone.now()).days)
 
     def ai_calls_limit(self):
-        """Monthly AI call limit per plan. 0 = not available."""
-        limits = {'starter': 0, 'pro': 0, 'business': 500}
-        if self.organization.is_test:
-            return 99999
-        return limits.get(self.plan, 0)
+        """Monthly AI call limit per plan. 0 = not available, None = unlimited."""
+        from .metering import ai_call_limit
+        return ai_call_limit(self.organization)
 
     def ai_calls_remaining(self):
-        # Reset counter if new month
-        from datetime import timedelta
-        if timezone.now() > self.ai_calls_reset_at + timedelta(days=30):
-            self.ai_calls_used = 0
-            self.ai_calls_reset_at = timezone.now()
-            self.save(update_fields=['ai_calls_used', 'ai_calls_reset_at'])
-        return max(0, self.ai_calls_limit() - self.ai_calls_used)
+        """Calls left this calendar month, net of in-flight reservations (None = unlimited). Read-only."""
+        from .metering import ai_calls_remaining
+        return ai_calls_remaining(self.organization)
 
     def can_use_ai(self):
-        return self.ai_calls_remaining() > 0
+        remaining = self.ai_calls_remaining()
+        return remaining is None or remaining > 0
+
+
+# ─────────────────────────────────────────
+# USAGE COUNTERS
+# ─────────────────────────────────────────
+
+class OrgUsage(models.Model):
+    """Running totals the plan limits are checked against; kept by planner.usage.track()."""
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, primary_key=True, related_name='usage')
+    members      = models.PositiveIntegerField(default=0)
+    teams        = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.organization_id}: {self.members} members, {self.teams} teams"
+
+
+class UsageMonth(models.Model):
+    """Per calendar month (UTC) usage of an org."""
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='usage_months')
+    month        = models.DateField()  # first day of the month
+    sprints      = models.PositiveIntegerField(default=0)
+    ai_calls     = models.PositiveIntegerField(default=0)
+    ai_reserved  = models.PositiveIntegerField(default=0)  # held by open AIUsageEntry reservations
+
+    class Meta:
+        unique_together = ('organization', 'month')
+        ordering        = ['-month']
+
+    def __str__(self):
+        return f"{self.organization_id} {self.month:%Y-%m}"
+
+
+class AIUsageEntry(models.Model):
+    """
+    One metered AI request: reserved before the call, then committed with the calls
+    actually made or released. Its calls count against UsageMonth `month`.
+    """
+    STATUS_CHOICES = [
+        ('reserved',  'Reserved'),
+        ('committed', 'Committed'),
+        ('released',  'Released'),
+    ]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='ai_usage')
+    user         = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    feature      = models.CharField(max_length=50, blank=True)
+    month        = models.DateField()
+    reserved     = models.PositiveIntegerField()
+    used         = models.PositiveIntegerField(default=0)
+    status       = models.CharField(max_length=20, choices=STATUS_CHOICES, default='reserved')
+    created_at   = models.DateTimeField(auto_now_add=True)
+    settled_at   = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'], name='ai_usage_open_idx')]
+
+    def __str__(self):
+        return f"{self.feature or 'ai'} x{self.reserved} for {self.organization_id} ({self.status})"
 
 
 # ─────────────────────────────────────────
@@ -163,6 +320,33 @@ class Team(models.Model):
 # SPRINT MEMBER
 # ─────────────────────────────────────────
 
+class SprintMemberQuerySet(models.QuerySet):
+
+    def with_bandwidth(self, sprint=None, limit=BANDWIDTH_LIMIT):
+        """
+        Annotate owned_sp, assigned_sp, bandwidth (their sum) and over_bandwidth
+        in the same query, read from CapacityRollup. sprint=None sums every sprint.
+        """
+        rollups = CapacityRollup.objects.filter(member=OuterRef('pk'))
+        if sprint:
+            rollups = rollups.filter(sprint=sprint)
+        owned    = rollups.filter(stream__isnull=True).order_by().values('member').annotate(sp=Sum('sp')).values('sp')
+        assigned = rollups.filter(stream__isnull=False).order_by().values('member').annotate(sp=Sum('sp')).values('sp')
+
+        return self.annotate(
+            owned_sp=Coalesce(Subquery(owned, output_field=models.FloatField()), Value(0.0)),
+            assigned_sp=Coalesce(Subquery(assigned, output_field=models.FloatField()), Value(0.0)),
+        ).annotate(
+            bandwidth=F('owned_sp') + F('assigned_sp'),
+        ).annotate(
+            over_bandwidth=Case(
+                When(bandwidth__gt=limit, then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+
 class SprintMember(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='sprint_members')
     team         = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='members')
@@ -171,8 +355,14 @@ class SprintMember(models.Model):
     is_active    = models.BooleanField(default=True)
     created_at   = models.DateTimeField(auto_now_add=True)
 
+    objects = SprintMemberQuerySet.as_manager()
+
     class Meta:
+        # (organization, user) lookups use the unique index; this one serves active rosters
         unique_together = ('organization', 'user')
+        indexes         = [
+            models.Index(fields=['organization', 'user'], condition=Q(is_active=True), name='member_active_idx'),
+        ]
 
     def __str__(self):
         name        = self.user.get_full_name() or self.user.username
@@ -226,6 +416,27 @@ class Tag(models.Model):
 # SPRINT
 # ─────────────────────────────────────────
 
+class SprintQuerySet(models.QuerySet):
+
+    def with_summary(self):
+        """
+        Annotate story_count, estimated_count, sp_total and sp_<status> for every
+        UserStory status in one grouped query — replaces user_stories.count/total_sp() per sprint.
+        """
+        sp_by_status = {
+            f'sp_{status}': Coalesce(
+                Sum('user_stories__final_sp', filter=Q(user_stories__status=status)), Value(0.0)
+            )
+            for status, _ in UserStory.STATUS_CHOICES
+        }
+        return self.annotate(
+            story_count=models.Count('user_stories'),
+            estimated_count=models.Count('user_stories', filter=Q(user_stories__final_sp__isnull=False)),
+            sp_total=Coalesce(Sum('user_stories__final_sp'), Value(0.0)),
+            **sp_by_status,
+        )
+
+
 class Sprint(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='sprints')
     team         = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='sprints')
@@ -236,8 +447,14 @@ class Sprint(models.Model):
     is_active    = models.BooleanField(default=False)
     created_at   = models.DateTimeField(auto_now_add=True)
 
+    objects = SprintQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes  = [
+            models.Index(fields=['organization', '-created_at'], name='sprint_org_recent_idx'),
+            models.Index(fields=['organization'], condition=Q(is_active=True), name='sprint_active_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -245,12 +462,16 @@ class Sprint(models.Model):
     def total_sp(self):
         return sum(us.final_sp or 0 for us in self.user_stories.filter(final_sp__isnull=False))
 
+    def sp_by_status(self):
+        """{status: SP} — requires Sprint.objects.with_summary()."""
+        return {status: getattr(self, f'sp_{status}') for status, _ in UserStory.STATUS_CHOICES}
+
 
 # ─────────────────────────────────────────
 # EPIC
 # ─────────────────────────────────────────
 
-class Epic(models.Model):
+class Epic(StatusTrackingMixin, models.Model):
     STATUS_CHOICES = [
         ('draft',       'Draft'),
         ('in_progress', 'In Progress'),
@@ -276,25 +497,44 @@ class Epic(models.Model):
     created_at        = models.DateTimeField(auto_now_add=True)
     updated_at        = models.DateTimeField(auto_now=True)
 
+    objects = StatusTrackingQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
-        if self.pk:
-            old = Epic.objects.filter(pk=self.pk).values('status').first()
-            if old and old['status'] != self.status:
-                self.status_changed_at = timezone.now()
-        super().save(*args, **kwargs)
-
 
 # ─────────────────────────────────────────
 # USER STORY
 # ─────────────────────────────────────────
 
-class UserStory(models.Model):
+class UserStoryQuerySet(StatusTrackingQuerySet):
+
+    def next_rank(self):
+        """Rank that sorts after every story in this queryset — one index lookup."""
+        last = self.order_by('-order').values_list('order', flat=True).first()
+        return (last or 0) + RANK_STEP
+
+    def update(self, **kwargs):
+        # Mirror voting_status the same way UserStory.save() does
+        if isinstance(kwargs.get('status'), str) and 'voting_status' not in kwargs:
+            kwargs['voting_status'] = UserStory.voting_status_for(kwargs['status'])
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if 'status' in fields:
+            objs = list(objs)
+            for o in objs:
+                o.voting_status = UserStory.voting_status_for(o.status)
+            if 'voting_status' not in fields:
+                fields = [*fields, 'voting_status']
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+
+
+class UserStory(StatusTrackingMixin, models.Model):
+    CAPACITY_FIELDS = ('sprint_id', 'owner_id', 'final_sp')
     STATUS_CHOICES = [
         ('draft',       'Draft'),
         ('ready',       'Ready'),
@@ -332,36 +572,92 @@ class UserStory(models.Model):
     ], default='pending')
     vote_average      = models.FloatField(null=True, blank=True)
     tags              = models.ManyToManyField(Tag, blank=True, related_name='user_stories')
-    order             = models.PositiveIntegerField(default=0)
+    order             = models.PositiveBigIntegerField(default=0)  # sparse rank, see move_after()
     status_changed_at = models.DateTimeField(null=True, blank=True)
     created_at        = models.DateTimeField(auto_now_add=True)
     updated_at        = models.DateTimeField(auto_now=True)
 
+    objects        = UserStoryQuerySet.as_manager()
+    tracked_fields = ('status',) + CAPACITY_FIELDS
+
     class Meta:
         ordering = ['order', 'created_at']
+        indexes  = [
+            models.Index(fields=['organization', 'order', 'created_at', 'id'], name='story_rank_idx'),
+            # Board filtered to one sprint, in rank order
+            models.Index(fields=['organization', 'sprint', 'order', 'created_at', 'id'], name='story_sprint_rank_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def capacity_state(self, values=None):
+        """(sprint_id, owner_id, sp) — what this story contributes to its owner's capacity."""
+        values = values if values is not None else {f: getattr(self, f) for f in self.CAPACITY_FIELDS}
+        return (values['sprint_id'], values['owner_id'], values['final_sp'] or 0)
+
+    def loaded_capacity_state(self):
+        loaded = self.loaded_values()
+        return self.capacity_state(loaded) if set(loaded) >= set(self.tracked_fields) else None
+
+    @staticmethod
+    def voting_status_for(status):
+        if status == 'voting':
+            return 'voting'
+        if status in ('estimated', 'in_progress', 'in_review', 'done'):
+            return 'closed'
+        return 'pending'
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            old = UserStory.objects.filter(pk=self.pk).values('status').first()
-            if old and old['status'] != self.status:
-                self.status_changed_at = timezone.now()
         # Keep voting_status in sync with status
-        if self.status == 'voting':
-            self.voting_status = 'voting'
-        elif self.status in ('estimated', 'in_progress', 'in_review', 'done'):
-            self.voting_status = 'closed'
-        else:
-            self.voting_status = 'pending'
-        super().save(*args, **kwargs)
+        self.voting_status = self.voting_status_for(self.status)
+        update_fields      = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields and 'voting_status' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'voting_status']
+        old_capacity       = self.loaded_capacity_state()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CapacityRollup.story_changed(self, old_capacity)
+
+    def move_after(self, after):
+        """
+        Re-rank this story to sit right after `after` (None = top of the backlog).
+        Takes the midpoint of the neighbouring ranks; only when that gap is used
+        up is the organization renumbered. Caller provides the transaction.
+        """
+        siblings = UserStory.objects.filter(organization_id=self.organization_id).exclude(pk=self.pk)
+        for attempt in range(2):
+            low  = after.order if after else -1  # -1 so a story ranked 0 still counts as below the top
+            high = siblings.filter(order__gt=low).order_by('order').values_list('order', flat=True).first()
+            if high is None:
+                rank = low + RANK_STEP
+            elif high - low >= 2:
+                rank = (low + high) // 2
+            elif attempt == 0:
+                UserStory.rebalance_ranks(self.organization_id)
+                if after:
+                    after.refresh_from_db(fields=['order'])
+                continue
+            else:
+                break
+            UserStory.objects.filter(pk=self.pk).update(order=rank)
+            self.order = rank
+            return rank
+        raise RuntimeError('No rank gap after rebalancing')
+
+    @classmethod
+    def rebalance_ranks(cls, organization_id):
+        """Spread an organization's stories RANK_STEP apart, keeping their current order."""
+        stories = list(cls.objects.filter(organization_id=organization_id).order_by(
+            'order', 'created_at', 'id'
+        ).only('id', 'order'))
+        for i, story in enumerate(stories, 1):
+            story.order = i * RANK_STEP
+        cls.objects.bulk_update(stories, ['order'], batch_size=500)
 
     def compute_average(self):
-        votes = self.votes.all()
-        if not votes:
-            return None
-        return round(sum(v.points for v in votes) / votes.count(), 1)
+        agg = self.vote_aggregates.filter(stream__isnull=True).first()
+        return agg.average() if agg else None
 
 
 # ─────────────────────────────────────────
@@ -371,32 +667,144 @@ class UserStory(models.Model):
 class Vote(models.Model):
     user_story = models.ForeignKey(UserStory, on_delete=models.CASCADE, related_name='votes')
     member     = models.ForeignKey(SprintMember, on_delete=models.CASCADE, related_name='votes')
+    # The voter's stream when the vote was cast — the VoteAggregate row it counts in
+    stream     = models.ForeignKey(Stream, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     points     = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('user_story', 'member')
 
+    @classmethod
+    def record(cls, story, member, points):
+        """Create or change a vote and apply the difference to the story's aggregates."""
+        with transaction.atomic():
+            # Serialise writers per story so aggregate read-modify-writes can't interleave
+            UserStory.objects.select_for_update().filter(pk=story.pk).values('pk').get()
+            old = cls.objects.filter(user_story=story, member=member).values_list('points', 'stream_id').first()
+            old_points, old_stream = old or (None, None)
+            vote, _ = cls.objects.update_or_create(
+                user_story=story, member=member, defaults={'points': points, 'stream_id': member.stream_id}
+            )
+            # (stream, points to take out, points to put in); stream=None is the whole-story row
+            changes = [(None, old_points, points)]
+            if old is not None and old_stream != member.stream_id:
+                # The voter moved streams since their last vote
+                changes += [(old_stream, old_points, None), (member.stream_id, None, points)]
+            else:
+                changes.append((member.stream_id, old_points, points))
+            for i, (stream_id, old_p, new_p) in enumerate(changes):
+                if i and stream_id is None:
+                    continue  # a voter without a stream only counts in the whole-story row
+                if new_p is None:
+                    agg = VoteAggregate.objects.filter(user_story=story, stream_id=stream_id).first()
+                    if agg:
+                        agg.remove(old_p)
+                        if agg.count:
+                            agg.save()
+                        else:
+                            agg.delete()
+                    continue
+                agg, _ = VoteAggregate.objects.get_or_create(user_story=story, stream_id=stream_id)
+                agg.apply(old_p, new_p)
+                agg.save()
+        return vote
+
+
+# ─────────────────────────────────────────
+# VOTE AGGREGATE
+# ─────────────────────────────────────────
+
+class VoteAggregate(models.Model):
+    """
+    Running vote totals for a story, maintained on write by Vote.record().
+    stream=None holds the whole-story row; other rows are per stream of the voter at vote time.
+    """
+    user_story = models.ForeignKey(UserStory, on_delete=models.CASCADE, related_name='vote_aggregates')
+    stream     = models.ForeignKey(Stream, on_delete=models.CASCADE, null=True, blank=True, related_name='vote_aggregates')
+    count      = models.PositiveIntegerField(default=0)
+    total      = models.IntegerField(default=0)
+    min_points = models.IntegerField(null=True, blank=True)
+    max_points = models.IntegerField(null=True, blank=True)
+    histogram  = models.JSONField(default=dict)  # {"5": 3, "8": 1} over the org's voting scale
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_story', 'stream'], name='uniq_vote_aggregate_stream'),
+            models.UniqueConstraint(
+                fields=['user_story'], condition=models.Q(stream__isnull=True),
+                name='uniq_vote_aggregate_story',
+            ),
+        ]
+
+    def average(self):
+        if not self.count:
+            return None
+        return round(self.total / self.count, 1)
+
+    def apply(self, old_points, new_points):
+        """Swap old_points (None for a first vote) for new_points."""
+        if old_points is not None:
+            self.remove(old_points)
+        key = str(new_points)
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+        self.count += 1
+        self.total += new_points
+        self.update_bounds()
+
+    def remove(self, points):
+        """Take one vote of `points` out, if the histogram holds one."""
+        key = str(points)
+        if not self.histogram.get(key):
+            return
+        self.histogram[key] -= 1
+        if not self.histogram[key]:
+            del self.histogram[key]
+        self.count -= 1
+        self.total -= points
+        self.update_bounds()
+
+    def update_bounds(self):
+        present         = [int(p) for p in self.histogram]
+        self.min_points = min(present, default=None)
+        self.max_points = max(present, default=None)
+
 
 # ─────────────────────────────────────────
 # STREAM ASSIGNMENT
 # ─────────────────────────────────────────
 
-class StreamAssignment(models.Model):
+class StreamAssignment(TrackedFieldsMixin, models.Model):
     user_story = models.ForeignKey(UserStory, on_delete=models.CASCADE, related_name='stream_assignments')
     stream     = models.ForeignKey(Stream, on_delete=models.CASCADE, related_name='assignments')
     member     = models.ForeignKey(SprintMember, on_delete=models.CASCADE, related_name='stream_assignments')
     sp         = models.FloatField()
 
+    tracked_fields = ('member_id', 'stream_id', 'sp')
+
     class Meta:
         unique_together = ('user_story', 'stream', 'member')
 
+    def capacity_state(self, values=None):
+        values = values if values is not None else {f: getattr(self, f) for f in self.tracked_fields}
+        return (values['member_id'], values['stream_id'], values['sp'] or 0)
+
+    def loaded_capacity_state(self):
+        loaded = self.loaded_values()
+        return self.capacity_state(loaded) if set(loaded) >= set(self.tracked_fields) else None
+
+    def save(self, *args, **kwargs):
+        old_capacity = self.loaded_capacity_state()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CapacityRollup.assignment_changed(self, old_capacity)
+
 
 # ─────────────────────────────────────────
 # TASK
 # ─────────────────────────────────────────
 
-class Task(models.Model):
+class Task(StatusTrackingMixin, models.Model):
     STATUS_CHOICES = [
         ('todo',        'To Do'),
         ('in_progress', 'In Progress'),
@@ -437,25 +845,20 @@ class Task(models.Model):
     created_at        = models.DateTimeField(auto_now_add=True)
     updated_at        = models.DateTimeField(auto_now=True)
 
+    objects = StatusTrackingQuerySet.as_manager()
+
     class Meta:
         ordering = ['order', 'created_at']
 
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
-        if self.pk:
-            old = Task.objects.filter(pk=self.pk).values('status').first()
-            if old and old['status'] != self.status:
-                self.status_changed_at = timezone.now()
-        super().save(*args, **kwargs)
-
 
 # ─────────────────────────────────────────
 # BUG
 # ─────────────────────────────────────────
 
-class Bug(models.Model):
+class Bug(StatusTrackingMixin, models.Model):
     STATUS_CHOICES = [
         ('open',        'Open'),
         ('in_progress', 'In Progress'),
@@ -495,19 +898,14 @@ class Bug(models.Model):
     created_at        = models.DateTimeField(auto_now_add=True)
     updated_at        = models.DateTimeField(auto_now=True)
 
+    objects = StatusTrackingQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
-        if self.pk:
-            old = Bug.objects.filter(pk=self.pk).values('status').first()
-            if old and old['status'] != self.status:
-                self.status_changed_at = timezone.now()
-        super().save(*args, **kwargs)
-
 
 # ─────────────────────────────────────────
 # EMAIL VERIFICATION TOKEN
@@ -559,6 +957,9 @@ class InviteToken(models.Model):
 
     class Meta:
         unique_together = ('organization', 'email')
+        indexes         = [
+            models.Index(fields=['organization', '-created_at'], condition=Q(status='pending'), name='invite_pending_idx'),
+        ]
 
     def is_expired(self):
         from datetime import timedelta
@@ -566,3 +967,314 @@ class InviteToken(models.Model):
 
     def __str__(self):
         return f"Invite to {self.email} @ {self.organization.name}"
+
+
+# ─────────────────────────────────────────
+# STATE VERSION
+# ─────────────────────────────────────────
+
+class StateVersion(models.Model):
+    """
+    Monotonic change counters used as cheap ETags.
+    Kept apart from the rows they describe so a stale save() can never roll them back.
+    """
+    key   = models.CharField(max_length=100, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+    @staticmethod
+    def story_key(story_id):
+        return f"story:{story_id}"
+
+    @staticmethod
+    def org_members_key(org_id):
+        return f"org-members:{org_id}"
+
+    @classmethod
+    def bump(cls, key):
+        if cls.objects.filter(key=key).update(value=models.F('value') + 1):
+            return
+        from django.db import IntegrityError, transaction
+        try:
+            with transaction.atomic():
+                cls.objects.create(key=key, value=1)
+        except IntegrityError:
+            # Created concurrently — bump the row that won
+            cls.objects.filter(key=key).update(value=models.F('value') + 1)
+
+    @classmethod
+    def bump_many(cls, keys):
+        """bump() for many keys in a fixed number of queries."""
+        keys = list(keys)
+        if not keys:
+            return
+        cls.objects.filter(key__in=keys).update(value=models.F('value') + 1)
+        existing = set(cls.objects.filter(key__in=keys).values_list('key', flat=True))
+        cls.objects.bulk_create(
+            [cls(key=k, value=1) for k in keys if k not in existing], ignore_conflicts=True
+        )
+
+    @classmethod
+    def get_many(cls, keys):
+        """One indexed lookup; missing keys read as 0."""
+        found = dict(cls.objects.filter(key__in=keys).values_list('key', 'value'))
+        return [found.get(k, 0) for k in keys]
+
+
+# ─────────────────────────────────────────
+# CAPACITY ROLLUP
+# ─────────────────────────────────────────
+
+class CapacityRollup(models.Model):
+    """
+    Denormalised SP per (sprint, member, stream), maintained in the writing transaction.
+    stream=None holds SP from stories the member owns; sprint=None holds stories outside any sprint.
+    Rows are adjusted by delta, so a duplicate row from a concurrent insert still sums correctly.
+    `manage.py rebuild_capacity` recomputes everything from stories and assignments.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='capacity_rollups')
+    sprint       = models.ForeignKey(Sprint, on_delete=models.SET_NULL, null=True, blank=True, related_name='capacity_rollups')
+    member       = models.ForeignKey(SprintMember, on_delete=models.CASCADE, related_name='capacity_rollups')
+    stream       = models.ForeignKey(Stream, on_delete=models.CASCADE, null=True, blank=True, related_name='capacity_rollups')
+    sp           = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['sprint', 'member', 'stream'])]
+
+    def __str__(self):
+        return f"{self.sprint_id}/{self.member_id}/{self.stream_id}: {self.sp}"
+
+    @classmethod
+    def apply(cls, org_id, sprint_id, member_id, stream_id, delta):
+        if not delta or not member_id:
+            return
+        pk = cls.objects.filter(
+            sprint_id=sprint_id, member_id=member_id, stream_id=stream_id
+        ).values_list('pk', flat=True).first()
+        if pk:
+            cls.objects.filter(pk=pk).update(sp=F('sp') + delta)
+        elif delta > 0:
+            # Nothing to subtract from means the row went with a deleted sprint/member/stream
+            cls.objects.create(
+                organization_id=org_id, sprint_id=sprint_id,
+                member_id=member_id, stream_id=stream_id, sp=delta,
+            )
+
+    @classmethod
+    def story_changed(cls, story, old):
+        """old is the story's capacity_state() before the write, None for a new story."""
+        new = story.capacity_state()
+        if old == new:
+            return
+        old_sprint, old_owner, old_sp = old or (None, None, 0)
+        new_sprint, new_owner, new_sp = new
+        cls.apply(story.organization_id, old_sprint, old_owner, None, -(old_sp or 0))
+        cls.apply(story.organization_id, new_sprint, new_owner, None, new_sp)
+        if old and old_sprint != new_sprint:
+            # Stream assignments follow the story to its new sprint
+            for member_id, stream_id, sp in story.stream_assignments.values_list('member_id', 'stream_id', 'sp'):
+                cls.apply(story.organization_id, old_sprint, member_id, stream_id, -sp)
+                cls.apply(story.organization_id, new_sprint, member_id, stream_id, sp)
+
+    @classmethod
+    def assignment_changed(cls, assignment, old, deleted=False):
+        """old is the assignment's capacity_state() before the write, None for a new assignment."""
+        story = UserStory.objects.filter(pk=assignment.user_story_id).values_list(
+            'organization_id', 'sprint_id'
+        ).first()
+        if not story:
+            return
+        org_id, sprint_id = story
+        if old:
+            member_id, stream_id, sp = old
+            cls.apply(org_id, sprint_id, member_id, stream_id, -sp)
+        if not deleted:
+            member_id, stream_id, sp = assignment.capacity_state()
+            cls.apply(org_id, sprint_id, member_id, stream_id, sp)
+
+    @classmethod
+    def rebuild(cls, organization=None):
+        """Recompute rows from stories and assignments. Returns the number of rows written."""
+        stories     = UserStory.objects.filter(owner__isnull=False, final_sp__isnull=False)
+        assignments = StreamAssignment.objects.all()
+        rollups     = cls.objects.all()
+        if organization:
+            stories     = stories.filter(organization=organization)
+            assignments = assignments.filter(user_story__organization=organization)
+            rollups     = rollups.filter(organization=organization)
+
+        owned = stories.values('organization_id', 'sprint_id', 'owner_id').annotate(total=Sum('final_sp'))
+        assigned = assignments.values(
+            'user_story__organization_id', 'user_story__sprint_id', 'member_id', 'stream_id'
+        ).annotate(total=Sum('sp'))
+
+        rows = [
+            cls(organization_id=r['organization_id'], sprint_id=r['sprint_id'],
+                member_id=r['owner_id'], stream_id=None, sp=r['total'])
+            for r in owned.order_by()
+        ] + [
+            cls(organization_id=r['user_story__organization_id'], sprint_id=r['user_story__sprint_id'],
+                member_id=r['member_id'], stream_id=r['stream_id'], sp=r['total'])
+            for r in assigned.order_by()
+        ]
+        with transaction.atomic():
+            rollups.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+# ─────────────────────────────────────────
+# IMPORT JOB
+# ─────────────────────────────────────────
+
+class ImportJob(models.Model):
+    """A story import run outside the request; the uploaded file is kept until it finishes."""
+    STATUS_CHOICES = [
+        ('queued',  'Queued'),
+        ('running', 'Running'),
+        ('done',    'Done'),
+        ('failed',  'Failed'),
+    ]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='import_jobs')
+    sprint       = models.ForeignKey(Sprint, on_delete=models.CASCADE, related_name='import_jobs')
+    created_by   = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='import_jobs')
+    filename     = models.CharField(max_length=255)
+    payload      = models.BinaryField(null=True, blank=True)
+    dry_run      = models.BooleanField(default=False)
+    status       = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    rows_read    = models.PositiveIntegerField(default=0)
+    created      = models.PositiveIntegerField(default=0)
+    skipped      = models.PositiveIntegerField(default=0)
+    warnings     = models.JSONField(default=list)
+    error        = models.TextField(blank=True)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import {self.filename} ({self.status})"
+
+    def as_dict(self):
+        return {
+            'id':        self.id,
+            'status':    self.status,
+            'dry_run':   self.dry_run,
+            'filename':  self.filename,
+            'rows_read': self.rows_read,
+            'created':   self.created,
+            'skipped':   self.skipped,
+            'warnings':  self.warnings,
+            'error':     self.error,
+        }
+
+
+# ─────────────────────────────────────────
+# JOB QUEUE
+# ─────────────────────────────────────────
+
+class Job(models.Model):
+    """A unit of background work, claimed by `manage.py run_jobs`. See planner/jobs.py."""
+    STATUS_CHOICES = [
+        ('queued',  'Queued'),
+        ('running', 'Running'),
+        ('done',    'Done'),
+        ('failed',  'Failed'),
+    ]
+
+    name         = models.CharField(max_length=100)
+    queue        = models.CharField(max_length=50, default='default')
+    payload      = models.JSONField(default=dict)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    priority     = models.SmallIntegerField(default=0)  # higher runs first
+    status       = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts     = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at       = models.DateTimeField(default=timezone.now)
+    locked_by    = models.CharField(max_length=100, blank=True)
+    locked_at    = models.DateTimeField(null=True, blank=True)
+    last_error   = models.TextField(blank=True)
+    result       = models.JSONField(null=True, blank=True)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['queue', '-priority', 'run_at'], condition=models.Q(status='queued'),
+                name='job_claim_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    def error_summary(self):
+        """The last line of last_error (e.g. "ValueError: bad row") — the traceback stays server-side."""
+        lines = self.last_error.strip().splitlines()
+        return lines[-1][:500] if lines else ''
+
+    def as_dict(self):
+        return {
+            'id':          self.id,
+            'name':        self.name,
+            'status':      self.status,
+            'attempts':    self.attempts,
+            'run_at':      self.run_at,
+            'last_error':  self.error_summary(),
+            'result':      self.result,
+            'finished_at': self.finished_at,
+        }
+
+
+# ─────────────────────────────────────────
+# EMAIL OUTBOX
+# ─────────────────────────────────────────
+
+class OutboundEmail(models.Model):
+    """An email waiting for (or done with) delivery. Written by send_email(), drained by the flush_outbox job."""
+    STATUS_CHOICES = [
+        ('queued',  'Queued'),
+        ('sending', 'Sending'),
+        ('sent',    'Sent'),
+        ('failed',  'Failed'),
+    ]
+
+    to_email        = models.EmailField()
+    subject         = models.CharField(max_length=300)
+    html            = models.TextField()
+    dedupe_key      = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status          = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts        = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at      = models.DateTimeField(null=True, blank=True)
+    provider_id     = models.CharField(max_length=200, blank=True)
+    last_error      = models.TextField(blank=True)
+    created_at      = models.DateTimeField(auto_now_add=True)
+    sent_at         = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.to_email} ({self.status})"
+
+
+@receiver(post_delete, sender=UserStory)
+def _story_deleted(sender, instance, **kwargs):
+    # Runs inside the delete's transaction; assignments are handled by their own signal
+    sprint_id, owner_id, sp = instance.loaded_capacity_state() or instance.capacity_state()
+    CapacityRollup.apply(instance.organization_id, sprint_id, owner_id, None, -sp)
+
+
+@receiver(post_delete, sender=StreamAssignment)
+def _assignment_deleted(sender, instance, **kwargs):
+    old = instance.loaded_capacity_state() or instance.capacity_state()
+    CapacityRollup.assignment_changed(instance, old, deleted=True)
+
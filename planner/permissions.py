@@ -1,7 +1,95 @@
+import time
 from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import redirect
 from django.http import JsonResponse
-from .models import OrganizationMember
+from .models import OrganizationMember, SprintMember
+
+# Roles change rarely; entries also expire on their own in case an
+# invalidation is missed by another process's local cache
+PERMISSION_CACHE_TTL = getattr(settings, 'PERMISSION_CACHE_TTL', 60)
+
+
+# ─────────────────────────────────────────
+# MEMBERSHIP CACHE
+# ─────────────────────────────────────────
+
+def get_membership_version(org_id):
+    return cache.get(f'planner:membership-v:{org_id}', 0)
+
+
+def bump_membership_version(org_id):
+    """Invalidate every cached membership, role and sprint member for the org."""
+    cache.set(f'planner:membership-v:{org_id}', time.time_ns(), None)
+
+
+def _cache_get(key):
+    entry = cache.get(key)
+    if entry and entry['version'] == get_membership_version(entry['org_id']):
+        return entry
+    return None
+
+
+def _cache_set(key, org_id, **values):
+    cache.set(key, {'org_id': org_id, 'version': get_membership_version(org_id), **values},
+              PERMISSION_CACHE_TTL)
+
+
+# ─────────────────────────────────────────
+# REQUEST CONTEXT
+# ─────────────────────────────────────────
+
+def get_active_membership(request):
+    """
+    OrganizationMember for the request's active org, resolved once per request.
+    Respects the org picked on select_org; otherwise the user's first org.
+    """
+    if hasattr(request, '_active_membership'):
+        return request._active_membership
+
+    membership = None
+    if request.user.is_authenticated:
+        active_org_id = request.session.get('active_org_id')
+        key           = f'planner:membership:{request.user.pk}:{active_org_id or 0}'
+        entry         = _cache_get(key)
+        if entry:
+            membership = entry['membership']
+        else:
+            memberships = OrganizationMember.objects.select_related(
+                'organization', 'organization__subscription'
+            ).filter(user=request.user)
+            if active_org_id:
+                membership = memberships.filter(organization_id=active_org_id).first()
+            if not membership:
+                membership = memberships.first()
+            if membership:
+                _cache_set(key, membership.organization_id, membership=membership)
+
+    request._active_membership = membership
+    return membership
+
+
+def get_active_sprint_member(request):
+    """Active SprintMember for the request's org, resolved once per request."""
+    if hasattr(request, '_active_sprint_member'):
+        return request._active_sprint_member
+
+    membership = get_active_membership(request)
+    member     = None
+    if membership:
+        key   = f'planner:sprint-member:{request.user.pk}:{membership.organization_id}'
+        entry = _cache_get(key)
+        if entry:
+            member = entry['member']
+        else:
+            member = SprintMember.objects.select_related('user', 'stream').filter(
+                user=request.user, organization_id=membership.organization_id, is_active=True
+            ).first()
+            _cache_set(key, membership.organization_id, member=member)
+
+    request._active_sprint_member = member
+    return member
 
 
 def get_org_member(user, org):
@@ -18,24 +106,35 @@ def get_org_member(user, org):
 # ROLE CHECKS
 # ─────────────────────────────────────────
 
+def get_org_role(user, org):
+    """Role of user in org (None if not a member), cached until the org's memberships change."""
+    if not user.is_authenticated or not org:
+        return None
+    key   = f'planner:role:{user.pk}:{org.pk}'
+    entry = _cache_get(key)
+    if entry:
+        return entry['role']
+    role = OrganizationMember.objects.filter(
+        user=user, organization=org
+    ).values_list('role', flat=True).first()
+    _cache_set(key, org.pk, role=role)
+    return role
+
+
 def is_admin(user, org):
-    m = get_org_member(user, org)
-    return m is not None and m.role == 'admin'
+    return get_org_role(user, org) == 'admin'
 
 
 def is_scrum_master_or_above(user, org):
-    m = get_org_member(user, org)
-    return m is not None and m.role in ('admin', 'scrum_master')
+    return get_org_role(user, org) in ('admin', 'scrum_master')
 
 
 def can_vote(user, org):
-    m = get_org_member(user, org)
-    return m is not None and m.role in ('admin', 'scrum_master', 'voter')
+    return get_org_role(user, org) in ('admin', 'scrum_master', 'voter')
 
 
 def can_view(user, org):
-    m = get_org_member(user, org)
-    return m is not None
+    return get_org_role(user, org) is not None
 
 
 # ─────────────────────────────────────────
@@ -48,11 +147,7 @@ def require_org_member(view_func):
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
             return redirect('user_login')
-        from .views import get_org
-        org = get_org(request)
-        if not org:
-            return redirect('user_login')
-        if not can_view(request.user, org):
+        if not get_active_membership(request):
             return redirect('user_login')
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -64,9 +159,8 @@ def require_scrum_master(view_func):
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
             return redirect('user_login')
-        from .views import get_org
-        org = get_org(request)
-        if not org or not is_scrum_master_or_above(request.user, org):
+        m = get_active_membership(request)
+        if not m or not m.is_scrum_master():
             return redirect('board')
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -78,9 +172,8 @@ def require_admin(view_func):
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
             return redirect('user_login')
-        from .views import get_org
-        org = get_org(request)
-        if not org or not is_admin(request.user, org):
+        m = get_active_membership(request)
+        if not m or not m.is_admin():
             return redirect('sm_panel')
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -92,9 +185,8 @@ def require_voter(view_func):
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
             return redirect('user_login')
-        from .views import get_org
-        org = get_org(request)
-        if not org or not can_vote(request.user, org):
+        m = get_active_membership(request)
+        if not m or not m.can_vote():
             return redirect('board')
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -104,15 +196,26 @@ def require_voter(view_func):
 # DECORATORS — for AJAX/API views
 # ─────────────────────────────────────────
 
+def require_org_member_api(view_func):
+    """API version — returns 403 JSON instead of redirect."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        if not get_active_membership(request):
+            return JsonResponse({'error': 'Organization membership required'}, status=403)
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
 def require_scrum_master_api(view_func):
     """API version — returns 403 JSON instead of redirect."""
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'error': 'Authentication required'}, status=401)
-        from .views import get_org
-        org = get_org(request)
-        if not org or not is_scrum_master_or_above(request.user, org):
+        m = get_active_membership(request)
+        if not m or not m.is_scrum_master():
             return JsonResponse({'error': 'Scrum Master or Admin role required'}, status=403)
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -124,9 +227,8 @@ def require_admin_api(view_func):
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'error': 'Authentication required'}, status=401)
-        from .views import get_org
-        org = get_org(request)
-        if not org or not is_admin(request.user, org):
+        m = get_active_membership(request)
+        if not m or not m.is_admin():
             return JsonResponse({'error': 'Admin role required'}, status=403)
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -138,9 +240,8 @@ def require_voter_api(view_func):
     def wrapper(request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'error': 'Authentication required'}, status=401)
-        from .views import get_org
-        org = get_org(request)
-        if not org or not can_vote(request.user, org):
+        m = get_active_membership(request)
+        if not m or not m.can_vote():
             return JsonResponse({'error': 'Voter role or above required'}, status=403)
         return view_func(request, *args, **kwargs)
     return wrapper
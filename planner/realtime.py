@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+
+# ─────────────────────────────────────────
+# VOTE ROOM BROKER
+# ─────────────────────────────────────────
+
+class VoteRoomBroker:
+    """
+    In-process pub/sub for vote rooms.
+    Sync views publish a state snapshot; async stream views (ASGI) receive it.
+    Each subscriber only ever holds the latest snapshot — older ones are dropped.
+    """
+
+    def __init__(self):
+        self._lock        = threading.Lock()
+        self._subscribers = defaultdict(set)  # story_id -> {(loop, queue)}
+
+    def subscribe(self, story_id):
+        loop  = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers[story_id].add((loop, queue))
+        return queue
+
+    def unsubscribe(self, story_id, queue):
+        with self._lock:
+            subs = self._subscribers.get(story_id)
+            if not subs:
+                return
+            subs.difference_update({s for s in subs if s[1] is queue})
+            if not subs:
+                del self._subscribers[story_id]
+
+    def has_subscribers(self, story_id):
+        with self._lock:
+            return bool(self._subscribers.get(story_id))
+
+    def publish(self, story_id, payload):
+        with self._lock:
+            subs = list(self._subscribers.get(story_id, ()))
+        for loop, queue in subs:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, payload)
+            except RuntimeError:
+                # Loop already closed — subscriber is gone
+                self.unsubscribe(story_id, queue)
+
+
+def _offer(queue, payload):
+    """Replace any pending snapshot with the newest one."""
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(payload)
+
+
+broker = VoteRoomBroker()
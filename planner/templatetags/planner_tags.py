@@ -0,0 +1,12 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def get_item(mapping, key):
+    """{{ prices|get_item:plan_key }} — dict lookup with a variable key."""
+    try:
+        return mapping.get(key, '')
+    except AttributeError:
+        return ''
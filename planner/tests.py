@@ -1,3 +1,1330 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import re
+import time
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.utils import timezone
+
+from .email_utils import (
+    OUTBOX_CLAIM_TIMEOUT, OUTBOX_MAX_ATTEMPTS, LocMemTransport, flush_outbox, send_email, send_emails,
+)
+from .exporter import EXPORT_SHEETS, SprintExport
+from .importer import IMPORT_BATCH_SIZE, IMPORT_MAX_WARNINGS, StoryImport, run_import_job
+from .jobs import (
+    JOB_BACKOFF_BASE, JOB_BACKOFF_MAX, backoff, claim_job, claim_next, enqueue, job_handler, requeue_stale,
+    run_claimed,
+)
+from .metering import (
+    RESERVATION_TTL, QuotaExceeded, ai_calls_remaining, commit, metered, release, release_stale, reserve,
+)
+from .middleware import (
+    PerformanceMiddleware, RequestTimings, check_team_limit, get_entitlement, invalidate_entitlement,
+)
+from .models import (
+    AIUsageEntry, CapacityRollup, EmailVerificationToken, ImportJob, InviteToken, Job, Organization,
+    OrganizationMember, OrgUsage, OutboundEmail, PasswordResetToken, Sprint, SprintMember, Stream,
+    StreamAssignment, Subscription, Task, Team, UsageMonth, UserStory, Vote, VoteAggregate, RANK_STEP,
+)
+from .urls import urlpatterns
+from .realtime import broker
+from .usage import month_start, reconcile_org, track
+from .views import VOTE_POLL_RECHECK, vote_state_changed
+
+
+# ─────────────────────────────────────────
+# QUERY PLANS
+# ─────────────────────────────────────────
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN the hot per-organization queries and fail when one stops using an
+    index. On Postgres sequential scans are disabled for the test, so a "Seq Scan"
+    in the plan means no usable index exists rather than a small-table shortcut.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user  = User.objects.create_user('sm', 'sm@example.com', 'pw')
+        cls.org   = Organization.objects.create(name='Acme', slug='acme', owner=cls.user)
+        other     = Organization.objects.create(name='Other', slug='other', owner=cls.user)
+        stream    = Stream.objects.create(organization=cls.org, name='BE')
+        cls.member = SprintMember.objects.create(organization=cls.org, user=cls.user, stream=stream)
+        OrganizationMember.objects.create(organization=cls.org, user=cls.user, role='admin')
+        cls.sprint = Sprint.objects.create(organization=cls.org, name='S1', is_active=True)
+        Sprint.objects.create(organization=other, name='S1')
+        UserStory.objects.bulk_create([
+            UserStory(organization=org, sprint=cls.sprint if org == cls.org else None, title=f'Story {i}',
+                      order=(i + 1) * RANK_STEP)
+            for org in (cls.org, other) for i in range(20)
+        ])
+        InviteToken.objects.create(organization=cls.org, invited_by=cls.user, email='new@example.com')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def plan(self, qs):
+        return qs.explain()
+
+    def assertUsesIndex(self, qs, table, ordered=False):
+        """`table` is read through an index; with ordered=True the index also gives the ORDER BY."""
+        plan = self.plan(qs)
+        msg  = f'\n{qs.query}\n\nPlan:\n{plan}'
+        if connection.vendor == 'postgresql':
+            self.assertNotIn(f'Seq Scan on {table}', plan, f'Sequential scan of {table}:{msg}')
+            if ordered:
+                self.assertNotRegex(plan, r'(?m)^\s*(->\s*)?Sort\b', f'{table} sorted outside the index:{msg}')
+        else:
+            self.assertIsNone(
+                re.search(rf'\bSCAN {table}\b(?! USING (COVERING )?INDEX)', plan),
+                f'Full scan of {table}:{msg}',
+            )
+            self.assertNotRegex(plan, rf'\bSCAN {table} USING (COVERING )?INDEX',
+                                f'Full index scan of {table}:{msg}')
+            if ordered:
+                self.assertNotIn('TEMP B-TREE', plan, f'{table} sorted outside the index:{msg}')
+
+    def test_board_stories_in_rank_order(self):
+        stories = UserStory.objects.filter(organization=self.org).order_by('order', 'created_at', 'id')[:51]
+        self.assertUsesIndex(stories, 'planner_userstory', ordered=True)
+
+    def test_board_stories_for_sprint_in_rank_order(self):
+        stories = UserStory.objects.filter(organization=self.org, sprint=self.sprint).order_by(
+            'order', 'created_at', 'id'
+        )[:51]
+        self.assertUsesIndex(stories, 'planner_userstory', ordered=True)
+
+    def test_active_sprint(self):
+        self.assertUsesIndex(Sprint.objects.filter(organization=self.org, is_active=True), 'planner_sprint')
+
+    def test_sprint_list(self):
+        self.assertUsesIndex(Sprint.objects.filter(organization=self.org).order_by('-created_at'),
+                             'planner_sprint', ordered=True)
+
+    def test_get_member(self):
+        members = SprintMember.objects.filter(organization=self.org, user=self.user, is_active=True)
+        self.assertUsesIndex(members, 'planner_sprintmember')
+
+    def test_active_roster(self):
+        self.assertUsesIndex(SprintMember.objects.filter(organization=self.org, is_active=True),
+                             'planner_sprintmember')
+
+    def test_org_membership(self):
+        self.assertUsesIndex(OrganizationMember.objects.filter(organization=self.org, user=self.user),
+                             'planner_organizationmember')
+
+    def test_pending_invites(self):
+        invites = InviteToken.objects.filter(organization=self.org, status='pending').order_by('-created_at')
+        self.assertUsesIndex(invites, 'planner_invitetoken', ordered=True)
+
+    def test_story_votes(self):
+        story = UserStory.objects.filter(organization=self.org).first()
+        self.assertUsesIndex(Vote.objects.filter(user_story=story), 'planner_vote')
+
+    def test_job_claim(self):
+        due = Job.objects.filter(
+            status='queued', queue__in=['default'], run_at__lte=timezone.now()
+        ).order_by('-priority', 'run_at')[:5]
+        self.assertUsesIndex(due, 'planner_job')
+
+    def test_outbox_due(self):
+        due = OutboundEmail.objects.filter(status='queued', next_attempt_at__lte=timezone.now())
+        self.assertUsesIndex(due, 'planner_outboundemail')
+
+
+# ─────────────────────────────────────────
+# QUERY BUDGETS
+# ─────────────────────────────────────────
+
+PLANNER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ORG_SIZES = {'small': (3, 4), 'large': (24, 40)}  # (members, stories)
+
+# url name -> (method, path(fx), body(fx) or None, max queries).
+# Budgets hold for every org size: a view whose count grows with members or stories fails.
+QUERY_BUDGETS = {
+    # Auth
+    'signup':                 ('get',  lambda fx: '/signup/', None, 4),
+    'user_login':             ('get',  lambda fx: '/login/', None, 2),
+    'user_logout':            ('get',  lambda fx: '/logout/', None, 4),
+    'verify_email_sent':      ('get',  lambda fx: '/verify-email/sent/', None, 3),
+    'verify_email':           ('get',  lambda fx: f'/verify-email/{fx.verify_token}/', None, 11),
+    'onboarding':             ('get',  lambda fx: '/onboarding/', None, 3),
+    'password_reset_request': ('get',  lambda fx: '/password-reset/', None, 3),
+    'password_reset_done':    ('get',  lambda fx: '/password-reset/done/', None, 3),
+    'password_reset_confirm': ('get',  lambda fx: f'/password-reset/{fx.reset_token}/', None, 4),
+    'select_org':             ('get',  lambda fx: '/select-org/', None, 3),
+    # Billing
+    'pricing':                ('get',  lambda fx: '/pricing/', None, 3),
+    'billing_portal':         ('get',  lambda fx: '/billing/', None, 3),
+    'create_checkout':        ('get',  lambda fx: '/billing/checkout/?plan=pro', None, 3),
+    'cancel_subscription':    ('post', lambda fx: '/billing/cancel/', None, 4),
+    'paddle_webhook':         ('post', lambda fx: '/webhooks/paddle/', lambda fx: {
+                                  'event_type': 'transaction.completed',
+                                  'data': {'subscription_id': f'sub_{fx.org.slug}'}}, 2),
+    # Admin
+    'admin_dashboard':        ('get',  lambda fx: '/admin-dashboard/', None, 8),
+    'update_org_settings':    ('post', lambda fx: '/admin/org/settings/', {'name': 'Renamed'}, 4),
+    'add_team':               ('post', lambda fx: '/admin/teams/add/', {'name': 'New team'}, 11),
+    'edit_team':              ('post', lambda fx: f'/admin/teams/{fx.team.id}/edit/', {'name': 'Core 2'}, 5),
+    'delete_team':            ('post', lambda fx: f'/admin/teams/{fx.team.id}/delete/', None, 12),
+    'update_member_team':     ('post', lambda fx: f'/admin/members/{fx.voter.id}/team/', {'team_id': None}, 5),
+    'update_member_stream':   ('post', lambda fx: f'/admin/members/{fx.voter.id}/stream/', {'stream_id': None}, 9),
+    'edit_stream':            ('post', lambda fx: f'/admin/streams/{fx.stream.id}/edit/', {'name': 'QA'}, 5),
+    'usage_summary':          ('get',  lambda fx: '/api/usage/', None, 7),
+    # Public
+    'home':                   ('get',  lambda fx: '/', None, 2),
+    'privacy_policy':         ('get',  lambda fx: '/privacy-policy/', None, 3),
+    'terms_of_service':       ('get',  lambda fx: '/terms-of-service/', None, 3),
+    'refund_policy':          ('get',  lambda fx: '/refund-policy/', None, 3),
+    'join':                   ('get',  lambda fx: '/join/', None, 0),
+    'sm_login':               ('get',  lambda fx: '/sm_login/', None, 0),
+    'sm_pick_member':         ('get',  lambda fx: '/sm/pick-member/', None, 0),
+    'sm_logout':              ('get',  lambda fx: '/sm/logout/', None, 0),
+    # Invites
+    'accept_invite':          ('get',  lambda fx: f'/invite/{fx.invite.token}/', None, 9),
+    'list_invites':           ('get',  lambda fx: '/sm/invites/', None, 4),
+    'send_invite':            ('post', lambda fx: '/sm/invites/send/', {'email': 'one@example.com'}, 17),
+    'bulk_invite':            ('post', lambda fx: '/sm/invites/bulk/', {'invites': [f'b{i}@example.com' for i in range(10)]}, 13),
+    'cancel_invite':          ('post', lambda fx: f'/sm/invites/{fx.invite.id}/cancel/', None, 5),
+    # Board and vote room
+    'board':                  ('get',  lambda fx: '/board/', None, 9),
+    'board_stories':          ('get',  lambda fx: f'/api/board/stories/?sprint={fx.sprint.id}', None, 6),
+    'vote_room':              ('get',  lambda fx: f'/vote/{fx.voting_story.id}/', None, 9),
+    'vote_status':            ('get',  lambda fx: f'/vote/{fx.voting_story.id}/status/', None, 8),
+    'vote_stream':            ('get',  lambda fx: f'/vote/{fx.voting_story.id}/stream/', None, 0),
+    'submit_vote':            ('post', lambda fx: f'/vote/{fx.voting_story.id}/submit/', {'points': 5}, 23),
+    # SM
+    'sm_panel':               ('get',  lambda fx: '/sm/panel/', None, 7),
+    'add_member':             ('post', lambda fx: '/sm/members/add/', lambda fx: {'username': fx.outsider.username}, 21),
+    'remove_member':          ('post', lambda fx: f'/sm/members/{fx.voter.id}/remove/', None, 11),
+    'change_member_role':     ('post', lambda fx: f'/sm/members/{fx.voter.id}/role/', {'role': 'viewer'}, 7),
+    'add_stream':             ('post', lambda fx: '/sm/streams/add/', {'name': 'Mobile'}, 7),
+    'delete_stream':          ('post', lambda fx: f'/sm/streams/{fx.spare_stream.id}/delete/', None, 16),
+    'add_sprint':             ('post', lambda fx: '/sm/sprints/add/', {'name': 'S9', 'is_active': True}, 8),
+    'edit_sprint':            ('post', lambda fx: f'/sm/sprints/{fx.sprint.id}/edit/', {'goal': 'Ship'}, 5),
+    'delete_sprint':          ('post', lambda fx: f'/sm/sprints/{fx.old_sprint.id}/delete/', None, 11),
+    'export_sprint':          ('get',  lambda fx: f'/sm/sprints/{fx.sprint.id}/export/?format=csv', None, 6),
+    'export_sprints':         ('get',  lambda fx: '/sm/sprints/export/?format=ndjson', None, 9),
+    'import_stories':         ('get',  lambda fx: f'/sm/sprints/{fx.sprint.id}/import/', None, 6),
+    'import_status':          ('get',  lambda fx: f'/sm/imports/{fx.import_job.id}/', None, 4),
+    'add_story':              ('post', lambda fx: '/sm/stories/add/', lambda fx: {'title': 'New', 'sprint_id': fx.sprint.id}, 8),
+    'reorder_stories':        ('post', lambda fx: '/sm/stories/reorder/', lambda fx: {
+                                  'moves': [{'id': fx.stories[-1].id, 'after_id': None}]}, 9),
+    'edit_story':             ('post', lambda fx: f'/sm/stories/{fx.stories[0].id}/edit/', {'final_sp': 8}, 15),
+    'delete_story':           ('post', lambda fx: f'/sm/stories/{fx.stories[1].id}/delete/', None, 23),
+    'trigger_voting':         ('post', lambda fx: f'/sm/stories/{fx.stories[0].id}/trigger-voting/', None, 15),
+    'close_voting':           ('post', lambda fx: f'/sm/stories/{fx.voting_story.id}/close-voting/', None, 12),
+    'assign_sp':              ('post', lambda fx: f'/sm/stories/{fx.stories[0].id}/assign-sp/', lambda fx: {
+                                  'final_sp': 3,
+                                  'stream_assignments': [{'member_id': fx.voter.id, 'stream_id': fx.stream.id, 'sp': 2}],
+                              }, 24),
+    'edit_stream_assignment': ('post', lambda fx: f'/sm/stories/{fx.stories[0].id}/edit-stream-assignment/', lambda fx: {
+                                  'assignment_id': fx.assignment.id, 'sp': 3}, 12),
+    'bulk_status':            ('post', lambda fx: '/sm/stories/bulk-status/', lambda fx: {
+                                  'ids': [s.id for s in fx.stories[:3]], 'status': 'in_progress'}, 10),
+    'story_detail':           ('get',  lambda fx: f'/api/stories/{fx.stories[0].id}/', None, 2),
+    'job_status':             ('get',  lambda fx: f'/api/jobs/{fx.job.id}/', None, 4),
+}
+
+
+def seed_org(slug, members, stories):
+    """An organization with `members` voters and `stories` estimated stories, plus one open vote."""
+    fx       = SimpleNamespace()
+    fx.user  = User.objects.create_user(f'{slug}-sm', f'sm@{slug}.example.com', 'pw')
+    fx.org   = Organization.objects.create(name=slug.title(), slug=slug, owner=fx.user)
+    Subscription.objects.create(organization=fx.org, plan='business', status='active',
+                                trial_end=timezone.now() + timedelta(days=14),
+                                paddle_subscription_id=f'sub_{slug}')
+    OrganizationMember.objects.create(organization=fx.org, user=fx.user, role='admin')
+    fx.stream       = Stream.objects.create(organization=fx.org, name='BE')
+    fx.spare_stream = Stream.objects.create(organization=fx.org, name='FE')
+    fx.team         = Team.objects.create(organization=fx.org, name='Core', created_by=fx.user)
+    fx.sm           = SprintMember.objects.create(organization=fx.org, user=fx.user, stream=fx.stream)
+
+    voters = []
+    for i in range(members):
+        user = User.objects.create_user(f'{slug}-{i}', f'{i}@{slug}.example.com', 'pw', first_name=f'Voter {i}')
+        OrganizationMember.objects.create(organization=fx.org, user=user, role='voter')
+        voters.append(SprintMember.objects.create(organization=fx.org, user=user, stream=fx.stream, team=fx.team))
+    fx.voter    = voters[0]
+    fx.outsider = User.objects.create_user(f'{slug}-new', f'new@{slug}.example.com', 'pw')
+
+    fx.sprint     = Sprint.objects.create(organization=fx.org, name='S2', is_active=True)
+    fx.old_sprint = Sprint.objects.create(organization=fx.org, name='S1')
+    fx.stories    = []
+    for i in range(stories):
+        story = UserStory.objects.create(
+            organization=fx.org, sprint=fx.sprint if i % 4 else fx.old_sprint, title=f'Story {i}',
+            owner=voters[i % members], final_sp=3, status='estimated', order=(i + 1) * RANK_STEP,
+            involved_streams=[str(fx.stream.id)],
+        )
+        StreamAssignment.objects.create(user_story=story, stream=fx.stream, member=voters[(i + 1) % members], sp=2)
+        Task.objects.create(organization=fx.org, user_story=story, title=f'Task {i}')
+        fx.stories.append(story)
+    fx.assignment = fx.stories[0].stream_assignments.get()
+
+    fx.voting_story = UserStory.objects.create(
+        organization=fx.org, sprint=fx.sprint, title='Open vote', status='voting', order=(stories + 1) * RANK_STEP,
+    )
+    for i, voter in enumerate(voters):
+        Vote.record(fx.voting_story, voter, [1, 2, 3, 5, 8][i % 5])
+
+    fx.invite       = InviteToken.objects.create(organization=fx.org, invited_by=fx.user, email=f'invitee@{slug}.example.com')
+    fx.verify_token = EmailVerificationToken.objects.create(user=fx.outsider).token
+    fx.reset_token  = PasswordResetToken.objects.create(user=fx.outsider).token
+    fx.import_job   = ImportJob.objects.create(organization=fx.org, sprint=fx.sprint, created_by=fx.user,
+                                               filename='stories.csv')
+    fx.job          = Job.objects.create(name='flush_outbox', organization=fx.org)
+    reconcile_org(fx.org.id)  # usage counters, as the migration backfill leaves them
+    return fx
+
+
+class QueryLog:
+    """execute_wrapper that records every query with the planner code that issued it."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, self.call_site()))
+        return execute(sql, params, many, context)
+
+    @staticmethod
+    def call_site():
+        in_template = False
+        for frame in reversed(traceback.extract_stack()[:-2]):
+            if frame.filename.startswith(PLANNER_DIR) and not frame.filename.endswith('tests.py'):
+                where = f'{os.path.relpath(frame.filename, os.path.dirname(PLANNER_DIR))}:{frame.lineno} in {frame.name}'
+                return f'{where} (while rendering a template)' if in_template else where
+            if f'{os.sep}django{os.sep}template{os.sep}' in frame.filename:
+                in_template = True
+        return 'outside planner (middleware, auth, sessions)'
+
+    def report(self):
+        by_site = defaultdict(list)
+        for sql, site in self.queries:
+            by_site[site].append(sql)
+        lines = []
+        for site, queries in sorted(by_site.items(), key=lambda item: -len(item[1])):
+            lines.append(f'  {len(queries):>3}× {site}')
+            for sql in dict.fromkeys(queries):
+                lines.append(f'         {sql[:300]}')
+        return '\n'.join(lines)
+
+
+def paddle_signature(body, ts='1700000000'):
+    """A Paddle-Signature header for body under the current PADDLE_WEBHOOK_SECRET."""
+    digest = hmac.new(settings.PADDLE_WEBHOOK_SECRET.encode(), f'{ts}:{body}'.encode(), hashlib.sha256).hexdigest()
+    return f'ts={ts};h1={digest}'
+
+
+@override_settings(JOBS_EAGER=False, EMAIL_TRANSPORT='planner.email_utils.LocMemTransport',
+                   PADDLE_WEBHOOK_SECRET='whsec_test',
+                   PADDLE_PRICES={**settings.PADDLE_PRICES, 'pro_monthly': 'pri_pro_monthly'})
+class QueryBudgetTests(TestCase):
+    """
+    Every URL in planner/urls.py, requested by an admin of a small and a large
+    organization, must stay within its QUERY_BUDGETS entry. Caches are cleared
+    first so the budget covers the cold path.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.orgs = {size: seed_org(size, *counts) for size, counts in ORG_SIZES.items()}
+
+    def request(self, fx, name):
+        method, path, body, _ = QUERY_BUDGETS[name]
+        client = Client()
+        client.force_login(fx.user)
+        cache.clear()
+        log = QueryLog()
+        kwargs = {}
+        if body is not None:
+            kwargs = {'data': json.dumps(body(fx) if callable(body) else body), 'content_type': 'application/json'}
+        if name == 'paddle_webhook':
+            kwargs['headers'] = {'Paddle-Signature': paddle_signature(kwargs['data'])}
+        with connection.execute_wrapper(log):
+            response = getattr(client, method)(path(fx), **kwargs)
+        if getattr(response, 'streaming', False):
+            with connection.execute_wrapper(log):
+                b''.join(response.streaming_content)
+        return response, log
+
+    def check_budget(self, name):
+        budget = QUERY_BUDGETS[name][3]
+        counts = {}
+        for size, fx in self.orgs.items():
+            response, log = self.request(fx, name)
+            self.assertLess(response.status_code, 400, f'{name} ({size} org) answered {response.status_code}')
+            counts[size] = len(log.queries)
+            if counts[size] > budget:
+                self.fail(
+                    f'{name} ran {counts[size]} queries for the {size} org (budget {budget}):\n{log.report()}'
+                )
+        if counts['large'] > counts['small']:
+            self.fail(f'{name} queries grow with org size: {counts}\n{log.report()}')
+
+    def test_budget_fixtures_take_the_success_path(self):
+        fx = self.orgs['small']
+        self.assertEqual(self.request(fx, 'create_checkout')[0].json()['price_id'], 'pri_pro_monthly')
+        self.assertEqual(Job.objects.filter(name='cancel_subscription').count(), 0)
+        self.request(fx, 'cancel_subscription')
+        self.assertEqual(Job.objects.filter(name='cancel_subscription').count(), 1)
+        Subscription.objects.filter(organization=fx.org).update(status='past_due')
+        self.assertEqual(self.request(fx, 'paddle_webhook')[0].status_code, 200)
+        self.assertEqual(Subscription.objects.get(organization=fx.org).status, 'active')
+        response = Client().post('/webhooks/paddle/', '{}', content_type='application/json',
+                                 headers={'Paddle-Signature': 'ts=1;h1=forged'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_every_url_has_a_budget(self):
+        names = {p.name for p in urlpatterns if p.name}
+        self.assertEqual(sorted(names - set(QUERY_BUDGETS)), [], 'Add these URLs to QUERY_BUDGETS')
+        self.assertEqual(sorted(set(QUERY_BUDGETS) - names), [], 'Stale QUERY_BUDGETS entries')
+
+
+def _budget_test(name):
+    def test(self):
+        self.check_budget(name)
+    test.__name__ = f'test_{name}'
+    return test
+
+
+for _name in QUERY_BUDGETS:
+    setattr(QueryBudgetTests, f'test_{_name}', _budget_test(_name))
+
+
+# ─────────────────────────────────────────
+# VOTE AGGREGATES
+# ─────────────────────────────────────────
+
+class VoteAggregateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx    = seed_org('votes', 3, 1)
+        cls.story = UserStory.objects.create(organization=cls.fx.org, sprint=cls.fx.sprint, title='Room',
+                                             status='voting')
+
+    def aggregates(self):
+        return {
+            agg.stream_id: (agg.count, agg.total, agg.histogram)
+            for agg in VoteAggregate.objects.filter(user_story=self.story)
+        }
+
+    def test_apply_swaps_a_changed_vote(self):
+        agg = VoteAggregate(user_story=self.story)
+        agg.apply(None, 5)
+        agg.apply(None, 8)
+        agg.apply(5, 3)
+        self.assertEqual((agg.count, agg.total, agg.histogram), (2, 11, {'8': 1, '3': 1}))
+        self.assertEqual((agg.min_points, agg.max_points, agg.average()), (3, 8, 5.5))
+        agg.remove(13)  # not in the histogram — nothing to take out
+        self.assertEqual(agg.count, 2)
+
+    def test_record_revote_in_the_same_stream(self):
+        Vote.record(self.story, self.fx.voter, 5)
+        Vote.record(self.story, self.fx.voter, 8)
+        be = self.fx.stream.id
+        self.assertEqual(self.aggregates(), {None: (1, 8, {'8': 1}), be: (1, 8, {'8': 1})})
+
+    def test_record_revote_after_moving_streams(self):
+        mover, other = self.fx.voter, SprintMember.objects.get(user__username='votes-1')
+        other.stream = self.fx.spare_stream
+        other.save()
+        Vote.record(self.story, mover, 5)
+        Vote.record(self.story, other, 5)
+        mover.stream = self.fx.spare_stream
+        mover.save()
+        Vote.record(self.story, mover, 5)
+
+        # The old stream loses the vote; the new one gains it without touching the other voter's 5
+        self.assertEqual(self.aggregates(), {
+            None:                    (2, 10, {'5': 2}),
+            self.fx.spare_stream.id: (2, 10, {'5': 2}),
+        })
+        self.assertEqual(Vote.objects.get(user_story=self.story, member=mover).stream_id, self.fx.spare_stream.id)
+
+    def test_bulk_closing_records_the_average(self):
+        for points, username in [(3, 'votes-0'), (8, 'votes-1')]:
+            Vote.record(self.story, SprintMember.objects.get(user__username=username), points)
+        self.client.force_login(self.fx.user)
+        response = self.client.post('/sm/stories/bulk-status/', json.dumps({
+            'ids': [self.story.id, self.fx.stories[0].id], 'status': 'estimated',
+        }), content_type='application/json')
+        self.assertEqual(response.json()['updated'], 1)
+        self.story.refresh_from_db()
+        self.assertEqual((self.story.voting_status, self.story.vote_average), ('closed', 5.5))
+        self.assertEqual(self.story.vote_average, self.story.compute_average())
+
+    def test_deleting_a_stream_drops_cached_sprint_members(self):
+        cache.clear()
+        voter = Client()
+        voter.force_login(self.fx.voter.user)
+        vote  = lambda points: voter.post(f'/vote/{self.story.id}/submit/', json.dumps({'points': points}),
+                                          content_type='application/json')
+        self.assertEqual(vote(5).status_code, 200)  # caches the voter's sprint member, stream included
+        self.client.force_login(self.fx.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/sm/streams/{self.fx.stream.id}/delete/')
+        self.assertEqual(vote(8).status_code, 200)
+        self.assertIsNone(Vote.objects.get(user_story=self.story, member=self.fx.voter).stream_id)
+        self.assertEqual(self.aggregates(), {None: (1, 8, {'8': 1})})
+
+
+# ─────────────────────────────────────────
+# VOTE ROOM UPDATES
+# ─────────────────────────────────────────
+
+# WhiteNoise is sync-only. Outside a real ASGI server (no per-request thread) the adapted request
+# would hold the one thread the concurrent writes below need, so it is left out here.
+@override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'whitenoise' not in m])
+class VoteRoomUpdateTests(TestCase):
+    """The vote_stream SSE feed and the vote_status ETag/long-poll fallback."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx    = seed_org('room', 3, 1)
+        cls.story = cls.fx.voting_story
+
+    def setUp(self):
+        cache.clear()
+        self.async_client.force_login(self.fx.voter.user)
+
+    def status(self, etag=None, wait=None):
+        return self.async_client.get(f'/vote/{self.story.id}/status/', {'wait': wait} if wait else {},
+                               headers={'If-None-Match': etag} if etag else {})
+
+    async def test_unchanged_room_answers_304(self):
+        first = await self.status()
+        self.assertEqual((first.status_code, first.json()['voted_count']), (200, 3))
+        again = await self.status(first['ETag'])
+        self.assertEqual((again.status_code, again['ETag']), (304, first['ETag']))
+
+    @sync_to_async
+    def vote(self, points):
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.record(self.story, self.fx.sm, points)
+            vote_state_changed(self.story)
+
+    async def test_stream_pushes_new_state_and_unsubscribes_on_disconnect(self):
+        response = await self.async_client.get(f'/vote/{self.story.id}/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        event  = lambda chunk: json.loads(chunk.decode().removeprefix('data: '))
+        self.assertEqual(event(await anext(events))['voted_count'], 3)
+        self.assertTrue(broker.has_subscribers(self.story.id))
+
+        await self.vote(8)
+        self.assertEqual(event(await asyncio.wait_for(anext(events), 2))['voted_count'], 4)
+
+        # The server cancels the response task when the client goes away
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.1)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertFalse(broker.has_subscribers(self.story.id))
+
+    def test_stream_is_not_served_under_wsgi(self):
+        self.client.force_login(self.fx.voter.user)
+        self.assertEqual(self.client.get(f'/vote/{self.story.id}/stream/').status_code, 204)
+
+    async def test_long_poll_wakes_on_a_vote(self):
+        etag    = (await self.status())['ETag']
+        started = time.monotonic()
+        poll    = asyncio.ensure_future(self.status(etag, wait=5))
+        await asyncio.sleep(0.2)
+        await self.vote(8)
+        response = await poll
+        # Woken by the broker, well before the next version recheck
+        self.assertLess(time.monotonic() - started, VOTE_POLL_RECHECK)
+        self.assertEqual((response.status_code, response.json()['voted_count']), (200, 4))
+        self.assertNotEqual(response['ETag'], etag)
+
+    async def test_long_poll_wakes_when_a_stream_is_deleted(self):
+        etag = (await self.status())['ETag']
+        sm   = AsyncClient()
+        await sm.aforce_login(self.fx.user)
+        with mock.patch('planner.views.VOTE_POLL_RECHECK', 0.1):
+            poll = asyncio.ensure_future(self.status(etag, wait=5))
+            await asyncio.sleep(0.2)
+            await sm.post(f'/sm/streams/{self.fx.stream.id}/delete/')
+            started  = time.monotonic()
+            response = await poll
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stream_averages'], [])
+
+    async def test_long_poll_times_out_with_304(self):
+        etag     = (await self.status())['ETag']
+        response = await self.status(etag, wait=1)
+        self.assertEqual(response.status_code, 304)
+
+
+# ─────────────────────────────────────────
+# BOARD PAGING
+# ─────────────────────────────────────────
+
+class BoardStoriesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx = seed_org('paging', 3, 4)
+
+    def setUp(self):
+        self.client.force_login(self.fx.user)
+
+    def page(self, **params):
+        return self.client.get('/api/board/stories/', params)
+
+    def test_bad_parameters_are_400(self):
+        for params in ({'limit': 'x'}, {'sprint': 'abc'}, {'owner': 'me'}):
+            self.assertEqual(self.page(**params).status_code, 400, params)
+
+    def test_limit_is_clamped(self):
+        first = self.page(limit=-1).json()
+        self.assertEqual(len(first['stories']), 1)
+        self.assertEqual(self.page(limit=0).json()['stories'], first['stories'])
+        # The cursor continues right after the one story returned
+        rest = self.page(limit=500, cursor=first['next_cursor']).json()
+        ids  = [s['id'] for s in first['stories'] + rest['stories']]
+        self.assertEqual(ids, [s['id'] for s in self.page(limit=500).json()['stories']])
+
+
+# ─────────────────────────────────────────
+# CAPACITY ROLLUPS
+# ─────────────────────────────────────────
+
+class CapacityRollupTests(TestCase):
+    """Every write keeps the rollups equal to what rebuild() computes from scratch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx = seed_org('cap', 3, 8)
+
+    def totals(self):
+        rows = CapacityRollup.objects.filter(organization=self.fx.org).values_list('sprint_id', 'member_id', 'stream_id', 'sp')
+        sums = defaultdict(float)
+        for sprint_id, member_id, stream_id, sp in rows:
+            sums[sprint_id, member_id, stream_id] += sp
+        return {key: sp for key, sp in sums.items() if sp}
+
+    def assertMatchesRebuild(self):
+        incremental = self.totals()
+        CapacityRollup.rebuild(self.fx.org)
+        self.assertEqual(incremental, self.totals())
+
+    def test_owner_and_points_changes(self):
+        story          = self.fx.stories[1]
+        story.owner    = self.fx.sm
+        story.final_sp = 8
+        story.save()
+        self.fx.stories[2].owner = None
+        self.fx.stories[2].save()
+        self.assertMatchesRebuild()
+
+    def test_assignment_changes(self):
+        assignment        = self.fx.assignment
+        assignment.member = self.fx.sm
+        assignment.stream = self.fx.spare_stream
+        assignment.sp     = 5
+        assignment.save()
+        StreamAssignment.objects.create(user_story=self.fx.stories[1], stream=self.fx.spare_stream,
+                                        member=self.fx.voter, sp=1)
+        self.fx.stories[2].stream_assignments.get().delete()
+        self.assertMatchesRebuild()
+
+    def test_story_moves_to_another_sprint_with_its_assignments(self):
+        story        = self.fx.stories[1]
+        story.sprint = self.fx.old_sprint
+        story.save()
+        self.assertMatchesRebuild()
+        story.sprint = None
+        story.save()
+        self.assertMatchesRebuild()
+
+    def test_deletes(self):
+        self.fx.stories[1].delete()
+        UserStory.objects.filter(id=self.fx.stories[2].id).delete()
+        self.fx.old_sprint.delete()
+        self.assertMatchesRebuild()
+        self.fx.voter.delete()
+        self.assertMatchesRebuild()
+
+
+# ─────────────────────────────────────────
+# STATUS TRACKING
+# ─────────────────────────────────────────
+
+class StatusTrackingTests(TestCase):
+    """update(), bulk_update() and save() all keep voting_status and status_changed_at in step with status."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx       = seed_org('status', 2, 4)
+        cls.long_ago = timezone.now() - timedelta(days=3)
+        UserStory.objects.filter(organization=cls.fx.org).update(status_changed_at=cls.long_ago)
+
+    def stories(self):
+        return UserStory.objects.filter(id__in=[s.id for s in self.fx.stories[:2]]).order_by('id')
+
+    def assertStates(self, expected):
+        self.assertEqual(
+            [(s.status, s.voting_status, s.status_changed_at > self.long_ago) for s in self.stories()], expected
+        )
+
+    def test_update_stamps_only_rows_whose_status_changes(self):
+        UserStory.objects.filter(id=self.fx.stories[1].id).update(status='voting', status_changed_at=self.long_ago)
+        self.stories().update(status='voting')
+        self.assertStates([('voting', 'voting', True), ('voting', 'voting', False)])
+        self.stories().update(status='draft')
+        self.assertStates([('draft', 'pending', True), ('draft', 'pending', True)])
+
+    def test_bulk_update(self):
+        first, second = self.stories()
+        first.status  = 'voting'
+        second.title  = 'Renamed'  # status unchanged
+        UserStory.objects.bulk_update([first, second], ['status', 'title'])
+        self.assertStates([('voting', 'voting', True), ('estimated', 'closed', False)])
+
+    def test_bulk_update_of_objects_loaded_without_status(self):
+        story        = UserStory.objects.only('id').get(id=self.fx.stories[0].id)
+        story.status = 'in_progress'
+        UserStory.objects.bulk_update([story], ['status'])
+        self.assertStates([('in_progress', 'closed', True), ('estimated', 'closed', False)])
+
+    def test_save_with_update_fields(self):
+        story        = self.stories()[0]
+        story.status = 'voting'
+        story.save(update_fields=['status'])
+        self.assertStates([('voting', 'voting', True), ('estimated', 'closed', False)])
+
+    def test_tasks_are_tracked_too(self):
+        task = Task.objects.get(user_story=self.fx.stories[0])
+        Task.objects.filter(id=task.id).update(status=task.status)
+        self.assertEqual(Task.objects.get(id=task.id).status_changed_at, task.status_changed_at)
+        Task.objects.filter(id=task.id).update(status='done')
+        self.assertIsNotNone(Task.objects.get(id=task.id).status_changed_at)
+
+
+# ─────────────────────────────────────────
+# RANKING
+# ─────────────────────────────────────────
+
+class RankingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx = seed_org('rank', 1, 4)
+        cls.a, cls.b, cls.c, cls.d = cls.fx.stories
+
+    def ranked(self):
+        return list(UserStory.objects.filter(organization=self.fx.org).order_by('order').values_list('id', flat=True))
+
+    def test_move_to_the_top_between_and_to_the_bottom(self):
+        self.d.move_after(None)
+        self.assertEqual(self.ranked()[:4], [self.d.id, self.a.id, self.b.id, self.c.id])
+        self.a.move_after(self.b)
+        self.assertEqual(self.ranked()[:4], [self.d.id, self.b.id, self.a.id, self.c.id])
+        self.b.move_after(self.fx.voting_story)
+        self.assertEqual(self.ranked()[-1], self.b.id)
+
+    def test_exhausted_gap_rebalances_once(self):
+        UserStory.objects.filter(id=self.a.id).update(order=0)
+        UserStory.objects.filter(id=self.b.id).update(order=1)
+        self.a.refresh_from_db()
+        self.c.move_after(self.a)
+        self.assertEqual(self.ranked()[:3], [self.a.id, self.c.id, self.b.id])
+        orders = list(UserStory.objects.filter(organization=self.fx.org).order_by('order').values_list('order', flat=True))
+        self.assertEqual(orders[:2], [RANK_STEP, RANK_STEP + RANK_STEP // 2])
+
+    def test_rebalance_keeps_order_and_breaks_ties_by_age(self):
+        UserStory.objects.filter(organization=self.fx.org).update(order=7)
+        UserStory.objects.filter(id=self.d.id).update(order=3)
+        UserStory.rebalance_ranks(self.fx.org.id)
+        stories = list(UserStory.objects.filter(organization=self.fx.org).order_by('order'))
+        self.assertEqual([s.id for s in stories][:5], [self.d.id, self.a.id, self.b.id, self.c.id, self.fx.voting_story.id])
+        self.assertEqual([s.order for s in stories], [(i + 1) * RANK_STEP for i in range(len(stories))])
+
+
+# ─────────────────────────────────────────
+# SPRINT EXPORT
+# ─────────────────────────────────────────
+
+class SprintExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx = seed_org('exp', 3, 8)
+        cls.counts = {
+            'stories':     UserStory.objects.filter(sprint=cls.fx.sprint).count(),
+            'assignments': StreamAssignment.objects.filter(user_story__sprint=cls.fx.sprint).count(),
+            'votes':       Vote.objects.filter(user_story__sprint=cls.fx.sprint).count(),
+            'capacity':    len(list(SprintExport(cls.fx.org, [cls.fx.sprint]).capacity())),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.fx.user)
+
+    def export(self, **params):
+        response = self.client.get(f'/sm/sprints/{self.fx.sprint.id}/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.getvalue()
+
+    def test_csv_has_the_header_and_one_row_per_record(self):
+        self.assertEqual([self.counts[s] for s in EXPORT_SHEETS], [7, 6, 3, 6])
+        for sheet, (_, _, columns) in EXPORT_SHEETS.items():
+            rows = list(csv.reader(io.StringIO(self.export(format='csv', sheet=sheet).decode('utf-8-sig'))))
+            self.assertEqual(rows[0], [label for _, label, _ in columns])
+            self.assertEqual(len(rows) - 1, self.counts[sheet], sheet)
+
+    def test_ndjson_tags_every_record_with_its_type(self):
+        records = [json.loads(line) for line in self.export(format='ndjson').decode().splitlines()]
+        by_type = defaultdict(list)
+        for record in records:
+            by_type[record.pop('type')].append(record)
+        for sheet, (_, record_type, columns) in EXPORT_SHEETS.items():
+            self.assertEqual(len(by_type[record_type]), self.counts[sheet], sheet)
+            self.assertEqual(set(by_type[record_type][0]), {field for field, _, _ in columns})
+        self.assertEqual([r['title'] for r in by_type['story']][-1], 'Open vote')
+
+    def test_xlsx_has_a_sheet_per_export(self):
+        workbook = openpyxl.load_workbook(io.BytesIO(self.export(format='xlsx')), read_only=True)
+        for sheet, (title, _, columns) in EXPORT_SHEETS.items():
+            rows = list(workbook[title].values)
+            self.assertEqual(list(rows[0]), [label for _, label, _ in columns])
+            self.assertEqual(len(rows) - 1, self.counts[sheet], sheet)
+
+
+# ─────────────────────────────────────────
+# STORY IMPORT
+# ─────────────────────────────────────────
+
+def import_csv(rows, broken=False):
+    """A CSV upload with `rows` stories; `broken` appends bytes that aren't UTF-8, so reading fails at the end."""
+    lines = ['Title,SP'] + [f'Imported {i},3' for i in range(rows)]
+    return ('\n'.join(lines) + '\n').encode() + (b'\xff\xfe,1\n' if broken else b'')
+
+
+class StoryImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx = seed_org('imp', 2, 4)
+
+    def imported(self):
+        return UserStory.objects.filter(title__startswith='Imported').count()
+
+    def run_import(self, rows, **kwargs):
+        return StoryImport(self.fx.sprint, **kwargs).run([('Title', 'SP', 'Owner', 'Stream'), *rows])
+
+    def test_dry_run_counts_without_writing(self):
+        rollups = list(CapacityRollup.objects.values_list('id', 'sp').order_by('id'))
+        result  = self.run_import([(f'Imported {i}', 3, 'Voter 0', 'BE') for i in range(5)], dry_run=True)
+        self.assertEqual((result.rows_read, result.created, result.skipped, result.warnings), (5, 5, 0, []))
+        self.assertEqual(self.imported(), 0)
+        self.assertEqual(list(CapacityRollup.objects.values_list('id', 'sp').order_by('id')), rollups)
+
+    def test_bad_cells_warn_and_blank_titles_skip(self):
+        result = self.run_import([
+            ('Imported ok', '5', 'voter 0', 'be, FE'),
+            ('', 3, '', ''),
+            ('Imported ' + 'x' * 400, 'lots', 'Nobody', 'QA'),
+        ])
+        self.assertEqual((result.rows_read, result.created, result.skipped), (3, 2, 1))
+        self.assertEqual(result.warnings, [
+            'Row 4: title longer than 300 characters was truncated',
+            'Row 4: SP "lots" is not a number — left blank',
+            'Row 4: owner "Nobody" is not an active member — left unassigned',
+            'Row 4: unknown stream "QA" ignored',
+        ])
+        story = UserStory.objects.get(title='Imported ok')
+        self.assertEqual((story.owner_id, story.final_sp, story.involved_streams),
+                         (self.fx.voter.id, 5, [str(self.fx.stream.id), str(self.fx.spare_stream.id)]))
+
+    def test_warnings_are_capped(self):
+        result = self.run_import([(f'Imported {i}', 'x') for i in range(IMPORT_MAX_WARNINGS + 5)], dry_run=True)
+        self.assertEqual(len(result.warnings), IMPORT_MAX_WARNINGS)
+
+    def test_batches_rank_after_the_backlog_and_add_capacity(self):
+        batches = []
+        rows    = [(f'Imported {i}', 1, 'Voter 0') for i in range(IMPORT_BATCH_SIZE * 2 + 1)]
+        last    = UserStory.objects.filter(organization=self.fx.org).next_rank()
+        before  = self.fx.voter.capacity_rollups.filter(sprint=self.fx.sprint, stream=None).get().sp
+        StoryImport(self.fx.sprint, progress=lambda r: batches.append(r.created)).run([('Title', 'SP', 'Owner'), *rows])
+        self.assertEqual(batches, [IMPORT_BATCH_SIZE, IMPORT_BATCH_SIZE * 2, IMPORT_BATCH_SIZE * 2 + 1])
+        orders = list(UserStory.objects.filter(title__startswith='Imported').order_by('id').values_list('order', flat=True))
+        self.assertEqual(orders, [last + i * RANK_STEP for i in range(len(rows))])
+        self.assertEqual(self.fx.voter.capacity_rollups.filter(sprint=self.fx.sprint, stream=None).get().sp,
+                         before + len(rows))
+
+    def test_failed_job_removes_the_batches_it_wrote(self):
+        job = ImportJob.objects.create(organization=self.fx.org, sprint=self.fx.sprint, created_by=self.fx.user,
+                                       filename='big.csv', payload=import_csv(IMPORT_BATCH_SIZE + 10, broken=True))
+        run_import_job({'import_job_id': job.id})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.created, self.imported()), ('failed', 0, 0))
+        self.assertIn(f'{IMPORT_BATCH_SIZE} stories created before the failure were removed', job.error)
+
+    def test_failed_inline_import_writes_nothing(self):
+        self.client.force_login(self.fx.user)
+        upload   = SimpleUploadedFile('s.csv', import_csv(IMPORT_BATCH_SIZE + 10, broken=True), 'text/csv')
+        response = self.client.post(f'/sm/sprints/{self.fx.sprint.id}/import/', {'file': upload})
+        self.assertEqual((response.status_code, self.imported()), (400, 0))
+
+
+# ─────────────────────────────────────────
+# ENTITLEMENT CACHE
+# ─────────────────────────────────────────
+
+class EntitlementCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.fx = seed_org('ent', 1, 1)
+
+    def test_a_plan_change_shows_once_invalidated(self):
+        org = self.fx.org
+        self.assertEqual(get_entitlement(org)['plan'], 'business')
+        Subscription.objects.filter(organization=org).update(plan='starter')
+        self.assertEqual(get_entitlement(org)['plan'], 'business')  # still cached
+        invalidate_entitlement(org.id)
+        entitlement = get_entitlement(org)
+        self.assertEqual((entitlement['plan'], entitlement['limits']), ('starter', settings.PLAN_LIMITS['starter']))
+
+    @override_settings(JOBS_EAGER=False)
+    def test_a_cancellation_in_the_worker_reaches_the_web_cache(self):
+        self.assertEqual(get_entitlement(self.fx.org)['status'], 'active')
+        job = enqueue('cancel_subscription', {'subscription_id': self.fx.org.subscription.id})
+        with mock.patch('planner.billing_views.get_paddle_client') as client:
+            run_claimed(claim_job(job.id, 'worker'))
+        client.return_value.subscriptions.cancel.assert_called_once_with('sub_ent', effective_from='next_billing_period')
+        self.assertEqual(get_entitlement(self.fx.org)['status'], 'cancelled')
+
+
+# ─────────────────────────────────────────
+# BULK INVITES
+# ─────────────────────────────────────────
+
+class BulkInviteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx = seed_org('inv', 3, 4)
+        cls.member_user = cls.fx.voter.user
+        cls.member_user.email = 'Mixed.Case@Inv.example.com'
+        cls.member_user.save()
+        # A member who also still holds a pending invite
+        InviteToken.objects.create(organization=cls.fx.org, invited_by=cls.fx.user, email='mixed.case@inv.example.com')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.fx.user)
+
+    def invite(self, emails, **extra):
+        return self.client.post('/sm/invites/bulk/', json.dumps({'invites': emails, **extra}),
+                                content_type='application/json')
+
+    def test_members_and_live_invites_are_skipped(self):
+        emails = ['MIXED.case@inv.example.com', self.fx.invite.email, 'new@example.com', 'New@Example.com', 'nope']
+        data   = self.invite(emails).json()
+        self.assertEqual([i['email'] for i in data['invited']], ['new@example.com'])
+        self.assertEqual(
+            sorted((s['email'], s['reason']) for s in data['skipped']),
+            [('invitee@inv.example.com', 'already invited'), ('mixed.case@inv.example.com', 'already a member')],
+        )
+        self.assertEqual([i['email'] for i in data['invalid']], ['nope'])
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_resend_never_reinvites_a_member(self):
+        data = self.invite(['mixed.case@inv.example.com', self.fx.invite.email], resend=True).json()
+        self.assertEqual([i['email'] for i in data['invited']], [self.fx.invite.email])
+        self.assertEqual([s['reason'] for s in data['skipped']], ['already a member'])
+        self.assertNotEqual(InviteToken.objects.get(email=self.fx.invite.email).token, self.fx.invite.token)
+
+    def test_a_mixed_case_expired_invite_is_replaced_not_duplicated(self):
+        stale = InviteToken.objects.create(organization=self.fx.org, invited_by=self.fx.user, email='Old.Hand@Example.com')
+        InviteToken.objects.filter(id=stale.id).update(created_at=timezone.now() - timedelta(days=8))
+        self.assertEqual([i['email'] for i in self.invite(['old.hand@example.com']).json()['invited']],
+                         ['old.hand@example.com'])
+        invite = InviteToken.objects.get(organization=self.fx.org, email__iexact='old.hand@example.com')
+        self.assertEqual((invite.email, invite.status), ('old.hand@example.com', 'pending'))
+        self.assertGreater(invite.created_at, timezone.now() - timedelta(minutes=1))
+
+    def test_seat_limit_applies_to_the_whole_batch(self):
+        Subscription.objects.filter(organization=self.fx.org).update(plan='starter')
+        invalidate_entitlement(self.fx.org.id)
+        seats    = settings.PLAN_LIMITS['starter']['members'] - self.fx.org.usage.members
+        response = self.invite([f'n{i}@example.com' for i in range(seats + 1)])
+        self.assertEqual((response.status_code, response.json()['seats_left']), (403, seats))
+        self.assertFalse(InviteToken.objects.filter(email__startswith='n0@').exists())
+        self.assertEqual(len(self.invite([f'n{i}@example.com' for i in range(seats)]).json()['invited']), seats)
+
+
+# ─────────────────────────────────────────
+# JOB QUEUE
+# ─────────────────────────────────────────
+
+@job_handler('test_echo')
+def echo_job(payload):
+    return payload
+
+
+@job_handler('test_broken', max_attempts=3)
+def broken_job(payload):
+    raise ValueError('bad row')
+
+
+@override_settings(JOBS_EAGER=False)
+class JobQueueTests(TestCase):
+
+    def make_due(self, job):
+        Job.objects.filter(id=job.id).update(run_at=timezone.now() - timedelta(seconds=1))
+
+    def test_claims_by_priority_then_age_and_only_once(self):
+        later  = enqueue('test_echo', {'n': 1})
+        urgent = enqueue('test_echo', {'n': 2}, priority=5)
+        enqueue('test_echo', {'n': 3}, delay=timedelta(hours=1))
+        self.assertEqual(claim_next('w1').id, urgent.id)
+        claimed = claim_next('w1')
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts, claimed.locked_by), (later.id, 'running', 1, 'w1'))
+        self.assertIsNone(claim_next('w1'))  # the delayed job isn't due
+        self.assertIsNone(claim_job(later.id, 'w2'))
+
+    def test_success_stores_the_result(self):
+        job = run_claimed(claim_job(enqueue('test_echo', {'ok': True}).id, 'w1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_by), ('done', {'ok': True}, 'w1'))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failures_back_off_then_fail_after_max_attempts(self):
+        job = enqueue('test_broken')
+        for attempt in (1, 2):
+            self.make_due(job)
+            before = timezone.now()
+            with self.assertLogs('planner.jobs', 'WARNING'):
+                run_claimed(claim_next('w1'))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.locked_by, job.error_summary()),
+                             ('queued', attempt, '', 'ValueError: bad row'))
+            delay = JOB_BACKOFF_BASE * 2 ** (attempt - 1)
+            self.assertTrue(before + timedelta(seconds=delay * 0.8) <= job.run_at
+                            <= timezone.now() + timedelta(seconds=delay * 1.2))
+        self.assertIsNone(claim_next('w1'))  # not due until the backoff passes
+        self.make_due(job)
+        with self.assertLogs('planner.jobs', 'ERROR'):
+            run_claimed(claim_next('w1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_is_capped(self):
+        self.assertLessEqual(backoff(30), timedelta(seconds=JOB_BACKOFF_MAX * 1.2))
+
+    def test_unknown_handler_fails_without_retrying(self):
+        job = Job.objects.create(name='no_such_job')
+        with self.assertLogs('planner.jobs', 'ERROR'):
+            run_claimed(claim_job(job.id, 'w1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.assertIn('No handler registered', job.error_summary())
+
+    def test_stale_jobs_are_requeued_or_failed(self):
+        retryable = claim_job(enqueue('test_echo').id, 'dead')
+        last_try  = claim_job(Job.objects.create(name='test_echo', max_attempts=1).id, 'dead')
+        Job.objects.filter(id__in=[retryable.id, last_try.id]).update(locked_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('planner.jobs', 'ERROR'):
+            self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(id=retryable.id).status, 'queued')
+        self.assertEqual(Job.objects.get(id=last_try.id).status, 'failed')
+
+    def test_a_run_that_lost_its_lock_does_not_overwrite_the_row(self):
+        job = claim_job(enqueue('test_echo', {'n': 1}).id, 'slow')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(hours=1))
+        requeue_stale()
+        rerun = claim_job(job.id, 'fast')
+        with self.assertLogs('planner.jobs', 'WARNING') as logs:
+            run_claimed(job)  # the slow worker finally finishes
+        self.assertIn('lost its lock', logs.output[0])
+        self.assertEqual(Job.objects.get(id=job.id).status, 'running')
+        run_claimed(rerun)
+        self.assertEqual(Job.objects.get(id=job.id).status, 'done')
+
+
+# ─────────────────────────────────────────
+# EMAIL OUTBOX
+# ─────────────────────────────────────────
+
+class DownTransport:
+    """A provider that rejects every batch."""
+
+    def send_batch(self, messages):
+        raise ConnectionError('provider unavailable')
+
+
+@override_settings(JOBS_EAGER=False, EMAIL_TRANSPORT='planner.email_utils.LocMemTransport')
+class EmailOutboxTests(TestCase):
+
+    def setUp(self):
+        LocMemTransport.outbox.clear()
+
+    def test_sends_once_per_dedupe_key_with_one_flush_job(self):
+        send_email('a@example.com', 'Hi', '<p>1</p>', dedupe_key='welcome-a')
+        send_email('a@example.com', 'Hi', '<p>1</p>', dedupe_key='welcome-a')
+        send_emails([{'to': f'{n}@example.com', 'subject': 'Hi', 'html': ''} for n in 'bc'])
+        self.assertEqual(Job.objects.filter(name='flush_outbox', status='queued').count(), 1)
+        self.assertEqual(flush_outbox(), {'sent': 3, 'retry': 0, 'failed': 0})
+        self.assertEqual(sorted(m.to_email for m in LocMemTransport.outbox),
+                         ['a@example.com', 'b@example.com', 'c@example.com'])
+        message = OutboundEmail.objects.get(dedupe_key='welcome-a')
+        self.assertEqual((message.status, message.attempts, message.provider_id),
+                         ('sent', 1, f'locmem-{message.id}'))
+
+    def test_a_backed_off_flush_does_not_hold_up_new_mail(self):
+        enqueue('flush_outbox', delay=timedelta(minutes=5))
+        send_email('a@example.com', 'Verify your email', '')
+        send_email('b@example.com', 'Reset your password', '')
+        due = Job.objects.filter(name='flush_outbox', status='queued', run_at__lte=timezone.now())
+        self.assertEqual(due.count(), 1)
+
+    @override_settings(EMAIL_TRANSPORT='planner.tests.DownTransport')
+    def test_failed_batches_back_off_and_schedule_a_flush(self):
+        message = send_email('a@example.com', 'Hi', '')
+        Job.objects.all().delete()
+        self.assertEqual(flush_outbox(), {'sent': 0, 'retry': 1, 'failed': 0})
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.last_error),
+                         ('queued', 1, 'provider unavailable'))
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        # The follow-up flush waits for the retry rather than spinning
+        follow_up = Job.objects.get(name='flush_outbox', status='queued')
+        self.assertGreater(follow_up.run_at, timezone.now())
+        self.assertEqual(flush_outbox(), {'sent': 0, 'retry': 0, 'failed': 0})
+
+    @override_settings(EMAIL_TRANSPORT='planner.tests.DownTransport')
+    def test_gives_up_after_max_attempts(self):
+        message = send_email('a@example.com', 'Hi', '')
+        OutboundEmail.objects.filter(id=message.id).update(attempts=OUTBOX_MAX_ATTEMPTS - 1)
+        self.assertEqual(flush_outbox(), {'sent': 0, 'retry': 0, 'failed': 1})
+        self.assertEqual(OutboundEmail.objects.get(id=message.id).status, 'failed')
+
+    def test_messages_claimed_by_a_dead_sender_are_sent(self):
+        message = send_email('a@example.com', 'Hi', '')
+        OutboundEmail.objects.filter(id=message.id).update(
+            status='sending', claimed_at=timezone.now() - OUTBOX_CLAIM_TIMEOUT - timedelta(seconds=1)
+        )
+        self.assertEqual(flush_outbox()['sent'], 1)
+
+
+# ─────────────────────────────────────────
+# USAGE COUNTERS
+# ─────────────────────────────────────────
+
+class UsageCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx = seed_org('usage', 2, 4)
+
+    def setUp(self):
+        cache.clear()
+
+    def usage(self):
+        return OrgUsage.objects.get(organization=self.fx.org)
+
+    def test_track_applies_deltas(self):
+        track(self.fx.org.id, members=2, teams=-1)
+        self.assertEqual((self.usage().members, self.usage().teams), (3 + 2, 1 - 1))
+        with self.assertRaises(ValueError):
+            track(self.fx.org.id, seats=1)
+
+    def test_first_track_starts_from_the_live_counts(self):
+        OrgUsage.objects.filter(organization=self.fx.org).delete()
+        Team.objects.create(organization=self.fx.org, name='Second', created_by=self.fx.user)
+        track(self.fx.org.id, teams=1)  # the live count already includes the new team
+        self.assertEqual(self.usage().teams, 2)
+
+    def test_sprints_count_in_the_month_they_were_created(self):
+        last_month = timezone.now().replace(day=1) - timedelta(days=1)
+        UsageMonth.objects.filter(organization=self.fx.org).delete()
+        track(self.fx.org.id, sprints=1)
+        backdated = Sprint.objects.create(organization=self.fx.org, name='S0')
+        Sprint.objects.filter(id=backdated.id).update(created_at=last_month)
+        track(self.fx.org.id, when=last_month, sprints=1)
+        months = dict(UsageMonth.objects.filter(organization=self.fx.org).values_list('month', 'sprints'))
+        # New rows start from the live counts, which already include the tracked sprint
+        self.assertEqual(months, {month_start(): 2, month_start(last_month): 1})
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        OrgUsage.objects.filter(organization=self.fx.org).update(members=99)
+        UsageMonth.objects.filter(organization=self.fx.org).update(sprints=0)
+        _, drift = reconcile_org(self.fx.org.id, fix=False)
+        self.assertEqual(drift, {'members': (99, 3), 'sprints': (0, 2)})
+        self.assertEqual(self.usage().members, 99)
+        reconcile_org(self.fx.org.id)
+        self.assertEqual(self.usage().members, 3)
+        self.assertEqual(reconcile_org(self.fx.org.id)[1], {})
+
+    def test_team_limit_follows_the_plan(self):
+        self.assertIsNone(check_team_limit(self.fx.org))  # business: unlimited
+        Subscription.objects.filter(organization=self.fx.org).update(plan='starter')
+        invalidate_entitlement(self.fx.org.id)
+        self.assertEqual(check_team_limit(self.fx.org), 1)
+        Subscription.objects.filter(organization=self.fx.org).delete()
+        invalidate_entitlement(self.fx.org.id)
+        self.assertEqual(check_team_limit(self.fx.org), settings.PLAN_LIMITS['starter']['teams'])
+
+    def test_add_and_delete_team_keep_the_counter(self):
+        self.client.force_login(self.fx.user)
+        response = self.client.post('/admin/teams/add/', json.dumps({'name': 'Second'}), content_type='application/json')
+        self.assertEqual((response.status_code, self.usage().teams), (200, 2))
+        self.client.post(f"/admin/teams/{response.json()['id']}/delete/")
+        self.assertEqual(self.usage().teams, 1)
+
+
+# ─────────────────────────────────────────
+# AI METERING
+# ─────────────────────────────────────────
+
+class MeteringTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx    = seed_org('meter', 1, 4)
+        cls.limit = settings.PLAN_LIMITS['business']['ai_calls_per_month']
+
+    def setUp(self):
+        cache.clear()
+
+    def month(self):
+        return UsageMonth.objects.get(organization=self.fx.org, month=month_start())
+
+    def test_reservations_count_against_the_limit(self):
+        held = reserve(self.fx.org, self.limit - 1)
+        self.assertEqual(ai_calls_remaining(self.fx.org), 1)
+        with self.assertRaises(QuotaExceeded):
+            reserve(self.fx.org, 2)
+        last = reserve(self.fx.org, 1)
+        self.assertEqual(ai_calls_remaining(self.fx.org), 0)
+        release(last)
+        commit(held, used=3)
+        self.assertEqual((self.month().ai_calls, self.month().ai_reserved), (3, 0))
+        self.assertEqual(ai_calls_remaining(self.fx.org), self.limit - 3)
+
+    def test_only_the_first_settle_counts(self):
+        entry = reserve(self.fx.org, 4)
+        self.assertTrue(commit(entry))
+        self.assertFalse(commit(entry))
+        self.assertFalse(release(entry))
+        self.assertEqual((self.month().ai_calls, self.month().ai_reserved), (4, 0))
+        self.assertEqual(AIUsageEntry.objects.get(id=entry.id).status, 'committed')
+
+    def test_metered_releases_when_the_block_raises(self):
+        with self.assertRaises(RuntimeError):
+            with metered(self.fx.org, 2, feature='test'):
+                raise RuntimeError('AI call failed')
+        with metered(self.fx.org, 5, feature='test') as entry:
+            entry.used = 1
+        self.assertEqual((self.month().ai_calls, self.month().ai_reserved), (1, 0))
+
+    def test_plans_without_ai_and_stale_reservations(self):
+        entry = reserve(self.fx.org, 2)
+        AIUsageEntry.objects.filter(id=entry.id).update(created_at=timezone.now() - RESERVATION_TTL * 2)
+        self.assertEqual(release_stale(), 1)
+        self.assertEqual(self.month().ai_reserved, 0)
+        Subscription.objects.filter(organization=self.fx.org).update(plan='pro')
+        invalidate_entitlement(self.fx.org.id)
+        with self.assertRaises(QuotaExceeded):
+            reserve(self.fx.org)
+
+
+# ─────────────────────────────────────────
+# PERFORMANCE MIDDLEWARE
+# ─────────────────────────────────────────
+
+class PerformanceMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fx = seed_org('perf', 3, 4)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.fx.user)
+
+    @override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True, PERF_SLOW_MS=0)
+    def test_timings_and_slow_log(self):
+        log = QueryLog()
+        with self.assertLogs('planner.perf', 'WARNING') as logs, connection.execute_wrapper(log):
+            response = self.client.get('/sm/panel/')
+        self.assertEqual(response.status_code, 200)
+
+        timing = dict(re.findall(r'(\w+);dur=[\d.]+;desc="([^"]*)"', response['Server-Timing']))
+        self.assertEqual(timing['sql'], f'{len(log.queries)} queries')
+        self.assertEqual(timing['total'], 'sm_panel')
+        perf = logs.records[0].perf
+        self.assertEqual((perf['url_name'], perf['sql_count']), ('sm_panel', len(log.queries)))
+        self.assertGreater(perf['template_ms'], 0)
+
+    @override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True, PERF_SLOW_MS=0)
+    def test_streamed_responses_are_timed_until_the_body_ends(self):
+        log = QueryLog()
+        with connection.execute_wrapper(log):
+            response = self.client.get(f'/sm/sprints/{self.fx.sprint.id}/export/?format=csv')
+            self.assertTrue(response.streaming)
+            timing = dict(re.findall(r'(\w+);dur=[\d.]+;desc="([^"]*)"', response['Server-Timing']))
+            self.assertEqual((timing['headers'], 'total' in timing), ('export_sprint (streamed)', False))
+            with self.assertLogs('planner.perf', 'WARNING') as logs:
+                b''.join(response.streaming_content)
+        perf = logs.records[0].perf
+        self.assertEqual((perf['streamed'], perf['sql_count']), (True, len(log.queries)))
+        self.assertGreater(perf['sql_count'], int(timing['sql'].split()[0]))
+
+    @override_settings(PERF_SAMPLE_RATE=1, PERF_SERVER_TIMING=True, PERF_SLOW_MS=1e9,
+                       MIDDLEWARE=[m for m in settings.MIDDLEWARE if 'whitenoise' not in m])
+    def test_async_requests_are_timed_like_sync_ones(self):
+        async def view(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(PerformanceMiddleware(view)))
+
+        timing = lambda response: dict(re.findall(r'(\w+);dur=[\d.]+;desc="([^"]*)"', response['Server-Timing']))
+        self.async_client.force_login(self.fx.user)
+        via_asgi = timing(async_to_sync(self.async_client.get)('/sm/panel/'))
+        cache.clear()
+        via_wsgi = timing(self.client.get('/sm/panel/'))
+        self.assertEqual(via_asgi, via_wsgi)
+        self.assertNotEqual(via_asgi['sql'], '0 queries')
+
+    @override_settings(PERF_SAMPLE_RATE=0, PERF_SERVER_TIMING=True)
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get('/sm/panel/'))
+
+    def test_duplicates_ranked_by_count(self):
+        timings = RequestTimings()
+        for sql in ['SELECT a', 'SELECT b', 'SELECT b', 'SELECT c', 'SELECT c', 'SELECT c']:
+            timings(lambda *args: None, sql, (), False, {})
+        self.assertEqual([(n, sql) for n, _, sql in timings.duplicates()], [(3, 'SELECT c'), (2, 'SELECT b')])
@@ -51,12 +51,15 @@ urlpatterns = [
     path('invite/<uuid:token>/', invite_views.accept_invite, name='accept_invite'),
     path('sm/invites/', invite_views.list_invites, name='list_invites'),
     path('sm/invites/send/', invite_views.send_invite, name='send_invite'),
+    path('sm/invites/bulk/', invite_views.bulk_invite, name='bulk_invite'),
     path('sm/invites/<int:invite_id>/cancel/', invite_views.cancel_invite, name='cancel_invite'),
 
     # ── App ──
     path('board/', views.board, name='board'),
+    path('api/board/stories/', views.board_stories, name='board_stories'),
     path('vote/<int:us_id>/', views.vote_room, name='vote_room'),
     path('vote/<int:us_id>/status/', views.vote_status, name='vote_status'),
+    path('vote/<int:us_id>/stream/', views.vote_stream, name='vote_stream'),
     path('vote/<int:us_id>/submit/', views.submit_vote, name='submit_vote'),
 
     # ── SM ──
@@ -70,13 +73,19 @@ urlpatterns = [
     path('sm/sprints/<int:sprint_id>/edit/', views.edit_sprint, name='edit_sprint'),
     path('sm/sprints/<int:sprint_id>/delete/', views.delete_sprint, name='delete_sprint'),
     path('sm/sprints/<int:sprint_id>/export/', views.export_sprint, name='export_sprint'),
+    path('sm/sprints/export/', views.export_sprints, name='export_sprints'),
     path('sm/sprints/<int:sprint_id>/import/', views.import_stories, name='import_stories'),
+    path('sm/imports/<int:job_id>/', views.import_status, name='import_status'),
     path('sm/stories/add/', views.add_story, name='add_story'),
+    path('sm/stories/reorder/', views.reorder_stories, name='reorder_stories'),
     path('sm/stories/<int:us_id>/edit/', views.edit_story, name='edit_story'),
     path('sm/stories/<int:us_id>/delete/', views.delete_story, name='delete_story'),
     path('sm/stories/<int:us_id>/trigger-voting/', views.trigger_voting, name='trigger_voting'),
     path('sm/stories/<int:us_id>/close-voting/', views.close_voting, name='close_voting'),
     path('sm/stories/<int:us_id>/assign-sp/', views.assign_sp, name='assign_sp'),
     path('sm/stories/<int:us_id>/edit-stream-assignment/', views.edit_stream_assignment, name='edit_stream_assignment'),
+    path('sm/<str:kind>/bulk-status/', views.bulk_status, name='bulk_status'),
     path('api/stories/<int:us_id>/', views.get_story_detail, name='story_detail'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('api/usage/', admin_views.usage_summary, name='usage_summary'),
 ]
@@ -0,0 +1,135 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AIUsageEntry, OrganizationMember, OrgUsage, Sprint, Team, UsageMonth
+
+TOTAL_COUNTERS   = ('members', 'teams')
+MONTHLY_COUNTERS = ('sprints',)  # AI calls go through planner.metering
+
+
+def month_start(when=None):
+    """First day of the (UTC) calendar month `when` falls in."""
+    return (when or timezone.now()).astimezone(dt_timezone.utc).date().replace(day=1)
+
+
+# ─────────────────────────────────────────
+# LIVE COUNTS (reconciliation only)
+# ─────────────────────────────────────────
+
+def count_totals(org_id):
+    return {
+        'members': OrganizationMember.objects.filter(organization_id=org_id).count(),
+        'teams':   Team.objects.filter(organization_id=org_id).count(),
+    }
+
+
+def count_sprints(org_id, month):
+    start = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    end   = datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+    return Sprint.objects.filter(organization_id=org_id, created_at__gte=start, created_at__lt=end).count()
+
+
+# ─────────────────────────────────────────
+# COUNTERS
+# ─────────────────────────────────────────
+
+def track(org_id, when=None, **deltas):
+    """
+    Apply counter deltas, e.g. track(org.id, members=1). Call it in the same
+    transaction as the change it counts, after the change is written.
+    """
+    totals  = {k: F(k) + v for k, v in deltas.items() if k in TOTAL_COUNTERS and v}
+    monthly = {k: F(k) + v for k, v in deltas.items() if k in MONTHLY_COUNTERS and v}
+    unknown = set(deltas) - set(TOTAL_COUNTERS) - set(MONTHLY_COUNTERS)
+    if unknown:
+        raise ValueError(f'Unknown usage counter(s): {", ".join(sorted(unknown))}')
+
+    if totals and not OrgUsage.objects.filter(organization_id=org_id).update(**totals):
+        # First change since the counters existed: start from the live counts, which include this one
+        _create_or_update(OrgUsage, {'organization_id': org_id}, count_totals(org_id), totals)
+
+    if monthly:
+        month = month_start(when)
+        if not UsageMonth.objects.filter(organization_id=org_id, month=month).update(**monthly):
+            initial = {'sprints': count_sprints(org_id, month)}
+            _create_or_update(UsageMonth, {'organization_id': org_id, 'month': month}, initial, monthly)
+
+
+def _create_or_update(model, key, initial, increments):
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **initial)
+    except IntegrityError:
+        # Someone else created it meanwhile — apply ours on top of theirs
+        if increments:
+            model.objects.filter(**key).update(**increments)
+
+
+def ensure_month(org_id, month):
+    """Create the month's row if it is missing. True unless it already existed."""
+    if UsageMonth.objects.filter(organization_id=org_id, month=month).exists():
+        return False
+    _create_or_update(UsageMonth, {'organization_id': org_id, 'month': month},
+                      {'sprints': count_sprints(org_id, month)}, None)
+    return True
+
+
+def get_usage(org):
+    """The org's running totals — one row read."""
+    try:
+        return OrgUsage.objects.get(organization_id=org.id)
+    except OrgUsage.DoesNotExist:
+        return reconcile_org(org.id)[0]
+
+
+def get_month(org, when=None):
+    """This month's usage row, unsaved and zeroed when nothing happened yet."""
+    month = month_start(when)
+    return (
+        UsageMonth.objects.filter(organization_id=org.id, month=month).first()
+        or UsageMonth(organization_id=org.id, month=month)
+    )
+
+
+# ─────────────────────────────────────────
+# RECONCILIATION
+# ─────────────────────────────────────────
+
+def reconcile_org(org_id, fix=True):
+    """
+    Recount an org's totals, this month's sprints and open AI reservations from the tables.
+    Returns (usage, drift) where drift maps counter -> (stored, actual).
+    """
+    actual = count_totals(org_id)
+    month  = month_start()
+    drift  = {}
+    with transaction.atomic():
+        usage = OrgUsage.objects.select_for_update().filter(organization_id=org_id).first()
+        if usage is None:
+            usage = OrgUsage(organization_id=org_id)
+            drift = {k: (None, v) for k, v in actual.items()}
+        else:
+            drift = {k: (getattr(usage, k), v) for k, v in actual.items() if getattr(usage, k) != v}
+        if fix and (drift or usage._state.adding):
+            for k, v in actual.items():
+                setattr(usage, k, v)
+            usage.save()
+
+        month_actual = {
+            'sprints':     count_sprints(org_id, month),
+            'ai_reserved': AIUsageEntry.objects.filter(
+                organization_id=org_id, month=month, status='reserved'
+            ).aggregate(n=Coalesce(Sum('reserved'), 0))['n'],
+        }
+        row = UsageMonth.objects.select_for_update().filter(organization_id=org_id, month=month).first()
+        for k, v in month_actual.items():
+            stored = getattr(row, k) if row else 0
+            if stored != v:
+                drift[k] = (stored, v)
+        if fix and any(k in drift for k in month_actual):
+            UsageMonth.objects.update_or_create(organization_id=org_id, month=month, defaults=month_actual)
+    return usage, drift
@@ -1,20 +1,50 @@
+import asyncio
+import base64
 import json
+import tempfile
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Case, FloatField, Prefetch, Q, Value, When
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.urls import reverse
+from django.http import (
+    FileResponse, JsonResponse, HttpResponse, HttpResponseNotModified, Http404, StreamingHttpResponse
+)
+from django.utils.http import parse_etags
 from django.views.decorators.http import require_POST
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from .models import (
     Organization, OrganizationMember, Stream,
-    Sprint, SprintMember, UserStory, Vote, StreamAssignment
+    Sprint, SprintMember, UserStory, Vote, VoteAggregate, StreamAssignment, StateVersion,
+    Task, Bug, ImportJob, Job
 )
 from .permissions import (
-    require_org_member, require_scrum_master, require_admin,
+    require_org_member, require_org_member_api, require_scrum_master, require_admin,
     require_voter, require_scrum_master_api, require_admin_api,
-    require_voter_api, is_scrum_master_or_above
+    require_voter_api, get_active_membership, get_active_sprint_member,
+    bump_membership_version
+)
+from .realtime import broker
+from .usage import track
+from .exporter import SprintExport, write_xlsx, iter_csv, iter_ndjson, EXPORT_FORMATS, EXPORT_SHEETS
+from .importer import (
+    StoryImport, StoryImportError, read_rows, start_import_job, IMPORT_FORMATS, IMPORT_INLINE_BYTES
 )
 
-BANDWIDTH_LIMIT = 8
+BOARD_PAGE_SIZE       = 50
+BOARD_PAGE_MAX        = 200
+VOTE_STREAM_HEARTBEAT = 20  # seconds between SSE keepalive comments
+VOTE_POLL_MAX_WAIT    = 25  # longest ?wait= a long-poll may hold the request
+VOTE_POLL_RECHECK     = 2   # seconds between version checks while long-polling
+BULK_STATUS_LIMIT     = 500
+BULK_STATUS_MODELS    = {'stories': UserStory, 'tasks': Task, 'bugs': Bug}
+REORDER_MAX_MOVES     = 200
+EXPORT_SPOOL_BYTES    = 8 * 1024 * 1024  # xlsx exports beyond this spill to a temp file
 
 
 # ─────────────────────────────────────────
@@ -33,22 +63,13 @@ def get_voting_scale(org):
 def get_org(request):
     """Get active org for current user.
     If user belongs to multiple orgs, respects session selection."""
-    active_org_id = request.session.get('active_org_id')
-    if active_org_id:
-        membership = OrganizationMember.objects.select_related('organization').filter(
-            user=request.user, organization_id=active_org_id
-        ).first()
-        if membership:
-            return membership.organization
-
-    # Default — first org
-    membership = OrganizationMember.objects.select_related('organization').filter(
-        user=request.user
-    ).first()
+    membership = get_active_membership(request)
     return membership.organization if membership else None
 
 
 def get_member(request, org):
+    if org and get_org(request) == org:
+        return get_active_sprint_member(request)
     try:
         return SprintMember.objects.get(user=request.user, organization=org, is_active=True)
     except SprintMember.DoesNotExist:
@@ -80,40 +101,88 @@ def refund_policy(request):
 # BOARD
 # ─────────────────────────────────────────
 
+def encode_story_cursor(story):
+    raw = f'{story.order}|{story.created_at.isoformat()}|{story.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_story_cursor(cursor):
+    """Returns (order, created_at, id). Raises ValueError on a malformed cursor."""
+    try:
+        order, created_at, story_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return int(order), created_at, int(story_id)
+
+
+def board_stories_page(org, cursor=None, sprint=None, owner_id=None, status=None, limit=BOARD_PAGE_SIZE):
+    """
+    One keyset page of board stories ordered by (order, created_at, id).
+    Returns (stories, next_cursor); next_cursor is None on the last page.
+    """
+    stories = UserStory.objects.filter(organization=org).select_related(
+        'owner__user', 'sprint'
+    ).prefetch_related(
+        Prefetch('stream_assignments', queryset=StreamAssignment.objects.select_related(
+            'stream', 'member__user'
+        ))
+    ).order_by('order', 'created_at', 'id')
+
+    if sprint:
+        stories = stories.filter(sprint=sprint)
+    if owner_id:
+        stories = stories.filter(owner_id=owner_id)
+    if status:
+        stories = stories.filter(status=status)
+    if cursor:
+        order, created_at, story_id = decode_story_cursor(cursor)
+        stories = stories.filter(
+            Q(order__gt=order) |
+            Q(order=order, created_at__gt=created_at) |
+            Q(order=order, created_at=created_at, id__gt=story_id)
+        )
+
+    page = list(stories[:limit + 1])
+    if len(page) > limit:
+        return page[:limit], encode_story_cursor(page[limit - 1])
+    return page, None
+
+
 @require_org_member
 def board(request):
     org           = get_org(request)
-    user_is_sm    = is_scrum_master_or_above(request.user, org)
+    user_is_sm    = get_active_membership(request).is_scrum_master()
     member        = get_member(request, org)
-    sprints       = Sprint.objects.filter(organization=org)
-    active_sprint = sprints.filter(is_active=True).first()
+    sprints       = list(Sprint.objects.filter(organization=org).with_summary())
+    active_sprint = next((s for s in sprints if s.is_active), None)
     streams       = Stream.objects.filter(organization=org)
 
     sprint_id       = request.GET.get('sprint')
     selected_sprint = None
     if sprint_id:
-        selected_sprint = get_object_or_404(Sprint, id=sprint_id, organization=org)
+        selected_sprint = next((s for s in sprints if str(s.id) == sprint_id), None)
+        if not selected_sprint:
+            raise Http404
     elif active_sprint:
         selected_sprint = active_sprint
 
-    stories = UserStory.objects.filter(organization=org).prefetch_related(
-        'votes', 'stream_assignments', 'stream_assignments__member'
-    ).select_related('owner', 'sprint')
-
-    if selected_sprint:
-        stories = stories.filter(sprint=selected_sprint)
+    stories, next_cursor = board_stories_page(org, sprint=selected_sprint)
 
-    all_members = SprintMember.objects.filter(
+    all_members = list(SprintMember.objects.filter(
         organization=org, is_active=True
-    ).select_related('user', 'stream')
+    ).select_related('user', 'stream').with_bandwidth(selected_sprint))
 
-    bandwidth = []
-    for m in all_members:
-        total = m.total_sp(sprint=selected_sprint)
-        bandwidth.append({'member': m, 'total': total, 'over': total > BANDWIDTH_LIMIT})
+    bandwidth = [
+        {'member': m, 'total': m.bandwidth, 'over': m.over_bandwidth}
+        for m in all_members
+    ]
 
     return render(request, 'planner/board.html', {
         'stories':         stories,
+        'next_cursor':     next_cursor,
         'member':          member,
         'is_sm':           user_is_sm,
         'bandwidth':       bandwidth,
@@ -126,6 +195,47 @@ def board(request):
     })
 
 
+@require_org_member_api
+def board_stories(request):
+    """Next page of board stories for infinite scroll. Filters: sprint, owner, status."""
+    org    = get_org(request)
+    sprint = None
+    try:
+        if request.GET.get('sprint'):
+            sprint = get_object_or_404(Sprint, id=int(request.GET['sprint']), organization=org)
+        stories, next_cursor = board_stories_page(
+            org,
+            cursor=request.GET.get('cursor'),
+            sprint=sprint,
+            owner_id=request.GET.get('owner') or None,
+            status=request.GET.get('status') or None,
+            limit=min(max(int(request.GET.get('limit', BOARD_PAGE_SIZE)), 1), BOARD_PAGE_MAX),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    is_sm = get_active_membership(request).is_scrum_master()
+    return JsonResponse({
+        'stories': [
+            {
+                'id':            s.id,
+                'title':         s.title,
+                'status':        s.status,
+                'voting_status': s.voting_status,
+                'final_sp':      s.final_sp,
+                'owner_id':      s.owner_id,
+                'sprint_id':     s.sprint_id,
+            }
+            for s in stories
+        ],
+        'html': ''.join(
+            render_to_string('planner/board_story_card.html', {'story': s, 'is_sm': is_sm})
+            for s in stories
+        ),
+        'next_cursor': next_cursor,
+    })
+
+
 # ─────────────────────────────────────────
 # VOTE ROOM
 # ─────────────────────────────────────────
@@ -134,7 +244,7 @@ def board(request):
 def vote_room(request, us_id):
     org        = get_org(request)
     story      = get_object_or_404(UserStory, id=us_id, organization=org)
-    user_is_sm = is_scrum_master_or_above(request.user, org)
+    user_is_sm = get_active_membership(request).is_scrum_master()
     member     = get_member(request, org)
     streams    = Stream.objects.filter(organization=org)
     all_members = SprintMember.objects.filter(
@@ -157,14 +267,15 @@ def vote_room(request, us_id):
         'my_vote':     my_vote,
         'all_members': all_members,
         'streams':     streams,
+        'poll_wait':   VOTE_POLL_MAX_WAIT,
     })
 
 
-def vote_status(request, us_id):
-    story       = get_object_or_404(UserStory, id=us_id)
-    all_members = SprintMember.objects.filter(
-        organization=story.organization, is_active=True
-    ).select_related('user')
+def build_vote_state(story):
+    """Snapshot of a vote room — shared by the poll endpoint and the push stream."""
+    all_members = list(SprintMember.objects.filter(
+        organization_id=story.organization_id, is_active=True
+    ).select_related('user', 'stream'))
     votes = {v.member_id: v.points for v in story.votes.all()}
 
     members_status = []
@@ -179,27 +290,166 @@ def vote_status(request, us_id):
 
     stream_averages = []
     if story.voting_status == 'closed' and votes:
-        from collections import defaultdict
-        stream_votes = defaultdict(list)
-        for m in all_members:
-            if m.id in votes and m.stream:
-                stream_votes[m.stream.name].append(votes[m.id])
-        for stream, points in sorted(stream_votes.items()):
+        aggregates = story.vote_aggregates.filter(
+            stream__isnull=False
+        ).select_related('stream').order_by('stream__name')
+        for agg in aggregates:
             stream_averages.append({
-                'stream':  stream,
-                'average': round(sum(points) / len(points), 1),
-                'votes':   len(points),
+                'stream':  agg.stream.name,
+                'average': agg.average(),
+                'votes':   agg.count,
             })
 
-    return JsonResponse({
+    return {
         'status':          story.voting_status,
         'members':         members_status,
         'average':         story.vote_average,
         'final_sp':        story.final_sp,
-        'total_members':   all_members.count(),
+        'total_members':   len(all_members),
         'voted_count':     len(votes),
         'stream_averages': stream_averages,
-    })
+    }
+
+
+def vote_state_changed(story):
+    """Bump the room version and push the new state once the write has committed."""
+    StateVersion.bump(StateVersion.story_key(story.id))
+    if broker.has_subscribers(story.id):
+        transaction.on_commit(lambda: broker.publish(story.id, build_vote_state(story)))
+
+
+def members_changed(org):
+    """Sprint members are part of every room's state — bump the org-wide version."""
+    StateVersion.bump(StateVersion.org_members_key(org.id))
+    bump_membership_version(org.id)
+    # Again on commit: a request that read the old rows meanwhile may have re-cached them
+    transaction.on_commit(lambda: bump_membership_version(org.id))
+
+
+_story_orgs = {}  # story id -> org id; a story never changes organization
+
+
+def _story_org_id(us_id):
+    org_id = _story_orgs.get(us_id)
+    if org_id is None:
+        org_id = UserStory.objects.filter(id=us_id).values_list('organization_id', flat=True).first()
+        if org_id is None:
+            return None
+        if len(_story_orgs) > 10000:
+            _story_orgs.clear()
+        _story_orgs[us_id] = org_id
+    return org_id
+
+
+def _vote_state_etag(us_id):
+    org_id = _story_org_id(us_id)
+    if org_id is None:
+        return None
+    story_v, members_v = StateVersion.get_many([
+        StateVersion.story_key(us_id), StateVersion.org_members_key(org_id),
+    ])
+    return f'"{us_id}.{story_v}.{members_v}"'
+
+
+async def _wait_for_vote_change(us_id, etag, wait):
+    """Hold until the room version moves or `wait` seconds pass. Returns the latest ETag."""
+    loop     = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    queue    = broker.subscribe(us_id)
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return etag
+            try:
+                # Woken instantly by writes in this process; rechecks cover other processes
+                await asyncio.wait_for(queue.get(), timeout=min(remaining, VOTE_POLL_RECHECK))
+            except asyncio.TimeoutError:
+                pass
+            latest = await sync_to_async(_vote_state_etag)(us_id)
+            if latest != etag:
+                return latest
+    finally:
+        broker.unsubscribe(us_id, queue)
+
+
+async def vote_status(request, us_id):
+    """
+    Polling fallback for clients without a live stream.
+    Answers 304 to a matching If-None-Match; with ?wait=<seconds> it long-polls
+    until the room version moves.
+    """
+    org_id = await sync_to_async(_story_org_id)(us_id)
+    if org_id is None:
+        raise Http404
+    # Served from the membership cache — no queries on the hot path
+    membership = await sync_to_async(get_active_membership)(request)
+    if not membership or membership.organization_id != org_id:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    etag = await sync_to_async(_vote_state_etag)(us_id)
+    if etag is None:
+        raise Http404
+
+    client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+    try:
+        wait = min(max(int(request.GET.get('wait', 0)), 0), VOTE_POLL_MAX_WAIT)
+    except ValueError:
+        wait = 0
+    if wait and etag in client_etags:
+        etag = await _wait_for_vote_change(us_id, etag, wait)
+        if etag is None:
+            raise Http404
+
+    if etag in client_etags:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    story = await UserStory.objects.filter(id=us_id).afirst()
+    if not story:
+        raise Http404
+    response = JsonResponse(await sync_to_async(build_vote_state)(story))
+    response['ETag'] = etag
+    return response
+
+
+async def vote_stream(request, us_id):
+    """Server-Sent Events feed of vote room state. Only served under ASGI."""
+    if not isinstance(request, ASGIRequest):
+        # 204 tells EventSource not to reconnect — the page falls back to polling
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    story = await UserStory.objects.filter(id=us_id).afirst()
+    if not story:
+        raise Http404
+    if not await OrganizationMember.objects.filter(
+        user=user, organization_id=story.organization_id
+    ).aexists():
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    async def events():
+        queue = broker.subscribe(story.id)
+        try:
+            state = await sync_to_async(build_vote_state)(story)
+            yield f'data: {json.dumps(state)}\n\n'
+            while True:
+                try:
+                    state = await asyncio.wait_for(queue.get(), timeout=VOTE_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {json.dumps(state)}\n\n'
+        finally:
+            broker.unsubscribe(story.id, queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control']     = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @require_POST
@@ -216,14 +466,12 @@ def submit_vote(request, us_id):
 
     data   = json.loads(request.body)
     points = int(data.get('points'))
-    org    = get_org(request)
     scale  = get_voting_scale(org)
     if points not in scale:
         return JsonResponse({'error': 'Invalid points'}, status=400)
 
-    Vote.objects.update_or_create(
-        user_story=story, member=member, defaults={'points': points}
-    )
+    Vote.record(story, member, points)
+    vote_state_changed(story)
     return JsonResponse({'ok': True})
 
 
@@ -234,26 +482,25 @@ def submit_vote(request, us_id):
 @require_scrum_master
 def sm_panel(request):
     org           = get_org(request)
-    active_sprint = Sprint.objects.filter(organization=org, is_active=True).first()
-    all_members   = SprintMember.objects.filter(
+    sprints       = list(Sprint.objects.filter(organization=org).with_summary())
+    active_sprint = next((s for s in sprints if s.is_active), None)
+    all_members   = list(SprintMember.objects.filter(
         organization=org, is_active=True
-    ).select_related('user', 'stream')
+    ).select_related('user', 'stream').with_bandwidth(active_sprint))
     streams       = Stream.objects.filter(organization=org)
 
-    bandwidth = []
-    for m in all_members:
-        total = m.total_sp(sprint=active_sprint)
-        bandwidth.append({'member': m, 'total': total, 'over': total > BANDWIDTH_LIMIT})
+    bandwidth = [
+        {'member': m, 'total': m.bandwidth, 'over': m.over_bandwidth}
+        for m in all_members
+    ]
 
     return render(request, 'planner/sm_panel.html', {
         'members':       all_members,
-        'stories':       UserStory.objects.filter(organization=org).select_related(
-                             'owner', 'sprint'
-                         ).prefetch_related('stream_assignments__member'),
+        'stories':       UserStory.objects.filter(organization=org).select_related('owner__user', 'sprint'),
         'streams':       streams,
         'all_members':   all_members,
         'bandwidth':     bandwidth,
-        'sprints':       Sprint.objects.filter(organization=org),
+        'sprints':       sprints,
         'active_sprint': active_sprint,
         'org':           org,
         'subscription':  getattr(org, 'subscription', None),
@@ -278,8 +525,7 @@ def add_member(request):
         return JsonResponse({'error': 'Invalid role'}, status=400)
 
     # Only admins can assign admin role
-    from .permissions import is_admin
-    if role == 'admin' and not is_admin(request.user, org):
+    if role == 'admin' and not get_active_membership(request).is_admin():
         return JsonResponse({'error': 'Only admins can assign admin role'}, status=403)
 
     try:
@@ -291,21 +537,25 @@ def add_member(request):
     if stream_id:
         stream = get_object_or_404(Stream, id=stream_id, organization=org)
 
-    # Add or update OrganizationMember
-    org_member, _ = OrganizationMember.objects.update_or_create(
-        organization=org, user=user,
-        defaults={'role': role}
-    )
-
-    # Add or update SprintMember
-    member, created = SprintMember.objects.get_or_create(
-        organization=org, user=user,
-        defaults={'stream': stream, 'is_active': True}
-    )
-    if not created:
-        member.stream    = stream
-        member.is_active = True
-        member.save()
+    with transaction.atomic():
+        # Add or update OrganizationMember
+        org_member, joined = OrganizationMember.objects.update_or_create(
+            organization=org, user=user,
+            defaults={'role': role}
+        )
+        if joined:
+            track(org.id, members=1)
+
+        # Add or update SprintMember
+        member, created = SprintMember.objects.get_or_create(
+            organization=org, user=user,
+            defaults={'stream': stream, 'is_active': True}
+        )
+        if not created:
+            member.stream    = stream
+            member.is_active = True
+            member.save()
+    members_changed(org)
 
     return JsonResponse({
         'ok':   True,
@@ -322,7 +572,6 @@ def remove_member(request, member_id):
     member = get_object_or_404(SprintMember, id=member_id, organization=org)
 
     # Prevent removing the last admin
-    from .permissions import is_admin
     target_org_member = OrganizationMember.objects.filter(
         organization=org, user=member.user
     ).first()
@@ -338,6 +587,7 @@ def remove_member(request, member_id):
 
     member.is_active = False
     member.save()
+    members_changed(org)
     return JsonResponse({'ok': True})
 
 
@@ -345,7 +595,6 @@ def remove_member(request, member_id):
 @require_scrum_master_api
 def change_member_role(request, member_id):
     """Change a member's role. Only admins can assign/remove admin role."""
-    from .permissions import is_admin
     org    = get_org(request)
     member = get_object_or_404(SprintMember, id=member_id, organization=org)
     data   = json.loads(request.body)
@@ -358,7 +607,7 @@ def change_member_role(request, member_id):
     target_org_member = get_object_or_404(
         OrganizationMember, organization=org, user=member.user
     )
-    if (role == 'admin' or target_org_member.role == 'admin') and not is_admin(request.user, org):
+    if (role == 'admin' or target_org_member.role == 'admin') and not get_active_membership(request).is_admin():
         return JsonResponse({'error': 'Only admins can change admin role'}, status=403)
 
     # Prevent removing last admin
@@ -374,6 +623,7 @@ def change_member_role(request, member_id):
 
     target_org_member.role = role
     target_org_member.save()
+    bump_membership_version(org.id)
     return JsonResponse({'ok': True, 'role': role})
 
 
@@ -398,7 +648,10 @@ def add_stream(request):
 def delete_stream(request, stream_id):
     org    = get_org(request)
     stream = get_object_or_404(Stream, id=stream_id, organization=org)
-    stream.delete()
+    with transaction.atomic():
+        stream.delete()
+        # Cached sprint members still point at the stream, and rooms break votes down by it
+        members_changed(org)
     return JsonResponse({'ok': True})
 
 
@@ -414,16 +667,18 @@ def add_sprint(request):
     name = data.get('name', '').strip()
     if not name:
         return JsonResponse({'error': 'Sprint name required'}, status=400)
-    sprint = Sprint.objects.create(
-        organization=org,
-        name=name,
-        goal=data.get('goal', ''),
-        start_date=data.get('start_date') or None,
-        end_date=data.get('end_date') or None,
-        is_active=data.get('is_active', False),
-    )
-    if sprint.is_active:
-        Sprint.objects.filter(organization=org).exclude(id=sprint.id).update(is_active=False)
+    with transaction.atomic():
+        sprint = Sprint.objects.create(
+            organization=org,
+            name=name,
+            goal=data.get('goal', ''),
+            start_date=data.get('start_date') or None,
+            end_date=data.get('end_date') or None,
+            is_active=data.get('is_active', False),
+        )
+        track(org.id, sprints=1)
+        if sprint.is_active:
+            Sprint.objects.filter(organization=org).exclude(id=sprint.id).update(is_active=False)
     return JsonResponse({'ok': True, 'id': sprint.id, 'name': sprint.name})
 
 
@@ -452,7 +707,10 @@ def edit_sprint(request, sprint_id):
 def delete_sprint(request, sprint_id):
     org    = get_org(request)
     sprint = get_object_or_404(Sprint, id=sprint_id, organization=org)
-    sprint.delete()
+    with transaction.atomic():
+        sprint.delete()
+        # Sprints count against the month they were created in
+        track(org.id, when=sprint.created_at, sprints=-1)
     return JsonResponse({'ok': True})
 
 
@@ -477,7 +735,7 @@ def add_story(request):
         owner=owner,
         sprint=sprint,
         involved_streams=data.get('involved_streams', []),
-        order=UserStory.objects.filter(organization=org).count()
+        order=UserStory.objects.filter(organization=org).next_rank()
     )
     return JsonResponse({'ok': True, 'id': story.id})
 
@@ -501,6 +759,7 @@ def edit_story(request, us_id):
             Sprint, id=data['sprint_id'], organization=org
         ) if data['sprint_id'] else None
     story.save()
+    vote_state_changed(story)
     return JsonResponse({'ok': True})
 
 
@@ -509,19 +768,60 @@ def edit_story(request, us_id):
 def delete_story(request, us_id):
     org   = get_org(request)
     story = get_object_or_404(UserStory, id=us_id, organization=org)
+    StateVersion.bump(StateVersion.story_key(story.id))
     story.delete()
     return JsonResponse({'ok': True})
 
 
+@require_POST
+@require_scrum_master_api
+def reorder_stories(request):
+    """
+    Apply a batch of drag-and-drop moves: {"moves": [{"id": 7, "after_id": 3}, ...]}.
+    after_id null puts the story at the top. Moves are applied in the order given.
+    """
+    org   = get_org(request)
+    data  = json.loads(request.body)
+    moves = data.get('moves') or []
+    if not isinstance(moves, list) or len(moves) > REORDER_MAX_MOVES:
+        return JsonResponse({'error': f'moves must be a list of at most {REORDER_MAX_MOVES}'}, status=400)
+    try:
+        pairs = [(int(m['id']), int(m['after_id']) if m.get('after_id') else None) for m in moves]
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({'error': 'Each move needs an id and an optional after_id'}, status=400)
+
+    with transaction.atomic():
+        wanted  = {i for pair in pairs for i in pair if i}
+        stories = UserStory.objects.filter(organization=org, id__in=wanted).only('id', 'organization_id', 'order')
+        by_id   = {s.id: s for s in stories}
+        missing = sorted(wanted - set(by_id))
+        if missing:
+            return JsonResponse({'error': 'Not found', 'missing': missing}, status=404)
+        for story_id, after_id in pairs:
+            if story_id == after_id:
+                continue
+            after = by_id[after_id] if after_id else None
+            if after:
+                # An earlier move in this batch may have rebalanced the ranks
+                after.refresh_from_db(fields=['order'])
+            by_id[story_id].move_after(after)
+        orders = dict(UserStory.objects.filter(id__in=wanted).values_list('id', 'order'))
+    return JsonResponse({'ok': True, 'orders': orders})
+
+
 @require_POST
 @require_scrum_master_api
 def trigger_voting(request, us_id):
     org   = get_org(request)
     story = get_object_or_404(UserStory, id=us_id, organization=org)
-    story.voting_status = 'voting'
-    story.votes.all().delete()
+    # save() derives voting_status from status
+    story.status        = 'voting'
     story.vote_average  = None
-    story.save()
+    with transaction.atomic():
+        story.votes.all().delete()
+        story.vote_aggregates.all().delete()
+        story.save()
+    vote_state_changed(story)
     return JsonResponse({'ok': True})
 
 
@@ -530,12 +830,70 @@ def trigger_voting(request, us_id):
 def close_voting(request, us_id):
     org   = get_org(request)
     story = get_object_or_404(UserStory, id=us_id, organization=org)
-    story.voting_status = 'closed'
+    story.status        = 'estimated'
     story.vote_average  = story.compute_average()
     story.save()
+    vote_state_changed(story)
     return JsonResponse({'ok': True, 'average': story.vote_average})
 
 
+@require_POST
+@require_scrum_master_api
+def bulk_status(request, kind):
+    """Move many stories, tasks or bugs to one status with set-based UPDATEs."""
+    model = BULK_STATUS_MODELS.get(kind)
+    if model is None:
+        raise Http404
+    org    = get_org(request)
+    data   = json.loads(request.body)
+    ids    = data.get('ids') or []
+    status = data.get('status')
+    if status not in dict(model.STATUS_CHOICES):
+        return JsonResponse({'error': 'Invalid status'}, status=400)
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return JsonResponse({'error': 'ids must be a list of integers'}, status=400)
+    if len(ids) > BULK_STATUS_LIMIT:
+        return JsonResponse({'error': f'At most {BULK_STATUS_LIMIT} items per request'}, status=400)
+
+    with transaction.atomic():
+        current = dict(model.objects.filter(organization=org, id__in=ids).values_list('id', 'status'))
+        missing = sorted(set(ids) - set(current))
+        if missing:
+            return JsonResponse({'error': 'Not found', 'missing': missing}, status=404)
+        changed = [i for i, s in current.items() if s != status]
+        if changed:
+            # status_changed_at and voting_status are filled in by the queryset's update()
+            fields = {'status': status, 'updated_at': timezone.now()}
+            if model is UserStory and status == 'voting':
+                # Same reset as trigger_voting
+                fields['vote_average'] = None
+                Vote.objects.filter(user_story_id__in=changed).delete()
+                VoteAggregate.objects.filter(user_story_id__in=changed).delete()
+            model.objects.filter(id__in=changed).update(**fields)
+            closing = [i for i in changed if current[i] == 'voting'] if model is UserStory else []
+            if closing:
+                # Same average close_voting records, for every room this closes
+                averages = {
+                    agg.user_story_id: agg.average()
+                    for agg in VoteAggregate.objects.filter(user_story_id__in=closing, stream__isnull=True)
+                }
+                UserStory.objects.filter(id__in=closing).update(vote_average=Case(
+                    *[When(id=i, then=Value(avg)) for i, avg in averages.items()],
+                    default=None, output_field=FloatField(),
+                ))
+            if model is UserStory:
+                StateVersion.bump_many(StateVersion.story_key(i) for i in changed)
+                watched = [i for i in changed if broker.has_subscribers(i)]
+                if watched:
+                    transaction.on_commit(lambda: _publish_vote_states(watched))
+    return JsonResponse({'ok': True, 'updated': len(changed), 'unchanged': len(current) - len(changed)})
+
+
+def _publish_vote_states(story_ids):
+    for story in UserStory.objects.filter(id__in=story_ids):
+        broker.publish(story.id, build_vote_state(story))
+
+
 @require_POST
 @require_scrum_master_api
 def assign_sp(request, us_id):
@@ -553,6 +911,7 @@ def assign_sp(request, us_id):
             StreamAssignment.objects.create(
                 user_story=story, stream=stream, member=member, sp=sa['sp']
             )
+    vote_state_changed(story)
     return JsonResponse({'ok': True})
 
 
@@ -568,9 +927,9 @@ def edit_stream_assignment(request, us_id):
 
 
 def get_story_detail(request, us_id):
-    story       = get_object_or_404(UserStory, id=us_id)
+    story       = get_object_or_404(UserStory.objects.select_related('owner__user'), id=us_id)
     assignments = []
-    for sa in story.stream_assignments.select_related('member', 'stream').all():
+    for sa in story.stream_assignments.select_related('member__user', 'stream').all():
         assignments.append({
             'id':          sa.id,
             'stream_id':   sa.stream.id,
@@ -598,83 +957,65 @@ def get_story_detail(request, us_id):
 # EXPORT / IMPORT
 # ─────────────────────────────────────────
 
+def export_response(export, fmt, sheet, basename):
+    """Stream an export as xlsx (all sheets), csv (one sheet) or ndjson (all sheets, or one)."""
+    if fmt == 'csv':
+        response = StreamingHttpResponse(iter_csv(export, sheet or 'stories'), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{basename}_{sheet or "stories"}.csv"'
+        return response
+    if fmt == 'ndjson':
+        response = StreamingHttpResponse(
+            iter_ndjson(export, [sheet] if sheet else None), content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{basename}.ndjson"'
+        return response
+
+    # The zip container needs a seekable file — spool it, to disk once it grows
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    write_xlsx(export, out)
+    out.seek(0)
+    return FileResponse(
+        out, as_attachment=True, filename=f'{basename}_export.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def _export_options(request):
+    fmt   = request.GET.get('format', 'xlsx')
+    sheet = request.GET.get('sheet') or None
+    if fmt not in EXPORT_FORMATS:
+        return None, None, JsonResponse({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}, status=400)
+    if sheet and sheet not in EXPORT_SHEETS:
+        return None, None, JsonResponse({'error': f'sheet must be one of {", ".join(EXPORT_SHEETS)}'}, status=400)
+    return fmt, sheet, None
+
+
 @require_scrum_master
 def export_sprint(request, sprint_id):
+    """?format=xlsx|csv|ndjson, ?sheet=stories|assignments|votes|capacity for csv/ndjson."""
     org    = get_org(request)
     sprint = get_object_or_404(Sprint, id=sprint_id, organization=org)
+    fmt, sheet, error = _export_options(request)
+    if error:
+        return error
+    return export_response(SprintExport(org, [sprint]), fmt, sheet, sprint.name.replace(' ', '_'))
 
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from django.http import HttpResponse
-
-    stories = UserStory.objects.filter(sprint=sprint).prefetch_related(
-        'stream_assignments__member',
-        'stream_assignments__stream',
-        'votes__member'
-    ).select_related('owner')
-
-    wb  = openpyxl.Workbook()
-    ws1 = wb.active
-    ws1.title = 'User Stories'
-
-    header_fill = PatternFill('solid', fgColor='4F46E5')
-    header_font = Font(bold=True, color='FFFFFF', size=11)
-    alt_fill    = PatternFill('solid', fgColor='F1F0FF')
-    border      = Border(
-        left=Side(style='thin', color='CCCCCC'),
-        right=Side(style='thin', color='CCCCCC'),
-        top=Side(style='thin', color='CCCCCC'),
-        bottom=Side(style='thin', color='CCCCCC'),
-    )
 
-    headers    = ['#', 'User Story', 'Description', 'Owner', 'Owner Stream',
-                  'Involved Streams', 'Vote Average', 'Final SP', 'Voting Status']
-    col_widths = [5, 45, 35, 20, 14, 30, 14, 10, 16]
-    for i, w in enumerate(col_widths, 1):
-        ws1.column_dimensions[openpyxl.utils.get_column_letter(i)].width = w
-
-    ws1.merge_cells('A1:I1')
-    ws1['A1']           = f'Sprint: {sprint.name}'
-    ws1['A1'].font      = Font(bold=True, size=13, color='1E1B4B')
-    ws1['A1'].fill      = PatternFill('solid', fgColor='EEF2FF')
-    ws1['A1'].alignment = Alignment(horizontal='center', vertical='center')
-    ws1.row_dimensions[1].height = 28
-
-    header_row = 3
-    for col, h in enumerate(headers, 1):
-        cell           = ws1.cell(row=header_row, column=col, value=h)
-        cell.font      = header_font
-        cell.fill      = header_fill
-        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        cell.border    = border
-
-    for i, story in enumerate(stories, 1):
-        row  = header_row + i
-        fill = alt_fill if i % 2 == 0 else None
-        vals = [
-            i, story.title, story.description or '',
-            story.owner.display_name() if story.owner else '—',
-            story.owner.stream.name if story.owner and story.owner.stream else '—',
-            ', '.join(story.involved_streams) if story.involved_streams else '—',
-            story.vote_average or '—',
-            story.final_sp or '—',
-            story.get_voting_status_display(),
-        ]
-        for col, val in enumerate(vals, 1):
-            cell           = ws1.cell(row=row, column=col, value=val)
-            cell.border    = border
-            cell.alignment = Alignment(vertical='center', wrap_text=True)
-            if fill:
-                cell.fill = fill
-
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = (
-        f'attachment; filename="{sprint.name.replace(" ", "_")}_export.xlsx"'
-    )
-    wb.save(response)
-    return response
+@require_scrum_master
+def export_sprints(request):
+    """Several sprints in one file: ?sprint=<id>&sprint=<id>..., all sprints when none given."""
+    org     = get_org(request)
+    fmt, sheet, error = _export_options(request)
+    if error:
+        return error
+    sprints = Sprint.objects.filter(organization=org).order_by('start_date', 'id')
+    ids     = request.GET.getlist('sprint')
+    if ids:
+        try:
+            sprints = sprints.filter(id__in=[int(i) for i in ids])
+        except ValueError:
+            return JsonResponse({'error': 'sprint must be an id'}, status=400)
+    return export_response(SprintExport(org, sprints), fmt, sheet, f'{org.slug}_sprints')
 
 
 @require_scrum_master
@@ -691,66 +1032,43 @@ def import_stories(request, sprint_id):
             'streams': Stream.objects.filter(organization=org),
         })
 
-    import openpyxl
-    from io import BytesIO
-
-    excel_file = request.FILES.get('excel_file')
-    if not excel_file:
+    upload = request.FILES.get('file') or request.FILES.get('excel_file')
+    if not upload:
         return JsonResponse({'error': 'No file uploaded'}, status=400)
+    if not upload.name.lower().endswith(IMPORT_FORMATS):
+        return JsonResponse({'error': 'Upload an .xlsx or .csv file'}, status=400)
+    dry_run = request.POST.get('dry_run') in ('1', 'true', 'on')
+
+    if upload.size > IMPORT_INLINE_BYTES or request.POST.get('background'):
+        job = ImportJob.objects.create(
+            organization=org, sprint=sprint, created_by=request.user,
+            filename=upload.name, payload=upload.read(), dry_run=dry_run,
+        )
+        start_import_job(job)
+        return JsonResponse({
+            'ok':          True,
+            'job_id':      job.id,
+            'status_url':  reverse('import_status', args=[job.id]),
+            'sprint_name': sprint.name,
+        }, status=202)
 
     try:
-        wb      = openpyxl.load_workbook(BytesIO(excel_file.read()), data_only=True)
-        ws      = wb.active
-        headers = [
-            str(cell.value).strip().lower() if cell.value else ''
-            for cell in ws[1]
-        ]
-
-        def find_col(candidates):
-            for c in candidates:
-                for i, h in enumerate(headers):
-                    if c in h:
-                        return i
-            return None
+        # All or nothing: a file that fails halfway leaves no stories behind
+        with transaction.atomic():
+            result = StoryImport(sprint, dry_run=dry_run).run(read_rows(upload, upload.name))
+    except StoryImportError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'ok': True, 'sprint_name': sprint.name, **result.as_dict()})
 
-        col_title       = find_col(['title', 'user story', 'story', 'name'])
-        col_description = find_col(['description', 'desc', 'detail'])
-        col_sp          = find_col(['sp', 'story point', 'points', 'estimate'])
 
-        if col_title is None:
-            return JsonResponse({'error': 'Could not find a title column.'}, status=400)
+@require_scrum_master
+def import_status(request, job_id):
+    job = get_object_or_404(ImportJob, id=job_id, organization=get_org(request))
+    return JsonResponse(job.as_dict())
 
-        created = skipped = 0
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            title = row[col_title] if col_title < len(row) else None
-            if not title or str(title).strip() == '':
-                skipped += 1
-                continue
-            final_sp = None
-            if col_sp is not None and col_sp < len(row):
-                try:
-                    final_sp = float(row[col_sp]) if row[col_sp] is not None else None
-                except (ValueError, TypeError):
-                    pass
-            UserStory.objects.create(
-                organization=org,
-                title=str(title).strip(),
-                description=(
-                    str(row[col_description]).strip()
-                    if col_description and col_description < len(row) and row[col_description]
-                    else ''
-                ),
-                sprint=sprint,
-                final_sp=final_sp,
-                order=UserStory.objects.filter(organization=org).count()
-            )
-            created += 1
 
-        return JsonResponse({
-            'ok':          True,
-            'created':     created,
-            'skipped':     skipped,
-            'sprint_name': sprint.name,
-        })
-    except Exception as e:
-        return JsonResponse({'error': f'Failed to read file: {str(e)}'}, status=400)
+@require_org_member_api
+def job_status(request, job_id):
+    """Status of a background job started by this organization."""
+    job = get_object_or_404(Job, id=job_id, organization=get_org(request))
+    return JsonResponse(job.as_dict())